@@ -0,0 +1,150 @@
+"""
+自动排程 - 把尚未安排时间的任务装入工作时间内的空闲时段（POST /api/tasks/schedule）
+
+- greedy：任务按优先级（同级先长后短）放入优先队列，依次放进最早能容纳它的空闲时段
+- search：在时间预算内用随机扰动的顺序和不同的放置策略（最早 / 最贴合）反复装箱，
+  保留得分最高的方案；第一轮就是 greedy，结果不会比 greedy 差
+得分先比较按优先级加权的已安排分钟数，再比较加权的开始时间（高优先级越早越好）
+
+纯计算模块，不访问数据库；时间均为 UTC naive datetime，内部换算为相对排程起点的分钟数
+"""
+import heapq
+import math
+import os
+import random
+import time
+from datetime import date, datetime, time as day_time, timedelta, timezone, tzinfo
+from typing import Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+# 单次排程允许的任务数、天数和 search 模式的时间预算上限
+SCHEDULE_MAX_TASKS = int(os.getenv("SCHEDULE_MAX_TASKS", "500"))
+SCHEDULE_MAX_DAYS = int(os.getenv("SCHEDULE_MAX_DAYS", "31"))
+SCHEDULE_MAX_BUDGET_MS = int(os.getenv("SCHEDULE_MAX_BUDGET_MS", "2000"))
+# 没有 duration 的任务按此时长安排
+SCHEDULE_DEFAULT_DURATION_MINUTES = int(os.getenv("SCHEDULE_DEFAULT_DURATION_MINUTES", "30"))
+
+GREEDY = "greedy"
+SEARCH = "search"
+MODES = (GREEDY, SEARCH)
+
+PRIORITY_WEIGHTS = {"high": 3, "medium": 2, "low": 1}
+
+# 空闲时段 [start, end)，单位为相对排程起点的分钟
+Slot = Tuple[int, int]
+
+
+class SchedulingTask(NamedTuple):
+    id: str
+    minutes: int
+    priority: str
+
+    @property
+    def weight(self) -> int:
+        return PRIORITY_WEIGHTS.get(self.priority, PRIORITY_WEIGHTS["medium"])
+
+
+class Plan(NamedTuple):
+    # 任务 ID -> 开始分钟
+    starts: Dict[str, int]
+    score: Tuple[int, int]
+
+
+def working_windows(first_day: date, days: int, start: day_time, end: day_time,
+                    weekdays: Iterable[int], zone: tzinfo) -> List[Tuple[datetime, datetime]]:
+    """
+    first_day 起 days 天内每个工作日（0 为周一）的工作时段，按用户时区换算为 UTC
+    """
+    weekdays = set(weekdays)
+    windows = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        if day.weekday() not in weekdays:
+            continue
+        window = tuple(
+            datetime.combine(day, moment, tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+            for moment in (start, end)
+        )
+        windows.append(window)
+    return windows
+
+
+def free_slots(origin: datetime, windows: Sequence[Tuple[datetime, datetime]],
+               busy: Iterable[Tuple[datetime, datetime]], gap_minutes: int = 0) -> List[Slot]:
+    """
+    工作时段减去已有任务（前后各留 gap_minutes）后的空闲时段，早于 origin 的部分不计
+    """
+    def minutes(moment: datetime, round_up: bool = False) -> int:
+        value = (moment - origin).total_seconds() / 60
+        return math.ceil(value) if round_up else math.floor(value)
+
+    blocked = sorted((minutes(start) - gap_minutes, minutes(end, round_up=True) + gap_minutes) for start, end in busy)
+    slots: List[Slot] = []
+    for window_start, window_end in windows:
+        start, end = max(minutes(window_start, round_up=True), 0), minutes(window_end)
+        for busy_start, busy_end in blocked:
+            if busy_end <= start or busy_start >= end:
+                continue
+            if busy_start > start:
+                slots.append((start, busy_start))
+            start = max(start, busy_end)
+        if end > start:
+            slots.append((start, end))
+    return slots
+
+
+def _pack(tasks: Sequence[SchedulingTask], slots: Sequence[Slot], gap_minutes: int, best_fit: bool) -> Plan:
+    """
+    按 tasks 的顺序逐个放置；first-fit 放进最早能容纳的时段，best-fit 放进剩余最短的时段
+    """
+    free = [list(slot) for slot in slots]
+    starts: Dict[str, int] = {}
+    weighted_minutes = 0
+    weighted_start = 0
+    for task in tasks:
+        chosen = None
+        for slot in free:
+            length = slot[1] - slot[0]
+            if length < task.minutes:
+                continue
+            if not best_fit:
+                chosen = slot
+                break
+            if chosen is None or length < chosen[1] - chosen[0]:
+                chosen = slot
+        if chosen is None:
+            continue
+        starts[task.id] = chosen[0]
+        weighted_minutes += task.weight * task.minutes
+        weighted_start += task.weight * chosen[0]
+        chosen[0] += task.minutes + gap_minutes
+    return Plan(starts, (weighted_minutes, -weighted_start))
+
+
+def _priority_order(tasks: Sequence[SchedulingTask]) -> List[SchedulingTask]:
+    # 优先队列：权重高的先出，同级先放长任务，最后按原顺序（创建时间）稳定排序
+    queue = [(-task.weight, -task.minutes, index, task) for index, task in enumerate(tasks)]
+    heapq.heapify(queue)
+    return [heapq.heappop(queue)[-1] for _ in range(len(queue))]
+
+
+def schedule(tasks: Sequence[SchedulingTask], slots: Sequence[Slot], mode: str = GREEDY,
+             budget_ms: int = 0, gap_minutes: int = 0, seed: int = 0) -> Plan:
+    """
+    返回排程方案；放不下的任务不出现在 Plan.starts 中
+    search 模式在 budget_ms 内反复尝试，单轮开销 O(任务数 × 空闲时段数)
+    """
+    best = _pack(_priority_order(tasks), slots, gap_minutes, best_fit=False)
+    if mode != SEARCH or not tasks:
+        return best
+
+    deadline = time.perf_counter() + budget_ms / 1000
+    rng = random.Random(seed)
+    attempt = 0
+    while time.perf_counter() < deadline:
+        attempt += 1
+        # 权重乘以随机因子后排序：大多保持优先级顺序，偶尔让低优先级的长任务先占位
+        order = sorted(tasks, key=lambda task: -task.weight * rng.uniform(0.6, 1.4))
+        plan = _pack(order, slots, gap_minutes, best_fit=attempt % 2 == 0)
+        if plan.score > best.score:
+            best = plan
+    return best
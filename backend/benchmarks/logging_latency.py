@@ -0,0 +1,165 @@
+"""
+日志管道基准测试 - 对比同步写日志与异步队列写日志时的请求延迟 (p50 / p99)
+
+用法（在 backend 目录下运行）:
+    python benchmarks/logging_latency.py [--requests 5000] [--concurrency 50]
+
+每种模式在独立子进程中运行（LOG_ASYNC 在导入 logger 时读取），
+使用临时 SQLite 数据库和临时日志目录，不会修改正式数据
+--io-delay-ms 为每次文件写入增加阻塞延迟，模拟慢磁盘或被阻塞的日志管道
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+async def _call(app, path: str) -> float:
+    """
+    直接以 ASGI 协议调用应用，返回耗时（毫秒）
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench.local")],
+        "client": ("127.0.0.1", 12345),
+        "server": ("bench.local", 80),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return (time.perf_counter() - start) * 1000
+
+
+async def _run(requests: int, concurrency: int, path: str) -> list:
+    import main  # noqa: F401  在子进程中按环境变量初始化
+
+    app = main.app
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            latencies.append(await _call(app, path))
+
+    # 预热
+    await asyncio.gather(*(one() for _ in range(min(100, requests))))
+    latencies.clear()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _slow_down_file_writes(delay_ms: float):
+    """
+    给日志文件处理器的每次写入加上 time.sleep（释放 GIL，与阻塞 I/O 行为一致）
+    """
+    from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+    from logger import logger, _pipelines
+
+    handlers = list(logger.handlers)
+    for pipeline in _pipelines.values():
+        handlers.extend(pipeline.handlers)
+    for handler in handlers:
+        if isinstance(handler, (RotatingFileHandler, TimedRotatingFileHandler)):
+            emit = handler.emit
+
+            def slow_emit(record, emit=emit):
+                time.sleep(delay_ms / 1000)
+                emit(record)
+            handler.emit = slow_emit
+
+
+def child(args):
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    if args.io_delay_ms:
+        _slow_down_file_writes(args.io_delay_ms)
+    start = time.perf_counter()
+    latencies = asyncio.run(_run(args.requests, args.concurrency, args.path))
+    elapsed = time.perf_counter() - start
+
+    from logger import shutdown_logging, get_logging_stats
+    stats = get_logging_stats()
+    shutdown_logging()
+    print(json.dumps({
+        "p50": _percentile(latencies, 50),
+        "p99": _percentile(latencies, 99),
+        "max": max(latencies),
+        "rps": len(latencies) / elapsed,
+        "dropped": sum(pipeline["dropped"] for pipeline in stats.values())
+    }))
+
+
+def parent(args):
+    results = {}
+    for label, log_async in (("sync", "false"), ("async", "true")):
+        tmp_dir = tempfile.mkdtemp()
+        env = dict(
+            os.environ,
+            LOG_ASYNC=log_async,
+            LOG_DIR=os.path.join(tmp_dir, "logs"),
+            DATABASE_TYPE="sqlite",
+            DATABASE_PATH=os.path.join(tmp_dir, "bench.db"),
+        )
+        # 控制台日志写到 stderr，丢弃；结果从 stdout 读取
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child",
+             "--requests", str(args.requests), "--concurrency", str(args.concurrency), "--path", args.path,
+             "--io-delay-ms", str(args.io_delay_ms)],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, text=True
+        ).stdout
+        results[label] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{args.requests} requests to {args.path}, concurrency {args.concurrency}, io delay {args.io_delay_ms} ms")
+    print(f"{'mode':<8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'req/s':>10}{'dropped':>10}")
+    for label, r in results.items():
+        print(f"{label:<8}{r['p50']:>10.3f}{r['p99']:>10.3f}{r['max']:>10.3f}{r['rps']:>10.0f}{r['dropped']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging pipeline request latency benchmark")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--path", default="/api/health")
+    parser.add_argument("--io-delay-ms", type=float, default=0.0, help="simulated latency per log file write")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+    else:
+        parent(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+中间件基准测试 - 对比 BaseHTTPMiddleware 实现与纯 ASGI 实现的每秒请求数
+
+用法（在 backend 目录下运行）:
+    python benchmarks/middleware_rps.py [--requests 20000] [--concurrency 50] [--with-logging]
+
+默认关闭日志输出，只测量中间件本身的开销
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+# 在导入 logger 之前指向临时日志目录
+os.environ.setdefault("LOG_DIR", os.path.join(tempfile.mkdtemp(), "logs"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi import FastAPI, Request, Response  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.types import ASGIApp  # noqa: E402
+
+from logger import logger, log_request, log_response, log_error, shutdown_logging  # noqa: E402
+from middleware import LoggingMiddleware, RateLimitMiddleware  # noqa: E402
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    """替换前的 LoggingMiddleware（BaseHTTPMiddleware 实现）"""
+
+    def __init__(self, app: ASGIApp):
+        super().__init__(app)
+
+    async def dispatch(self, request: Request, call_next):
+        request_id = str(uuid.uuid4())
+        request.state.request_id = request_id
+        client_ip = request.client.host if request.client else "unknown"
+        user_id = None
+        if hasattr(request.state, "user"):
+            user_id = getattr(request.state.user, "id", None)
+        log_request(request_id=request_id, method=request.method, path=request.url.path,
+                    user_id=user_id, ip_address=client_ip)
+        start_time = time.time()
+        try:
+            response = await call_next(request)
+            log_response(request_id=request_id, status_code=response.status_code,
+                         duration=time.time() - start_time)
+            response.headers["X-Request-ID"] = request_id
+            return response
+        except Exception as e:
+            log_error(request_id=request_id, error=e, user_id=user_id)
+            raise
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    """替换前的 RateLimitMiddleware（BaseHTTPMiddleware 实现）"""
+
+    def __init__(self, app: ASGIApp, max_requests: int = 100, window: int = 60):
+        super().__init__(app)
+        self.max_requests = max_requests
+        self.window = window
+        self.requests = {}
+
+    async def dispatch(self, request: Request, call_next):
+        client_ip = request.client.host if request.client else "unknown"
+        current_window = int(time.time() / self.window)
+        self.requests = {k: v for k, v in self.requests.items() if k[1] >= current_window}
+        key = (client_ip, current_window)
+        count = self.requests.get(key, 0)
+        if count >= self.max_requests:
+            return Response(content="Too many requests", status_code=429,
+                            headers={"Retry-After": str(self.window)})
+        self.requests[key] = count + 1
+        response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(self.max_requests)
+        response.headers["X-RateLimit-Remaining"] = str(self.max_requests - count - 1)
+        response.headers["X-RateLimit-Reset"] = str((current_window + 1) * self.window)
+        return response
+
+
+def build_app(logging_cls, rate_limit_cls) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    # 限流阈值足够大，所有请求都会走到路由
+    app.add_middleware(rate_limit_cls, max_requests=10 ** 9, window=60)
+    app.add_middleware(logging_cls)
+    return app
+
+
+async def _call(app, client_id: int):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench.local")],
+        "client": (f"10.0.0.{client_id % 250}", 12345),
+        "server": ("bench.local", 80),
+    }
+    sent = False
+    status = None
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    assert status == 200, status
+
+
+async def measure(app, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await _call(app, i)
+
+    await asyncio.gather(*(one(i) for i in range(min(500, requests))))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BaseHTTPMiddleware vs pure ASGI middleware benchmark")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--with-logging", action="store_true", help="keep request/response log output enabled")
+    args = parser.parse_args()
+
+    if not args.with_logging:
+        logger.disabled = True
+
+    variants = {
+        "BaseHTTPMiddleware": build_app(LegacyLoggingMiddleware, LegacyRateLimitMiddleware),
+        "pure ASGI": build_app(LoggingMiddleware, RateLimitMiddleware),
+    }
+    best = {name: 0.0 for name in variants}
+    for _ in range(args.rounds):
+        for name, app in variants.items():
+            best[name] = max(best[name], asyncio.run(measure(app, args.requests, args.concurrency)))
+    shutdown_logging()
+
+    print(f"{args.requests} requests x {args.rounds} rounds, concurrency {args.concurrency}, best round")
+    baseline = best["BaseHTTPMiddleware"]
+    for name, rps in best.items():
+        print(f"{name:<20}{rps:>12.0f} req/s{rps / baseline:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
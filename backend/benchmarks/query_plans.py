@@ -0,0 +1,149 @@
+"""
+索引基准测试 - 对比补建复合索引前后的查询计划与耗时
+
+用法（在 backend 目录下运行）:
+    python benchmarks/query_plans.py [--users 50] [--rows 2000]
+
+使用临时 SQLite 数据库，不会修改正式数据
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# 在导入 database 之前指向临时数据库
+_tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_TYPE"] = "sqlite"
+os.environ["DATABASE_PATH"] = os.path.join(_tmp_dir, "bench.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sqlalchemy import text  # noqa: E402
+from database import engine, Base  # noqa: E402
+from models import User, Task, Insight, ChatMessage  # noqa: E402
+from migrate_indexes import ensure_indexes  # noqa: E402
+
+# 本次新增的复合索引；“之前”场景中先删除它们
+COMPOSITE_INDEXES = {
+    index.name
+    for model in (User, Task, Insight, ChatMessage)
+    for index in model.__table__.indexes
+    if len(index.columns) > 1
+}
+
+QUERIES = {
+    "tasks: list by status": (
+        "SELECT * FROM tasks WHERE user_id = :uid AND status = 'pending' "
+        "ORDER BY start_time DESC, id DESC LIMIT 100"
+    ),
+    "tasks: list all": (
+        "SELECT * FROM tasks WHERE user_id = :uid ORDER BY start_time DESC, id DESC LIMIT 100"
+    ),
+    "chat: sessions": (
+        "SELECT session_id, count(id), max(created_at) AS last_message_at FROM chat_messages "
+        "WHERE user_id = :uid GROUP BY session_id ORDER BY last_message_at DESC LIMIT 20"
+    ),
+    "chat: session history": (
+        "SELECT * FROM chat_messages WHERE user_id = :uid AND session_id = :sid "
+        "ORDER BY created_at ASC LIMIT 50"
+    ),
+    "insights: list": (
+        "SELECT * FROM insights WHERE user_id = :uid ORDER BY created_at DESC, id DESC LIMIT 50"
+    ),
+    "admin: active users today": (
+        "SELECT count(DISTINCT user_id) FROM tasks WHERE created_at >= :today AND created_at < :tomorrow"
+    ),
+}
+
+
+def seed(users: int, rows: int):
+    now = datetime.utcnow()
+    statuses = ["pending", "in-progress", "completed", "cancelled"]
+    with engine.begin() as conn:
+        user_ids = [str(uuid.uuid4()) for _ in range(users)]
+        conn.execute(User.__table__.insert(), [
+            {"id": uid, "email": f"{uid}@bench.local", "password_hash": "x", "created_at": now}
+            for uid in user_ids
+        ])
+        for uid in user_ids:
+            sessions = [str(uuid.uuid4()) for _ in range(max(1, rows // 40))]
+            conn.execute(Task.__table__.insert(), [
+                {
+                    "id": str(uuid.uuid4()), "user_id": uid, "title": f"task {i}",
+                    "status": random.choice(statuses),
+                    "start_time": now - timedelta(minutes=random.randint(0, 525600)),
+                    "created_at": now - timedelta(minutes=random.randint(0, 525600)),
+                }
+                for i in range(rows)
+            ])
+            conn.execute(ChatMessage.__table__.insert(), [
+                {
+                    "id": str(uuid.uuid4()), "user_id": uid, "session_id": random.choice(sessions),
+                    "role": random.choice(["user", "assistant"]), "content": f"message {i}",
+                    "created_at": now - timedelta(minutes=random.randint(0, 525600)),
+                }
+                for i in range(rows)
+            ])
+            conn.execute(Insight.__table__.insert(), [
+                {
+                    "id": str(uuid.uuid4()), "user_id": uid, "type": "productivity",
+                    "title": f"insight {i}", "description": "d",
+                    "created_at": now - timedelta(minutes=random.randint(0, 525600)),
+                }
+                for i in range(rows // 10)
+            ])
+    return user_ids
+
+
+def run_queries(label: str, params: dict, repeat: int):
+    print("")
+    print("=" * 72)
+    print(f"  {label}")
+    print("=" * 72)
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        for name, sql in QUERIES.items():
+            plan = conn.execute(text("EXPLAIN QUERY PLAN " + sql), params).fetchall()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(text(sql), params).fetchall()
+            elapsed = (time.perf_counter() - start) / repeat * 1000
+            print(f"\n{name}: {elapsed:.3f} ms/query")
+            for row in plan:
+                print(f"    {row[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Composite index query plan benchmark")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=2000, help="tasks / chat messages per user")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for name in sorted(COMPOSITE_INDEXES):
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    print(f"Seeding {args.users} users x {args.rows} rows ...")
+    user_ids = seed(args.users, args.rows)
+
+    with engine.connect() as conn:
+        uid = user_ids[len(user_ids) // 2]
+        sid = conn.execute(
+            text("SELECT session_id FROM chat_messages WHERE user_id = :uid LIMIT 1"), {"uid": uid}
+        ).scalar()
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    params = {"uid": uid, "sid": sid, "today": today, "tomorrow": today + timedelta(days=1)}
+
+    run_queries("BEFORE: single-column indexes only", params, args.repeat)
+    created = ensure_indexes(engine)
+    print(f"\nCreated indexes: {', '.join(created)}")
+    run_queries("AFTER: composite indexes", params, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+聊天会话摘要 - chat_sessions 表记录每个会话的消息数、首条消息预览和最后活跃时间
+在创建、删除消息时与消息同一事务内维护，会话列表只需按索引范围扫描
+运行此脚本可从 chat_messages 全量重建会话摘要
+"""
+from typing import Optional
+
+from sqlalchemy import case, delete, exists, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from database import DATABASE_TYPE, SessionLocal, engine, Base, print_db_info
+from models import ChatMessage, ChatSession
+import sys
+import os
+
+# 首条消息预览的最大长度，与 ChatSession.first_message 列宽一致
+PREVIEW_LENGTH = 100
+
+
+def _preview(content: Optional[str]) -> str:
+    return (content or "")[:PREVIEW_LENGTH]
+
+
+def _record_statement(message: ChatMessage):
+    """
+    新建会话摘要，已存在时消息数加 1、last_message_at 取较晚者；首条消息字段只在插入时写入
+    单条 upsert，并发写入同一会话时既不会重复插入，也不会让 last_message_at 倒退
+    """
+    values = {
+        "user_id": message.user_id,
+        "session_id": message.session_id,
+        "message_count": 1,
+        "first_message_id": message.id,
+        "first_message": _preview(message.content),
+        "last_message_at": message.created_at,
+        "created_at": message.created_at
+    }
+
+    if DATABASE_TYPE.lower() == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(ChatSession).values(**values)
+        return stmt.on_duplicate_key_update(
+            message_count=ChatSession.message_count + 1,
+            last_message_at=func.greatest(ChatSession.last_message_at, stmt.inserted.last_message_at)
+        )
+
+    from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(ChatSession).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=[ChatSession.user_id, ChatSession.session_id],
+        set_={
+            "message_count": ChatSession.message_count + 1,
+            "last_message_at": func.max(ChatSession.last_message_at, stmt.excluded.last_message_at)
+        }
+    )
+
+
+async def record_message(db, message: ChatMessage) -> bool:
+    """
+    新消息计入会话摘要，返回是否新建了会话
+    消息需已 flush，以便 id 与 created_at 已赋值
+    """
+    stmt = _record_statement(message)
+    if DATABASE_TYPE.lower() == "mysql":
+        # ON DUPLICATE KEY UPDATE：插入时影响 1 行，更新已有行时影响 2 行
+        result = await db.execute(stmt)
+        return result.rowcount == 1
+
+    # 新建的会话消息数为 1；已有会话的消息数不会小于 1，更新后至少为 2
+    message_count = await db.scalar(stmt.returning(ChatSession.message_count))
+    return message_count == 1
+
+
+async def remove_message(db, message: ChatMessage) -> bool:
+    """
+    已删除（并 flush）的消息从会话摘要中扣除，返回会话是否因此变为空
+    各用一条语句删除空会话或更新摘要，并发删除时不会丢失计数；
+    首条消息与 last_message_at 按 (user_id, session_id, created_at) 索引在语句内重新取值
+    """
+    in_summary = (
+        ChatSession.user_id == message.user_id,
+        ChatSession.session_id == message.session_id
+    )
+    in_session = (
+        ChatMessage.user_id == message.user_id,
+        ChatMessage.session_id == message.session_id
+    )
+
+    result = await db.execute(delete(ChatSession).where(
+        *in_summary,
+        ~exists().where(*in_session)
+    ).execution_options(synchronize_session=False))
+    if result.rowcount:
+        return True
+
+    first = select(ChatMessage.id, ChatMessage.content).where(*in_session).order_by(
+        ChatMessage.created_at.asc(), ChatMessage.id.asc()
+    ).limit(1)
+    removed_first = ChatSession.first_message_id == message.id
+    # MySQL 按顺序赋值，后面的表达式会看到前面已更新的值，因此 first_message 要在 first_message_id 之前
+    await db.execute(update(ChatSession).where(*in_summary).ordered_values(
+        (ChatSession.message_count, case((ChatSession.message_count > 1, ChatSession.message_count - 1), else_=1)),
+        (ChatSession.first_message, case((removed_first, func.substr(
+            first.with_only_columns(ChatMessage.content).scalar_subquery(), 1, PREVIEW_LENGTH
+        )), else_=ChatSession.first_message)),
+        (ChatSession.first_message_id, case((removed_first, first.with_only_columns(ChatMessage.id).scalar_subquery()),
+                                            else_=ChatSession.first_message_id)),
+        (ChatSession.last_message_at, select(func.max(ChatMessage.created_at)).where(*in_session).scalar_subquery())
+    ).execution_options(synchronize_session=False))
+    return False
+
+
+async def remove_session(db, user_id: str, session_id: str) -> None:
+    await db.execute(delete(ChatSession).where(
+        ChatSession.user_id == user_id,
+        ChatSession.session_id == session_id
+    ))
+
+
+def rebuild_chat_sessions(db: Session) -> int:
+    """
+    从 chat_messages 全量重建会话摘要，返回会话数量，由调用方负责 commit
+    """
+    summaries = {}
+    rows = db.execute(select(
+        ChatMessage.user_id,
+        ChatMessage.session_id,
+        ChatMessage.id,
+        func.substr(ChatMessage.content, 1, PREVIEW_LENGTH),
+        ChatMessage.created_at
+    ).order_by(
+        ChatMessage.user_id, ChatMessage.session_id, ChatMessage.created_at, ChatMessage.id
+    ).execution_options(yield_per=1000))
+
+    for user_id, session_id, message_id, preview, created_at in rows:
+        summary = summaries.get((user_id, session_id))
+        if summary is None:
+            summaries[(user_id, session_id)] = {
+                "user_id": user_id,
+                "session_id": session_id,
+                "message_count": 1,
+                "first_message_id": message_id,
+                "first_message": preview or "",
+                "last_message_at": created_at,
+                "created_at": created_at
+            }
+        else:
+            summary["message_count"] += 1
+            summary["last_message_at"] = created_at
+
+    db.execute(delete(ChatSession))
+    if summaries:
+        db.execute(insert(ChatSession), list(summaries.values()))
+    return len(summaries)
+
+
+def ensure_chat_sessions(db: Session) -> bool:
+    """
+    会话摘要表为空但已有聊天消息（旧数据库升级）时重建，返回是否执行了重建
+    """
+    if db.scalar(select(exists().select_from(ChatSession))):
+        return False
+    if not db.scalar(select(exists().select_from(ChatMessage))):
+        return False
+    rebuild_chat_sessions(db)
+    db.commit()
+    return True
+
+
+def main():
+    """主函数"""
+    # 设置控制台编码为 UTF-8
+    if sys.platform == "win32":
+        os.system("chcp 65001 >nul 2>&1")
+
+    print("=" * 60)
+    print("  AI时间管理系统 - 重建聊天会话摘要")
+    print("=" * 60)
+    print_db_info()
+    print("")
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        written = rebuild_chat_sessions(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[错误] 会话摘要重建失败: {str(e)}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"[完成] 已重建 {written} 个会话摘要")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+统计计数器 - 在写入消息、任务、洞察、用户时与业务数据同一事务内增量维护
+/api/chat/stats 与 /api/admin/stats 直接读取计数器，不再扫描全表
+运行此脚本可从业务表全量重建计数器
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+import math
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from database import DATABASE_TYPE, SessionLocal, engine, Base, print_db_info
+from models import ChatMessage, Insight, Task, UsageCounter, User
+import sys
+import os
+
+# 系统级计数器的 scope，其余 scope 为用户 ID
+GLOBAL_SCOPE = "global"
+
+# 计数器名称
+USERS = "users"
+TASKS = "tasks"
+COMPLETED_TASKS = "tasks:completed"
+INSIGHTS = "insights"
+CHAT_MESSAGES = "chat_messages"
+CHAT_SESSIONS = "chat_sessions"
+# 用户最近一次创建任务的日期 (date.toordinal())，用于按天去重活跃用户
+LAST_ACTIVE_DAY = "last_active_day"
+# 用户任务的最长跨度（分钟，只增不减），时间窗口查询据此为 start_time 加下界
+TASK_MAX_SPAN = "tasks:max_span_minutes"
+
+# 计数器变更: {(scope, name): delta}
+Changes = Dict[Tuple[str, str], int]
+
+
+def users_by_tier(tier: str) -> str:
+    return f"{USERS}:{tier}"
+
+
+def chat_messages_by_role(role: str) -> str:
+    return f"{CHAT_MESSAGES}:{role}"
+
+
+def active_users_on(day: date) -> str:
+    return f"active_users:{day.isoformat()}"
+
+
+# 集合版本号前缀：用户每次写入某个集合（tasks、insights ...）时加一，用于列表接口的 ETag
+# 重建计数器时保留，版本号只增不减，客户端缓存的旧 ETag 不会被误判为最新
+VERSION_PREFIX = "version:"
+
+
+def collection_version(collection: str) -> str:
+    return f"{VERSION_PREFIX}{collection}"
+
+
+def _upsert_statement(scope: str, name: str, value: int, increment: bool):
+    """
+    生成单条 upsert 语句，increment=True 时累加，否则覆盖
+    """
+    values = {"scope": scope, "name": name, "value": value, "updated_at": datetime.utcnow()}
+
+    if DATABASE_TYPE.lower() == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(UsageCounter).values(**values)
+        new_value = UsageCounter.value + stmt.inserted.value if increment else stmt.inserted.value
+        return stmt.on_duplicate_key_update(value=new_value, updated_at=stmt.inserted.updated_at)
+
+    from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(UsageCounter).values(**values)
+    new_value = UsageCounter.value + stmt.excluded.value if increment else stmt.excluded.value
+    return stmt.on_conflict_do_update(
+        index_elements=[UsageCounter.scope, UsageCounter.name],
+        set_={"value": new_value, "updated_at": stmt.excluded.updated_at}
+    )
+
+
+def _raise_statement(scope: str, name: str, value: int):
+    """
+    生成单条 upsert 语句，把计数器提高到 value，已经更大时保持不变
+    """
+    values = {"scope": scope, "name": name, "value": value, "updated_at": datetime.utcnow()}
+
+    if DATABASE_TYPE.lower() == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(UsageCounter).values(**values)
+        return stmt.on_duplicate_key_update(value=func.greatest(UsageCounter.value, stmt.inserted.value))
+
+    from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(UsageCounter).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=[UsageCounter.scope, UsageCounter.name],
+        set_={"value": func.max(UsageCounter.value, stmt.excluded.value)}
+    )
+
+
+def _statements(changes: Changes) -> Iterable:
+    for (scope, name), delta in sorted(changes.items()):
+        if delta:
+            yield _upsert_statement(scope, name, delta, increment=True)
+
+
+def merge(*changes: Changes) -> Changes:
+    merged: Changes = {}
+    for item in changes:
+        for key, delta in item.items():
+            merged[key] = merged.get(key, 0) + delta
+    return merged
+
+
+async def apply(db, changes: Changes) -> None:
+    """
+    在当前事务内累加计数器，由调用方负责 commit
+    """
+    for stmt in _statements(changes):
+        await db.execute(stmt)
+
+
+def apply_sync(db: Session, changes: Changes) -> None:
+    for stmt in _statements(changes):
+        db.execute(stmt)
+
+
+async def raise_to(db, scope: str, name: str, value: int) -> None:
+    """
+    在当前事务内把计数器提高到 value，由调用方负责 commit
+    """
+    await db.execute(_raise_statement(scope, name, value))
+
+
+async def read(db, scope: str, names: Iterable[str]) -> Dict[str, int]:
+    """
+    读取一组计数器，不存在的计数器返回 0
+    """
+    names = list(names)
+    rows = (await db.execute(select(UsageCounter.name, UsageCounter.value).where(
+        UsageCounter.scope == scope,
+        UsageCounter.name.in_(names)
+    ))).all()
+    values = {name: 0 for name in names}
+    values.update({row.name: row.value for row in rows})
+    return values
+
+
+# 各类写操作对应的计数器变更
+def user_changes(tier: str, delta: int = 1) -> Changes:
+    return {
+        (GLOBAL_SCOPE, USERS): delta,
+        (GLOBAL_SCOPE, users_by_tier(tier or "free")): delta
+    }
+
+
+def task_changes(user_id: str, tasks: int = 0, completed: int = 0) -> Changes:
+    return {
+        (GLOBAL_SCOPE, TASKS): tasks,
+        (user_id, TASKS): tasks,
+        (GLOBAL_SCOPE, COMPLETED_TASKS): completed,
+        (user_id, COMPLETED_TASKS): completed
+    }
+
+
+def insight_changes(user_id: str, delta: int = 1) -> Changes:
+    return {
+        (GLOBAL_SCOPE, INSIGHTS): delta,
+        (user_id, INSIGHTS): delta
+    }
+
+
+def version_changes(user_id: str, collection: str) -> Changes:
+    return {(user_id, collection_version(collection)): 1}
+
+
+def task_span_minutes(start_time: Optional[datetime], end_time: Optional[datetime], duration: Optional[int]) -> int:
+    """
+    任务从开始到结束的分钟数（向上取整）：有 end_time 时取起止之差，否则取 duration
+    """
+    if start_time is None:
+        return 0
+    if end_time is not None:
+        return max(math.ceil((end_time - start_time).total_seconds() / 60), 0)
+    return max(duration or 0, 0)
+
+
+def chat_changes(user_id: str, roles: Dict[str, int], sessions: int = 0) -> Changes:
+    changes: Changes = {
+        (user_id, CHAT_MESSAGES): sum(roles.values()),
+        (user_id, CHAT_SESSIONS): sessions
+    }
+    for role, delta in roles.items():
+        changes[(user_id, chat_messages_by_role(role))] = delta
+    return changes
+
+
+async def mark_active(db, user_id: str, today: Optional[date] = None) -> None:
+    """
+    记录用户今天有创建任务，每个用户每天只计入一次活跃用户
+    只有存储的日期确实被改为今天时才计入，同一天并发的首次请求只有一个生效
+    删除任务不会撤销当天的活跃记录
+    """
+    today = today or datetime.utcnow().date()
+    values = {"scope": user_id, "name": LAST_ACTIVE_DAY, "value": today.toordinal(), "updated_at": datetime.utcnow()}
+
+    if DATABASE_TYPE.lower() == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        # ON DUPLICATE KEY UPDATE 在值未变化时同样报告 1 行（CLIENT_FOUND_ROWS），无法与插入区分；
+        # 改用带条件的 UPDATE，没有该行时再 INSERT IGNORE，两条语句各自原子
+        result = await db.execute(update(UsageCounter).where(
+            UsageCounter.scope == user_id,
+            UsageCounter.name == LAST_ACTIVE_DAY,
+            UsageCounter.value != values["value"]
+        ).values(value=values["value"], updated_at=values["updated_at"]))
+        changed = result.rowcount
+        if not changed:
+            changed = (await db.execute(insert(UsageCounter).prefix_with("IGNORE").values(**values))).rowcount
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(UsageCounter).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UsageCounter.scope, UsageCounter.name],
+            set_={"value": stmt.excluded.value, "updated_at": stmt.excluded.updated_at},
+            where=UsageCounter.value != stmt.excluded.value
+        )
+        # 条件不满足（今天已记录）时不更新任何行
+        changed = (await db.execute(stmt)).rowcount
+
+    if changed:
+        await apply(db, {(GLOBAL_SCOPE, active_users_on(today)): 1})
+
+
+def _task_spans(db: Session) -> Dict[str, int]:
+    spans: Dict[str, int] = {}
+    rows = db.execute(select(
+        Task.user_id, Task.start_time, Task.end_time, Task.duration
+    ).where(Task.start_time.is_not(None)).execution_options(yield_per=1000))
+    for user_id, start_time, end_time, duration in rows:
+        spans[user_id] = max(spans.get(user_id, 0), task_span_minutes(start_time, end_time, duration))
+    return spans
+
+
+def rebuild_counters(db: Session, today: Optional[date] = None) -> int:
+    """
+    从业务表全量重建计数器，返回写入的计数器数量，由调用方负责 commit
+    可通过 AsyncSession.run_sync 在请求中调用
+    """
+    today = today or datetime.utcnow().date()
+    today_start = datetime.combine(today, datetime.min.time())
+    # 总用户数始终写入，作为计数器已初始化的标记
+    counts: Changes = {(GLOBAL_SCOPE, USERS): 0}
+
+    def add(scope: str, name: str, value: int):
+        counts[(scope, name)] = counts.get((scope, name), 0) + (value or 0)
+
+    for tier, total in db.execute(select(User.subscription_tier, func.count(User.id)).group_by(User.subscription_tier)):
+        add(GLOBAL_SCOPE, USERS, total)
+        add(GLOBAL_SCOPE, users_by_tier(tier or "free"), total)
+
+    task_rows = db.execute(select(
+        Task.user_id, Task.status == "completed", func.count(Task.id)
+    ).group_by(Task.user_id, Task.status == "completed"))
+    for user_id, completed, total in task_rows:
+        for scope in (GLOBAL_SCOPE, user_id):
+            add(scope, TASKS, total)
+            if completed:
+                add(scope, COMPLETED_TASKS, total)
+
+    for user_id, span in _task_spans(db).items():
+        counts[(user_id, TASK_MAX_SPAN)] = span
+
+    for user_id, total in db.execute(select(Insight.user_id, func.count(Insight.id)).group_by(Insight.user_id)):
+        add(GLOBAL_SCOPE, INSIGHTS, total)
+        add(user_id, INSIGHTS, total)
+
+    message_rows = db.execute(select(
+        ChatMessage.user_id, ChatMessage.role, func.count(ChatMessage.id)
+    ).group_by(ChatMessage.user_id, ChatMessage.role))
+    for user_id, role, total in message_rows:
+        add(user_id, CHAT_MESSAGES, total)
+        add(user_id, chat_messages_by_role(role), total)
+
+    session_rows = db.execute(select(
+        ChatMessage.user_id, func.count(func.distinct(ChatMessage.session_id))
+    ).group_by(ChatMessage.user_id))
+    for user_id, total in session_rows:
+        add(user_id, CHAT_SESSIONS, total)
+
+    active_rows = db.execute(select(func.distinct(Task.user_id)).where(
+        Task.created_at >= today_start,
+        Task.created_at < today_start + timedelta(days=1)
+    )).scalars().all()
+    add(GLOBAL_SCOPE, active_users_on(today), len(active_rows))
+    for user_id in active_rows:
+        counts[(user_id, LAST_ACTIVE_DAY)] = today.toordinal()
+
+    now = datetime.utcnow()
+    db.execute(delete(UsageCounter).where(UsageCounter.name.not_like(f"{VERSION_PREFIX}%")))
+    db.execute(insert(UsageCounter), [
+        {"scope": scope, "name": name, "value": value, "updated_at": now}
+        for (scope, name), value in counts.items()
+    ])
+    return len(counts)
+
+
+def counters_initialized(db: Session) -> bool:
+    return db.scalar(select(UsageCounter.value).where(
+        UsageCounter.scope == GLOBAL_SCOPE,
+        UsageCounter.name == USERS
+    )) is not None
+
+
+def ensure_counters(db: Session) -> bool:
+    """
+    计数器表为空（首次部署或旧数据库升级）时重建，返回是否执行了重建
+    """
+    if counters_initialized(db):
+        return False
+    rebuild_counters(db)
+    db.commit()
+    return True
+
+
+def ensure_task_spans(db: Session) -> bool:
+    """
+    计数器早于任务跨度计数器创建（旧数据库升级）时补算每个用户的最长任务跨度，返回是否执行了补算
+    """
+    if db.scalar(select(UsageCounter.scope).where(UsageCounter.name == TASK_MAX_SPAN).limit(1)) is not None:
+        return False
+    spans = _task_spans(db)
+    if not spans:
+        return False
+    now = datetime.utcnow()
+    db.execute(insert(UsageCounter), [
+        {"scope": user_id, "name": TASK_MAX_SPAN, "value": span, "updated_at": now}
+        for user_id, span in spans.items()
+    ])
+    db.commit()
+    return True
+
+
+def main():
+    """主函数"""
+    # 设置控制台编码为 UTF-8
+    if sys.platform == "win32":
+        os.system("chcp 65001 >nul 2>&1")
+
+    print("=" * 60)
+    print("  AI时间管理系统 - 重建统计计数器")
+    print("=" * 60)
+    print_db_info()
+    print("")
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        written = rebuild_counters(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[错误] 计数器重建失败: {str(e)}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"[完成] 已重建 {written} 个计数器")
+
+
+if __name__ == "__main__":
+    main()
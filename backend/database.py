@@ -1,11 +1,16 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 import os
 
 # Get database type from environment (default: sqlite)
 DATABASE_TYPE = os.getenv("DATABASE_TYPE", "sqlite")
 
+# Use the async engine for request handling (set DATABASE_ASYNC=false to force the sync fallback)
+DATABASE_ASYNC = os.getenv("DATABASE_ASYNC", "true").lower() in ("1", "true", "yes")
+
 if DATABASE_TYPE.lower() == "mysql":
     # MySQL configuration
     DATABASE_HOST = os.getenv("DATABASE_HOST", "localhost")
@@ -13,10 +18,14 @@ if DATABASE_TYPE.lower() == "mysql":
     DATABASE_NAME = os.getenv("DATABASE_NAME", "s2x3sgo2")
     DATABASE_USER = os.getenv("DATABASE_USER", "root")
     DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD", "")
-    
+
+    # Async MySQL driver: aiomysql (default) or asyncmy
+    DATABASE_ASYNC_DRIVER = os.getenv("DATABASE_ASYNC_DRIVER", "aiomysql")
+
     # Create MySQL database URL
     DATABASE_URL = f"mysql+pymysql://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}?charset=utf8mb4"
-    
+    ASYNC_DATABASE_URL = f"mysql+{DATABASE_ASYNC_DRIVER}://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}?charset=utf8mb4"
+
     # MySQL engine configuration
     engine = create_engine(
         DATABASE_URL,
@@ -24,31 +33,157 @@ if DATABASE_TYPE.lower() == "mysql":
         pool_recycle=3600,
         echo=False
     )
+    async_engine_options = {"pool_pre_ping": True, "pool_recycle": 3600, "echo": False}
 else:
     # SQLite configuration (default)
     DATABASE_PATH = os.getenv("DATABASE_PATH", "./data/ai_time_management.db")
-    
+    DATABASE_ASYNC_DRIVER = "aiosqlite"
+
     # Ensure data directory exists
     os.makedirs(os.path.dirname(DATABASE_PATH) if os.path.dirname(DATABASE_PATH) else "./data", exist_ok=True)
-    
+
     # Create SQLite database URL
     DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
-    
+    ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+
     # SQLite engine configuration
     engine = create_engine(
         DATABASE_URL,
         connect_args={"check_same_thread": False},  # Needed for SQLite
         echo=False
     )
+    async_engine_options = {"echo": False}
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create async engine and session factory (falls back to the sync engine if the driver is missing)
+async_engine = None
+AsyncSessionLocal = None
+if DATABASE_ASYNC:
+    try:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_engine_options)
+        # expire_on_commit=False: attributes can't be lazily reloaded outside the greenlet
+        AsyncSessionLocal = async_sessionmaker(
+            bind=async_engine,
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False
+        )
+    except ImportError as e:
+        print(f"⚠️  Async database driver unavailable ({e}), using sync fallback")
+
 # Create base class for models
 Base = declarative_base()
 
+
+class SyncStreamAdapter:
+    """
+    Exposes AsyncResult.partitions() over a sync Result.
+    Each batch is fetched in the threadpool, so rows are never all buffered at once.
+    """
+
+    def __init__(self, result):
+        self.result = result
+
+    async def partitions(self, size=None):
+        try:
+            while True:
+                rows = await run_in_threadpool(self.result.fetchmany, size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            await run_in_threadpool(self.result.close)
+
+
+class SyncSessionAdapter:
+    """
+    Exposes the AsyncSession API over a sync Session.
+    Each database call runs in the threadpool so it never blocks the event loop.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    def expunge(self, instance):
+        self.sync_session.expunge(instance)
+
+    def _execute_buffered(self, statement, *args, **kwargs):
+        result = self.sync_session.execute(statement, *args, **kwargs)
+        # Fetch rows inside the worker thread, like AsyncSession's buffered results
+        if getattr(result, "returns_rows", True):
+            try:
+                return result.freeze()()
+            except NotImplementedError:
+                # ORM bulk INSERT/UPDATE (executemany) results carry no rows to buffer
+                pass
+        return result
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self._execute_buffered, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def stream(self, statement, *args, **kwargs):
+        result = await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+        return SyncStreamAdapter(result)
+
+    async def scalars(self, statement, *args, **kwargs):
+        result = await self.execute(statement, *args, **kwargs)
+        return result.scalars()
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self, objects=None):
+        await run_in_threadpool(self.sync_session.flush, objects)
+
+    async def refresh(self, instance, attribute_names=None):
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+
 # Dependency to get database session
-def get_db():
+async def get_db():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SyncSessionAdapter(SessionLocal(expire_on_commit=False))
+        try:
+            yield db
+        finally:
+            await db.close()
+
+# Session context manager for work outside the request scope (streaming responses, startup)
+db_session = asynccontextmanager(get_db)
+
+# Sync session dependency (scripts, admin initialization)
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
@@ -63,4 +198,7 @@ def print_db_info():
     else:
         print(f"📊 Using SQLite Database: {DATABASE_PATH}")
         print(f"💡 Tip: Set DATABASE_TYPE=mysql to use MySQL instead")
-
+    if async_engine is not None:
+        print(f"⚡ Async driver: {DATABASE_ASYNC_DRIVER}")
+    else:
+        print("🐢 Async driver disabled, sync sessions run in the threadpool")
@@ -0,0 +1,68 @@
+"""
+列表接口的条件 GET
+
+每个用户的每个集合（tasks、insights、goals、habits）有一个版本号计数器，
+写操作在同一事务内把它加一。列表响应携带弱 ETag（集合 + 版本号 + 查询参数摘要），
+客户端轮询时带上 If-None-Match，版本未变则直接返回 304，不查询也不序列化数据行
+"""
+import hashlib
+import json
+from typing import Optional
+
+from fastapi import Request, Response
+
+import counters
+
+ETAG_HEADER = "ETag"
+# 浏览器每次都需要向服务端确认，且响应只能保存在用户自己的缓存中
+CACHE_CONTROL = "private, no-cache"
+
+
+def collection_etag(collection: str, version: int, user_id: str, request: Request, variant: str = "") -> str:
+    """
+    同一版本下不同的筛选 / 分页参数返回不同的内容，因此把查询参数一并计入；
+    计入用户 ID，避免同一浏览器切换账号后用到另一个账号的缓存；
+    variant 为版本号之外影响内容的因素（如随日期变化的当前连续打卡天数）
+    """
+    params = sorted(request.query_params.multi_items())
+    key = [user_id, params, variant] if variant else [user_id, params]
+    digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()[:16]
+    return f'W/"{collection}-{version}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match 使用弱比较：忽略 W/ 前缀，支持逗号分隔的多个值和 *
+    """
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    if "*" in candidates:
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any((value[2:] if value.startswith("W/") else value) == opaque for value in candidates)
+
+
+async def not_modified(request: Request, response: Response, db, user_id: str, collection: str,
+                       variant: str = "") -> Optional[Response]:
+    """
+    读取集合版本号并计算 ETag：与 If-None-Match 匹配时返回 304 响应，由路由直接返回；
+    否则把 ETag 写入 response 并返回 None，路由继续查询
+    必须在查询数据行之前调用：两者之间发生的写入只会让下一次轮询多拿一次完整列表，不会漏掉更新
+    """
+    name = counters.collection_version(collection)
+    version = (await counters.read(db, user_id, [name]))[name]
+    etag = collection_etag(collection, version, user_id, request, variant)
+    headers = {ETAG_HEADER: etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+__all__ = [
+    "ETAG_HEADER",
+    "collection_etag",
+    "etag_matches",
+    "not_modified"
+]
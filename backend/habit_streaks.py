@@ -0,0 +1,212 @@
+"""
+习惯打卡 - 打卡日期按连续区间存储在 habit_checkin_runs（每段连续打卡一行）
+打卡 / 取消打卡只读写相邻的一两个区间，Habit.streak、longest_streak 增量维护；
+热力图按区间范围查询，不加载完整历史
+运行此脚本可把旧的 Habit.completed_dates（JSON 日期数组）迁移为区间
+"""
+from datetime import date, timedelta
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import delete, func, insert, null, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine, Base, print_db_info
+from models import Habit, HabitCheckinRun
+import sys
+import os
+
+ONE_DAY = timedelta(days=1)
+
+Run = Tuple[date, date]
+
+
+def _run_key(habit_id: str, start_date: date):
+    return (HabitCheckinRun.habit_id == habit_id) & (HabitCheckinRun.start_date == start_date)
+
+
+async def _run_ending_on_or_after(db, habit_id: str, day: date):
+    """
+    区间互不重叠，第一个 end_date >= day 的区间要么包含 day，要么在 day 之后
+    """
+    return (await db.execute(select(
+        HabitCheckinRun.start_date, HabitCheckinRun.end_date, HabitCheckinRun.length
+    ).where(
+        HabitCheckinRun.habit_id == habit_id,
+        HabitCheckinRun.end_date >= day
+    ).order_by(HabitCheckinRun.end_date).limit(1))).first()
+
+
+async def check_in(db, habit: Habit, day: date) -> bool:
+    """
+    记录 day 的打卡，与前后相邻的区间合并；已打卡时返回 False。由调用方负责 commit
+    """
+    after = await _run_ending_on_or_after(db, habit.id, day)
+    if after is not None and after.start_date <= day:
+        return False
+    right = after if after is not None and after.start_date == day + ONE_DAY else None
+    left = (await db.execute(select(HabitCheckinRun.start_date).where(
+        HabitCheckinRun.habit_id == habit.id,
+        HabitCheckinRun.end_date == day - ONE_DAY
+    ))).first()
+
+    start = left.start_date if left else day
+    end = right.end_date if right else day
+    length = (end - start).days + 1
+    if left:
+        await db.execute(update(HabitCheckinRun).where(_run_key(habit.id, start)).values(end_date=end, length=length))
+        if right:
+            await db.execute(delete(HabitCheckinRun).where(_run_key(habit.id, right.start_date)))
+    elif right:
+        await db.execute(update(HabitCheckinRun).where(_run_key(habit.id, right.start_date)).values(start_date=start, length=length))
+    else:
+        await db.execute(insert(HabitCheckinRun).values(habit_id=habit.id, start_date=start, end_date=end, length=length))
+
+    if habit.last_checkin_date is None or end >= habit.last_checkin_date:
+        habit.streak = length
+        habit.last_checkin_date = end
+    habit.longest_streak = max(habit.longest_streak or 0, length)
+    return True
+
+
+async def uncheck(db, habit: Habit, day: date) -> bool:
+    """
+    取消 day 的打卡，必要时把所在区间一分为二；未打卡时返回 False。由调用方负责 commit
+    只有删除了最长区间中的一天时才需要按索引重新取 MAX(length)
+    """
+    run = await _run_ending_on_or_after(db, habit.id, day)
+    if run is None or run.start_date > day:
+        return False
+
+    key = _run_key(habit.id, run.start_date)
+    if run.start_date == day == run.end_date:
+        await db.execute(delete(HabitCheckinRun).where(key))
+    elif day == run.start_date:
+        await db.execute(update(HabitCheckinRun).where(key).values(start_date=day + ONE_DAY, length=run.length - 1))
+    elif day == run.end_date:
+        await db.execute(update(HabitCheckinRun).where(key).values(end_date=day - ONE_DAY, length=run.length - 1))
+    else:
+        await db.execute(update(HabitCheckinRun).where(key).values(end_date=day - ONE_DAY, length=(day - run.start_date).days))
+        await db.execute(insert(HabitCheckinRun).values(
+            habit_id=habit.id, start_date=day + ONE_DAY, end_date=run.end_date, length=(run.end_date - day).days
+        ))
+
+    if run.end_date == habit.last_checkin_date:
+        if day < run.end_date:
+            habit.streak = (run.end_date - day).days
+        elif day > run.start_date:
+            habit.streak = run.length - 1
+            habit.last_checkin_date = day - ONE_DAY
+        else:
+            latest = (await db.execute(select(HabitCheckinRun.end_date, HabitCheckinRun.length).where(
+                HabitCheckinRun.habit_id == habit.id
+            ).order_by(HabitCheckinRun.end_date.desc()).limit(1))).first()
+            habit.streak = latest.length if latest else 0
+            habit.last_checkin_date = latest.end_date if latest else None
+    if run.length >= (habit.longest_streak or 0):
+        habit.longest_streak = await db.scalar(select(func.max(HabitCheckinRun.length)).where(
+            HabitCheckinRun.habit_id == habit.id
+        )) or 0
+    return True
+
+
+async def checked_days(db, habit_id: str, start: date, end: date) -> List[date]:
+    """
+    返回 [start, end] 内已打卡的日期（升序），只读取与该范围相交的区间
+    """
+    runs = await db.execute(select(HabitCheckinRun.start_date, HabitCheckinRun.end_date).where(
+        HabitCheckinRun.habit_id == habit_id,
+        HabitCheckinRun.end_date >= start,
+        HabitCheckinRun.start_date <= end
+    ).order_by(HabitCheckinRun.end_date))
+    days = []
+    for run_start, run_end in runs:
+        day = max(run_start, start)
+        while day <= min(run_end, end):
+            days.append(day)
+            day += ONE_DAY
+    return days
+
+
+def runs_from_dates(days: Iterable[date]) -> List[Run]:
+    """
+    把日期集合压缩为按时间排序的连续区间
+    """
+    runs: List[Run] = []
+    for day in sorted(set(days)):
+        if runs and runs[-1][1] + ONE_DAY == day:
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+def _parse_dates(values) -> List[date]:
+    days = []
+    for value in values or []:
+        try:
+            days.append(date.fromisoformat(str(value)[:10]))
+        except ValueError:
+            continue
+    return days
+
+
+def migrate_completed_dates(db: Session) -> int:
+    """
+    把旧的 completed_dates 写入 habit_checkin_runs 并重新计算 streak，随后清空该字段
+    返回迁移的习惯数，由调用方负责 commit
+    """
+    habits = db.scalars(select(Habit).where(Habit.completed_dates.is_not(None))).all()
+    for habit in habits:
+        runs = runs_from_dates(_parse_dates(habit.completed_dates))
+        db.execute(delete(HabitCheckinRun).where(HabitCheckinRun.habit_id == habit.id))
+        if runs:
+            db.execute(insert(HabitCheckinRun), [
+                {"habit_id": habit.id, "start_date": start, "end_date": end, "length": (end - start).days + 1}
+                for start, end in runs
+            ])
+        habit.streak = (runs[-1][1] - runs[-1][0]).days + 1 if runs else 0
+        habit.last_checkin_date = runs[-1][1] if runs else None
+        habit.longest_streak = max(((end - start).days + 1 for start, end in runs), default=0)
+        habit.completed_dates = null()
+    return len(habits)
+
+
+def ensure_habit_runs(db: Session) -> int:
+    """
+    旧数据库升级时迁移 completed_dates，返回迁移的习惯数
+    """
+    migrated = migrate_completed_dates(db)
+    if migrated:
+        db.commit()
+    return migrated
+
+
+def main():
+    """主函数"""
+    # 设置控制台编码为 UTF-8
+    if sys.platform == "win32":
+        os.system("chcp 65001 >nul 2>&1")
+
+    print("=" * 60)
+    print("  AI时间管理系统 - 迁移习惯打卡记录")
+    print("=" * 60)
+    print_db_info()
+    print("")
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        migrated = migrate_completed_dates(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[错误] 打卡记录迁移失败: {str(e)}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"[完成] 已迁移 {migrated} 个习惯的打卡记录")
+
+
+if __name__ == "__main__":
+    main()
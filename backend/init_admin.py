@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from passlib.context import CryptContext
 from database import SessionLocal, engine, Base
 from models import User
+import counters
 import sys
 import os
 
@@ -30,6 +31,11 @@ def create_admin_user(db: Session):
             print("[警告] 管理员账户已存在")
             print(f"   邮箱: admin@admin.com")
             print(f"   用户ID: {existing_admin.id}")
+            # 旧数据库升级：is_admin 字段新增前创建的管理员账户
+            if not existing_admin.is_admin:
+                existing_admin.is_admin = True
+                db.commit()
+                print("[完成] 已为该账户开启管理员权限")
             return False
         
         # 创建管理员用户
@@ -41,10 +47,14 @@ def create_admin_user(db: Session):
             language="zh-CN",
             subscription_tier="pro",  # 给管理员最高权限
             occupation="System Administrator",
-            work_mode="office"
+            work_mode="office",
+            is_admin=True
         )
         
         db.add(admin_user)
+        # 计数器尚未初始化时由启动时的全量重建统计
+        if counters.counters_initialized(db):
+            counters.apply_sync(db, counters.user_changes(admin_user.subscription_tier))
         db.commit()
         db.refresh(admin_user)
         
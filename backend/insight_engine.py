@@ -0,0 +1,343 @@
+"""
+洞察引擎 - 在服务端按列分析用户任务并生成 Insight
+对应前端 src/services/aiInsights.ts（identifyDarkTime、analyzeTaskParallelization、
+generateWorkLifeBalanceInsights、generateComprehensiveInsights），但对一个时间窗口汇总，而不是逐个时间块生成
+
+只读取窗口内任务的开始、结束、时长、分类和文本列，转为 NumPy 数组后向量化计算：
+- 暗时间：每天 06:00-23:00 内任务之间的空隙，按时段和长度分类
+- 重叠：与之前任务时间冲突的任务及重叠时长
+- 各分类的时间占比、日均工作 / 个人时间
+"""
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# 默认分析最近多少天的任务，以及单次请求允许的最大窗口
+INSIGHT_WINDOW_DAYS = int(os.getenv("INSIGHT_WINDOW_DAYS", "28"))
+INSIGHT_MAX_WINDOW_DAYS = int(os.getenv("INSIGHT_MAX_WINDOW_DAYS", "366"))
+
+# 与 aiInsights.ts 一致：一天的可安排时段，以及计入暗时间的最短空隙（分钟）
+DAY_START_HOUR = 6
+DAY_END_HOUR = 23
+MIN_GAP_MINUTES = 15
+MIN_EVENING_MINUTES = 30
+
+WORK_CATEGORIES = {"work", "工作"}
+PERSONAL_CATEGORIES = {"personal", "个人", "health", "健康"}
+PASSIVE_KEYWORDS = ["通勤", "等待", "排队", "乘车", "飞机", "高铁"]
+ACTIVE_KEYWORDS = ["学习", "阅读", "思考", "规划", "整理"]
+EXERCISE_KEYWORDS = ["运动", "健身", "跑步", "瑜伽", "锻炼"]
+
+# 用户画像：按顺序匹配第一个命中的关键词组
+PROFILES = [
+    (["写作", "创作", "文章", "内容", "设计"], "深度内容创作者", "深度工作型",
+     ["保持创作灵感", "提升内容质量", "高效完成创作任务"], ["灵感捕捉困难", "长时间专注写作", "创意枯竭"]),
+    (["学习", "课程", "阅读", "研究", "练习"], "自我提升学习者", "成长型",
+     ["系统化学习", "知识内化", "技能提升"], ["学习时间碎片化", "知识吸收效率低", "缺乏持续动力"]),
+    (["会议", "协调", "管理", "汇报", "评审"], "项目协调管理者", "协调型",
+     ["高效协调团队", "推进项目进度", "平衡多任务"], ["会议过多", "深度工作时间不足", "精力分散"]),
+    (["开发", "编码", "调试", "代码", "技术"], "技术开发工程师", "深度工作型",
+     ["深度专注编码", "解决技术难题", "提升代码质量"], ["频繁被打断", "需要长时间专注", "技术攻坚压力"]),
+]
+DEFAULT_IDENTITY = "知识工作者"
+
+# 空隙类型，顺序即 analyzeTimeBlock 中的判断顺序
+COMMUTE, BREAK, DEEP_WORK, SHALLOW_WORK, FREE, EVENING = range(6)
+GAP_LABELS = {
+    COMMUTE: "通勤时间",
+    BREAK: "午休时间",
+    DEEP_WORK: "深度工作黄金时段",
+    SHALLOW_WORK: "碎片时间",
+    FREE: "自由时间块",
+    EVENING: "晚间自由时间",
+}
+
+
+@dataclass
+class TaskColumns:
+    """
+    窗口内任务的列式数据，时间已换算为用户本地时间
+    """
+    start: np.ndarray      # datetime64[m]，无开始时间为 NaT
+    end: np.ndarray        # datetime64[m]，无 end_time 时为 start + duration，无开始时间为 NaT
+    minutes: np.ndarray    # float64，duration，缺失时用 end - start
+    category: np.ndarray   # int64，categories 中的下标
+    categories: List[str]
+    texts: np.ndarray      # str，小写的 "标题 描述"
+
+
+def _to_local(values: np.ndarray, zone: tzinfo) -> np.ndarray:
+    """
+    UTC 的 datetime64[m] 逐个换算为 zone 的本地时间（NaT 保持不变）；
+    窗口跨夏令时切换时，每个时间使用它当时的 UTC 偏移
+    """
+    return np.array([
+        None if value is None else value.replace(tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None)
+        for value in values.astype(object)
+    ], dtype="datetime64[m]")
+
+
+def load_columns(rows: Sequence, zone: tzinfo) -> TaskColumns:
+    """
+    rows 为 (start_time, end_time, duration, category, title, description) 元组，时间为 UTC；
+    时长与缺失的结束时间按 UTC 计算，最后换算为 zone 的本地时间
+    """
+    start = np.array([row[0] for row in rows], dtype="datetime64[m]")
+    end = np.array([row[1] for row in rows], dtype="datetime64[m]")
+    duration = np.array([np.nan if row[2] is None else row[2] for row in rows], dtype=np.float64)
+    span = (end - start).astype(np.float64)
+    span[np.isnat(start) | np.isnat(end)] = np.nan
+    minutes = np.nan_to_num(np.where(np.isnan(duration), span, duration), nan=0.0).clip(min=0)
+    # 与 routers/tasks.py 的 _task_end 一致：没有 end_time 时结束于 start_time + duration
+    missing_end = np.isnat(end) & ~np.isnat(start)
+    end[missing_end] = start[missing_end] + minutes[missing_end].astype("timedelta64[m]")
+    start, end = _to_local(start, zone), _to_local(end, zone)
+    categories, category = np.unique(np.array([(row[3] or "").strip() for row in rows], dtype=str), return_inverse=True)
+    texts = np.array([f"{row[4] or ''} {row[5] or ''}".lower() for row in rows], dtype=str)
+    return TaskColumns(start, end, minutes, category.astype(np.int64), categories.tolist(), texts)
+
+
+def _contains_any(texts: np.ndarray, keywords: List[str]) -> np.ndarray:
+    found = np.zeros(texts.shape, dtype=bool)
+    for keyword in keywords:
+        found |= np.char.find(texts, keyword) >= 0
+    return found
+
+
+def dark_time(cols: TaskColumns) -> Dict[str, np.ndarray]:
+    """
+    计算每天 06:00-23:00 内任务之间及最后一个任务之后的空隙，返回 start / minutes / kind 三个数组
+    任务先裁剪到所在日的时段内，因此前一天的结束时间总早于后一天的开始，
+    一次全局的 maximum.accumulate 即可得到"截至当前任务已占用到的时间"
+    """
+    timed = ~np.isnat(cols.start) & ~np.isnat(cols.end)
+    start, end = cols.start[timed], cols.end[timed]
+    order = np.argsort(start, kind="stable")
+    start, end = start[order], end[order]
+
+    day = start.astype("datetime64[D]").astype("datetime64[m]")
+    day_start = day + np.timedelta64(DAY_START_HOUR * 60, "m")
+    day_end = day + np.timedelta64(DAY_END_HOUR * 60, "m")
+    start = np.clip(start, day_start, day_end)
+    end = np.clip(end, start, day_end)
+
+    busy_until = np.maximum.accumulate(end) if len(end) else end
+    previous = np.concatenate([day_start[:1], busy_until[:-1]])
+    previous = np.maximum(previous, day_start)
+    gap = (start - previous).astype(np.float64)
+    between = gap >= MIN_GAP_MINUTES
+
+    # 每天最后一个任务之后到 23:00 的空隙
+    last_of_day = np.append(day[1:] != day[:-1], True) if len(day) else np.zeros(0, dtype=bool)
+    evening = (day_end - busy_until).astype(np.float64)
+    after = last_of_day & (evening >= MIN_EVENING_MINUTES)
+
+    gap_start = np.concatenate([previous[between], busy_until[after]])
+    gap_minutes = np.concatenate([gap[between], evening[after]])
+    hour = (gap_start - gap_start.astype("datetime64[D]")).astype("timedelta64[h]").astype(np.int64)
+    d = gap_minutes
+    kind = np.select([
+        (((hour >= 7) & (hour <= 9)) | ((hour >= 17) & (hour <= 19))) & (d >= 20) & (d <= 120),
+        (hour >= 12) & (hour <= 14) & (d >= 30),
+        (d >= 90) & (((hour >= 9) & (hour <= 11)) | ((hour >= 14) & (hour <= 16))),
+        (d >= 15) & (d < 45),
+        d >= 45,
+    ], [COMMUTE, BREAK, DEEP_WORK, SHALLOW_WORK, FREE], default=-1)
+    kind[between.sum():] = EVENING
+    keep = kind >= 0
+    return {"start": gap_start[keep], "minutes": gap_minutes[keep], "kind": kind[keep]}
+
+
+def overlaps(cols: TaskColumns) -> Dict[str, float]:
+    """
+    按开始时间排序后，开始早于之前所有任务最晚结束时间的任务即与之前的任务冲突
+    """
+    timed = ~np.isnat(cols.start) & ~np.isnat(cols.end)
+    start, end = cols.start[timed], cols.end[timed]
+    order = np.argsort(start, kind="stable")
+    start, end = start[order], end[order]
+    if len(start) < 2:
+        return {"tasks": 0, "minutes": 0.0}
+    busy_until = np.maximum.accumulate(end)[:-1]
+    overlap = (np.minimum(end[1:], busy_until) - start[1:]).astype(np.float64)
+    overlap = overlap[overlap > 0]
+    return {"tasks": int(len(overlap)), "minutes": float(overlap.sum())}
+
+
+def category_minutes(cols: TaskColumns) -> Dict[str, float]:
+    totals = np.bincount(cols.category, weights=cols.minutes, minlength=len(cols.categories))
+    return {name: float(total) for name, total in zip(cols.categories, totals)}
+
+
+def active_days(cols: TaskColumns) -> int:
+    timed = ~np.isnat(cols.start)
+    return max(1, len(np.unique(cols.start[timed].astype("datetime64[D]"))))
+
+
+def profile(cols: TaskColumns, occupation: Optional[str]) -> Dict:
+    for keywords, identity, work_style, goals, challenges in PROFILES:
+        if _contains_any(cols.texts, keywords).any():
+            return {"identity": identity, "work_style": work_style, "goals": goals, "challenges": challenges}
+    return {"identity": occupation or DEFAULT_IDENTITY, "work_style": "平衡型", "goals": [], "challenges": []}
+
+
+def _insight(type: str, title: str, description: str, priority: str = "medium", action_text: Optional[str] = None) -> Dict:
+    return {
+        "type": type,
+        "title": title,
+        "description": description,
+        "priority": priority,
+        "actionable": action_text is not None,
+        "action_text": action_text,
+    }
+
+
+def _dark_time_advice(kind: int, minutes: int, identity: str, work_style: str):
+    if kind == COMMUTE:
+        if "学习者" in identity:
+            return f"💡 常见约{minutes}分钟通勤时间！建议使用骨传导耳机收听专业课程或有声书，既保证安全又能高效学习。", "设置通勤学习计划"
+        if "创作者" in identity:
+            return f"✨ 约{minutes}分钟通勤是灵感捕捉的黄金时段！建议使用语音备忘录随时记录创意闪现，或用思维导图整理创作思路。", "启用灵感捕捉系统"
+        return f"🎧 约{minutes}分钟通勤时间可以用来：1) 听播客学习行业知识 2) 复盘昨日工作 3) 规划今日重点。", "优化通勤时间利用"
+    if kind == BREAK:
+        return f"🧘 约{minutes}分钟午休时间：前20分钟用NSDR（非睡眠深度休息）恢复精力，之后散步或轻度运动，激活下午的工作状态。", "制定午休恢复计划"
+    if kind == DEEP_WORK:
+        if work_style == "深度工作型":
+            return f"🎯 常有约{minutes}分钟深度工作黄金时段！建议关闭所有通知，用番茄钟（25分钟专注+5分钟休息）处理最重要的创造性任务。", "锁定深度工作时段"
+        return f"⚡ 常有约{minutes}分钟完整时间块！建议安排战略规划、复杂问题解决、学习新技能等需要深度思考的任务。", "安排高价值任务"
+    if kind == SHALLOW_WORK:
+        return f"📋 约{minutes}分钟的碎片时间适合处理：1) 回复邮件/消息 2) 整理文档 3) 快速沟通 4) 日程规划。避免在此时段开始需要深度专注的任务。", "规划碎片任务清单"
+    if minutes < 120:
+        return None
+    if "创作者" in identity:
+        return f"🖥️ 常有约{minutes}分钟大块自由时间！可以为创作准备双屏环境，一屏写作、一屏查阅资料。", "优化创作环境"
+    if "开发" in identity:
+        return f"💻 常有约{minutes}分钟连续时间！这是攻克技术难题的最佳时机：准备好开发环境，关闭干扰源，保持专注节奏。", "安排技术攻坚任务"
+    return f"🌟 常有约{minutes}分钟完整时间块！建议用于战略思考和规划、学习新技能或推进个人项目。", "规划个人成长任务"
+
+
+def build_insights(cols: TaskColumns, days: int, occupation: Optional[str] = None) -> List[Dict]:
+    """
+    由列式任务数据生成洞察（Insight 的列值，不含 id 等），纯计算，可在线程池中运行
+    """
+    insights: List[Dict] = []
+    if not len(cols.minutes):
+        return insights
+
+    user_profile = profile(cols, occupation)
+    identity, work_style = user_profile["identity"], user_profile["work_style"]
+    if identity not in (DEFAULT_IDENTITY, occupation):
+        insights.append(_insight(
+            "general",
+            f"🎯 AI识别：你是{identity}",
+            f"基于你最近{days}天的任务分析，你的核心目标是：{'、'.join(user_profile['goals'])}。"
+            f"主要挑战：{'、'.join(user_profile['challenges'])}。",
+            priority="high"
+        ))
+
+    # 暗时间：同一类型的空隙汇总为一条洞察
+    gaps = dark_time(cols)
+    for kind in np.unique(gaps["kind"]):
+        selected = gaps["kind"] == kind
+        minutes = int(np.median(gaps["minutes"][selected]))
+        advice = _dark_time_advice(int(kind), minutes, identity, work_style)
+        if advice is None:
+            continue
+        hour = int(np.median((gaps["start"][selected] - gaps["start"][selected].astype("datetime64[D]")).astype("timedelta64[h]").astype(np.int64)))
+        insights.append(_insight(
+            "time-management",
+            f"暗时间挖掘：{GAP_LABELS[int(kind)]}",
+            f"最近{days}天出现{int(selected.sum())}次，多在{hour}点前后。{advice[0]}",
+            priority="high" if minutes >= 60 else "medium",
+            action_text=advice[1]
+        ))
+
+    conflict = overlaps(cols)
+    if conflict["tasks"]:
+        insights.append(_insight(
+            "time-management",
+            "⚠️ 任务时间冲突",
+            f"最近{days}天有{conflict['tasks']}个任务与其他任务时间重叠，共约{conflict['minutes'] / 60:.1f}小时被重复安排。"
+            f"建议调整开始时间，或把能同时进行的任务合并为一个时间块。",
+            priority="high",
+            action_text="调整冲突任务"
+        ))
+
+    passive = _contains_any(cols.texts, PASSIVE_KEYWORDS)
+    active = _contains_any(cols.texts, ACTIVE_KEYWORDS) & ~passive
+    if passive.any() and active.any():
+        saved = int(min(cols.minutes[passive].sum(), cols.minutes[active].sum()) or 30)
+        insights.append(_insight(
+            "productivity",
+            "任务并行机会：被动等待 + 主动学习",
+            f"💡 最近{days}天有{int(passive.sum())}个通勤、等待类任务，{int(active.sum())}个学习、阅读类任务。"
+            f"使用移动设备或语音工具在等待时完成学习任务，最多可节省约{saved}分钟！",
+            priority="high",
+            action_text="设置并行任务"
+        ))
+
+    shares = category_minutes(cols)
+    total = sum(shares.values())
+    if total > 0:
+        top = sorted(((minutes, name or "未分类") for name, minutes in shares.items() if minutes > 0), reverse=True)[:5]
+        insights.append(_insight(
+            "productivity",
+            "📊 时间分配概览",
+            f"最近{days}天共安排{total / 60:.1f}小时：" + "，".join(
+                f"{name} {minutes / total:.0%}（{minutes / 60:.1f}小时）" for minutes, name in top
+            ) + "。"
+        ))
+
+    # 工作生活平衡：按有任务的天数计算日均值，与前端按单日判断的阈值一致
+    n_days = active_days(cols)
+    work = sum(m for name, m in shares.items() if name.lower() in WORK_CATEGORIES) / n_days
+    personal = sum(m for name, m in shares.items() if name.lower() in PERSONAL_CATEGORIES) / n_days
+    if work > 480 and personal < 60:
+        insights.append(_insight(
+            "general",
+            "⚠️ 工作生活失衡预警",
+            f"最近{days}天日均工作{work / 60:.1f}小时，个人时间仅{personal:.0f}分钟。长期高强度工作会导致效率下降和倦怠。"
+            f"建议：1) 每工作90分钟休息10分钟 2) 安排至少30分钟运动或放松 3) 设置工作结束时间边界",
+            priority="high",
+            action_text="添加休息和个人时间"
+        ))
+    if work > 240 and not _contains_any(cols.texts, EXERCISE_KEYWORDS).any():
+        insights.append(_insight(
+            "health",
+            "🏃 建议增加运动时间",
+            f"最近{days}天没有运动安排。适度运动可提升认知能力和工作效率。"
+            f"建议：1) 午休后散步15分钟 2) 工作间隙做办公室拉伸 3) 晚间安排30分钟有氧运动",
+            action_text="添加运动计划"
+        ))
+
+    return insights
+
+
+def analyze(rows: Sequence, zone: tzinfo, days: int, occupation: Optional[str] = None) -> List[Dict]:
+    """
+    转换列并生成洞察，整个过程不访问数据库，由调用方放入线程池执行
+    zone 为用户时区（rollups.user_zone），ZoneInfo 可以传入进程池
+    """
+    return build_insights(load_columns(rows, zone), days, occupation)
+
+
+def window_start(days: int, now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.utcnow()) - timedelta(days=days)
+
+
+__all__ = [
+    "INSIGHT_WINDOW_DAYS",
+    "INSIGHT_MAX_WINDOW_DAYS",
+    "TaskColumns",
+    "load_columns",
+    "dark_time",
+    "overlaps",
+    "category_minutes",
+    "profile",
+    "build_insights",
+    "analyze",
+    "window_start"
+]
@@ -0,0 +1,342 @@
+"""
+后台任务调度 - 每天为任务有变化的用户生成洞察，把重计算移出请求路径
+
+调度器默认随 Web 进程的 lifespan 启动（JOB_SCHEDULER_ENABLED）。多 worker / 多实例部署时，
+同一天的任务通过 job_runs 主键只会被一个进程认领；认领者的心跳超过 JOB_LEASE_SECONDS 未更新时，
+其他进程接手并从 cursor 记录的位置继续。每批用户的洞察、高水位和进度在同一个事务中提交。
+用户的任务数据（tasks.updated_at 与任务墓碑）自上次处理后没有变化时跳过。
+
+也可以在 Web 进程中关闭调度器（JOB_SCHEDULER_ENABLED=false），改为运行独立 worker：
+
+用法（在 backend 目录下运行）:
+    python jobs.py worker      常驻运行调度器
+    python jobs.py run-once    立即执行当天的洞察任务
+"""
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+import insight_engine
+import rollups
+from database import db_session, engine, Base, print_db_info
+from logger import logger, start_logging, shutdown_logging
+from models import JobRun, JobUserMark, SyncTombstone, Task, User
+from routers.insights import load_task_columns, save_generated_insights
+
+JOB_SCHEDULER_ENABLED = os.getenv("JOB_SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+# 每天 UTC 几点之后开始当天的洞察任务
+INSIGHT_JOB_HOUR = int(os.getenv("INSIGHT_JOB_HOUR", "3"))
+INSIGHT_JOB_BATCH_SIZE = int(os.getenv("INSIGHT_JOB_BATCH_SIZE", "200"))
+# 分析用的进程池大小，默认 0 表示在线程池中计算；
+# 大于 0 时进程池只在认领到当天任务的进程中创建，任务结束即关闭，不会随每个 Web worker 常驻
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", "0"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "60"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+# 执行期间按此间隔刷新心跳，与批次耗时无关；一次刷新失败后租约仍有余量
+JOB_HEARTBEAT_SECONDS = JOB_LEASE_SECONDS / 3
+
+INSIGHTS_JOB = "insights"
+
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+def owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def claim_run(db, job: str, day: date, owner: str, now: Optional[datetime] = None) -> Optional[JobRun]:
+    """
+    认领 job 在 day 的执行，返回 JobRun；已完成或正由其他进程执行时返回 None
+    新建时依靠主键冲突判定归属；接手过期的执行时按旧心跳做 compare-and-swap，只有一个进程能成功
+    """
+    now = now or datetime.utcnow()
+    run_id = f"{job}:{day.isoformat()}"
+    run = await db.get(JobRun, run_id)
+    if run is None:
+        db.add(JobRun(id=run_id, job=job, status=RUNNING, owner=owner, started_at=now, heartbeat_at=now))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return None
+        return await db.get(JobRun, run_id)
+
+    # 失败的执行同样等租约过期后再重试，避免每次轮询都重复失败
+    if run.status == COMPLETED or run.heartbeat_at > now - timedelta(seconds=JOB_LEASE_SECONDS):
+        return None
+    result = await db.execute(update(JobRun).where(
+        JobRun.id == run_id,
+        JobRun.heartbeat_at == run.heartbeat_at
+    ).values(owner=owner, status=RUNNING, heartbeat_at=now, error=None))
+    await db.commit()
+    if result.rowcount != 1:
+        return None
+    await db.refresh(run)
+    logger.info(f"🔁 Resuming job {run_id} after user {run.cursor or '(start)'}")
+    return run
+
+
+def _task_high_water(row) -> Optional[datetime]:
+    values = [value for value in (row.updated, row.deleted) if value is not None]
+    return max(values) if values else None
+
+
+async def _user_batch(db, cursor: Optional[str], size: int) -> list:
+    """
+    按 id 顺序取下一批用户及其任务高水位；两个 MAX 都是按 (user_id, ...) 索引的单点查找
+    """
+    updated = select(func.max(Task.updated_at)).where(Task.user_id == User.id).scalar_subquery()
+    deleted = select(func.max(SyncTombstone.deleted_at)).where(
+        SyncTombstone.user_id == User.id,
+        SyncTombstone.collection == "tasks"
+    ).scalar_subquery()
+    query = select(
+        User.id, User.timezone, User.occupation,
+        updated.label("updated"), deleted.label("deleted"), JobUserMark.high_water
+    ).outerjoin(JobUserMark, and_(JobUserMark.user_id == User.id, JobUserMark.job == INSIGHTS_JOB))
+    if cursor:
+        query = query.where(User.id > cursor)
+    return (await db.execute(query.order_by(User.id).limit(size))).all()
+
+
+class JobScheduler:
+    """
+    进程内调度器：每 JOB_POLL_SECONDS 检查一次当天的洞察任务是否需要执行
+    """
+
+    def __init__(self):
+        self.owner = owner_id()
+        self._task: Optional[asyncio.Task] = None
+        self._triggered = set()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> Optional[ProcessPoolExecutor]:
+        if JOB_WORKER_PROCESSES > 0 and self._executor is None:
+            # spawn：Web 进程中有日志线程和数据库连接，fork 出的子进程可能继承到被占用的锁
+            self._executor = ProcessPoolExecutor(
+                max_workers=JOB_WORKER_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _close_pool(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _analyze(self, rows: List[tuple], user) -> List[dict]:
+        args = (rows, rollups.user_zone(user.timezone), insight_engine.INSIGHT_WINDOW_DAYS, user.occupation)
+        pool = self._pool()
+        if pool is None:
+            return await run_in_threadpool(insight_engine.analyze, *args)
+        return await asyncio.get_running_loop().run_in_executor(pool, insight_engine.analyze, *args)
+
+    async def _process_batch(self, db, run_id: str, users: list) -> bool:
+        """
+        分析一批用户并提交结果与进度；租约已被其他进程接手时回滚并返回 False
+        """
+        due = []
+        for user in users:
+            high_water = _task_high_water(user)
+            if high_water is not None and (user.high_water is None or high_water > user.high_water):
+                due.append((user, high_water))
+
+        inputs = [[tuple(row) for row in await load_task_columns(db, user.id, insight_engine.INSIGHT_WINDOW_DAYS)] for user, _ in due]
+        # 同一批用户分散到进程池中并行分析
+        results = await asyncio.gather(*[self._analyze(rows, user) for rows, (user, _) in zip(inputs, due)], return_exceptions=True)
+
+        now = datetime.utcnow()
+        marks = []
+        failed = 0
+        for (user, high_water), result in zip(due, results):
+            if isinstance(result, Exception):
+                failed += 1
+                logger.error(f"❌ Insight generation failed for user {user.id}: {result}")
+                continue
+            await save_generated_insights(db, user.id, result)
+            marks.append({"job": INSIGHTS_JOB, "user_id": user.id, "high_water": high_water, "ran_at": now})
+
+        if marks:
+            await db.execute(delete(JobUserMark).where(
+                JobUserMark.job == INSIGHTS_JOB,
+                JobUserMark.user_id.in_([mark["user_id"] for mark in marks])
+            ))
+            await db.execute(insert(JobUserMark), marks)
+
+        checkpoint = await db.execute(update(JobRun).where(
+            JobRun.id == run_id,
+            JobRun.owner == self.owner
+        ).values(
+            cursor=users[-1].id,
+            processed=JobRun.processed + len(marks),
+            skipped=JobRun.skipped + len(users) - len(due),
+            failed=JobRun.failed + failed,
+            heartbeat_at=now
+        ))
+        if checkpoint.rowcount != 1:
+            await db.rollback()
+            return False
+        await db.commit()
+        return True
+
+    async def _heartbeat(self, run_id: str) -> None:
+        """
+        定时刷新心跳，单个批次耗时超过租约时也不会被其他进程接手；租约已丢失时停止
+        """
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                async with db_session() as db:
+                    result = await db.execute(update(JobRun).where(
+                        JobRun.id == run_id,
+                        JobRun.owner == self.owner,
+                        JobRun.status == RUNNING
+                    ).values(heartbeat_at=datetime.utcnow()))
+                    await db.commit()
+            except Exception as e:
+                # 例如 SQLite 写锁等待超时，下一次再试
+                logger.warning(f"⚠️  Heartbeat for job {run_id} failed: {str(e)}")
+                continue
+            if result.rowcount != 1:
+                return
+
+    async def run_insights(self, run: JobRun) -> None:
+        cursor = run.cursor
+        heartbeat = asyncio.create_task(self._heartbeat(run.id))
+        try:
+            while True:
+                async with db_session() as db:
+                    users = await _user_batch(db, cursor, INSIGHT_JOB_BATCH_SIZE)
+                    if not users:
+                        break
+                    if not await self._process_batch(db, run.id, users):
+                        logger.warning(f"⚠️  Lost the lease on job {run.id}, another process took over")
+                        return
+                    cursor = users[-1].id
+        except Exception as e:
+            async with db_session() as db:
+                await db.execute(update(JobRun).where(JobRun.id == run.id).values(
+                    status=FAILED, error=str(e)[:1000], heartbeat_at=datetime.utcnow()
+                ))
+                await db.commit()
+            raise
+        finally:
+            heartbeat.cancel()
+
+        async with db_session() as db:
+            await db.execute(update(JobRun).where(JobRun.id == run.id).values(
+                status=COMPLETED, finished_at=datetime.utcnow(), heartbeat_at=datetime.utcnow()
+            ))
+            await db.commit()
+            run = await db.get(JobRun, run.id)
+        logger.info(f"🌙 Job {run.id} completed: {run.processed} processed, {run.skipped} unchanged, {run.failed} failed")
+
+    async def tick(self, force: bool = False) -> Optional[str]:
+        """
+        到点（或 force=True）时认领并执行当天的洞察任务，返回执行的 JobRun.id
+        """
+        now = datetime.utcnow()
+        if not force and now.hour < INSIGHT_JOB_HOUR:
+            return None
+        async with db_session() as db:
+            run = await claim_run(db, INSIGHTS_JOB, now.date(), self.owner, now)
+        if run is None:
+            return None
+        logger.info(f"🌙 Job {run.id} started by {self.owner}")
+        try:
+            await self.run_insights(run)
+        finally:
+            self._close_pool()
+        return run.id
+
+    async def _tick_logged(self, force: bool = False) -> None:
+        try:
+            await self.tick(force)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Background job failed: {str(e)}")
+
+    async def run_forever(self) -> None:
+        while True:
+            await self._tick_logged()
+            await asyncio.sleep(JOB_POLL_SECONDS)
+
+    def trigger(self) -> None:
+        """
+        立即在后台执行一次当天的任务（不等 INSIGHT_JOB_HOUR），用于管理后台手动触发
+        """
+        task = asyncio.create_task(self._tick_logged(force=True))
+        self._triggered.add(task)
+        task.add_done_callback(self._triggered.discard)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._triggered):
+            task.cancel()
+        self._close_pool()
+
+
+job_scheduler = JobScheduler()
+
+
+async def _run_cli(command: str) -> None:
+    start_logging()
+    try:
+        if command == "worker":
+            logger.info(f"🌙 Job worker {job_scheduler.owner} started")
+            await job_scheduler.run_forever()
+        else:
+            run_id = await job_scheduler.tick(force=True)
+            print(f"[完成] 已执行 {run_id}" if run_id else "[信息] 今天的洞察任务已完成或正由其他进程执行")
+    finally:
+        await job_scheduler.stop()
+        shutdown_logging()
+
+
+def main():
+    """主函数"""
+    # 设置控制台编码为 UTF-8
+    if sys.platform == "win32":
+        os.system("chcp 65001 >nul 2>&1")
+
+    if sys.argv[1:] not in (["worker"], ["run-once"]):
+        print("用法: python jobs.py worker | run-once")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("  AI时间管理系统 - 后台任务")
+    print("=" * 60)
+    print_db_info()
+    print("")
+
+    Base.metadata.create_all(bind=engine)
+    try:
+        asyncio.run(_run_cli(sys.argv[1]))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+LLM 网关 - 服务端调用 OpenAI 兼容的 chat/completions 接口
+所有请求共用一个带连接池的 httpx.AsyncClient（keep-alive，安装 h2 时启用 HTTP/2），
+跨用户复用连接，避免每轮对话都重新进行 TLS 握手
+"""
+import json
+import os
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from logger import logger
+
+# 连接池与超时配置
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() in ("1", "true", "yes")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+
+# 未配置 api_endpoint 时各服务商的默认地址
+DEFAULT_ENDPOINTS = {
+    "openai": "https://api.openai.com/v1",
+    "deepseek": "https://api.deepseek.com/v1",
+    "qwen": "https://dashscope.aliyuncs.com/compatible-mode/v1",
+}
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+class LLMGatewayError(Exception):
+    """
+    服务商调用失败；status_code 为上游返回的状态码，网络错误时为 None
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class CompletionResult:
+    content: str
+    model: str
+    usage: Optional[Dict[str, int]] = None
+
+
+def _http2_available() -> bool:
+    if not LLM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("⚠️  h2 not installed, LLM gateway falls back to HTTP/1.1")
+        return False
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    返回进程内共享的 HTTP 客户端，首次调用时创建
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """
+    关闭共享客户端并释放连接池，在应用关闭时调用
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def completions_url(provider: str, api_endpoint: Optional[str]) -> str:
+    """
+    api_endpoint 可以是 base URL（.../v1）或完整的 .../chat/completions 地址
+    """
+    base = (api_endpoint or DEFAULT_ENDPOINTS.get(provider.lower()) or DEFAULT_ENDPOINTS["openai"]).rstrip("/")
+    if base.endswith("/chat/completions"):
+        return base
+    return f"{base}/chat/completions"
+
+
+def build_request(config, api_key: str, messages: List[Dict[str, str]], **overrides) -> Dict:
+    """
+    生成发往服务商的请求参数（url、headers、json）
+    """
+    payload = {
+        "model": config.model_name,
+        "messages": messages,
+        "temperature": config.temperature,
+        "max_tokens": config.max_tokens,
+    }
+    payload.update(overrides)
+    return {
+        "url": completions_url(config.provider, config.api_endpoint),
+        "headers": {"Authorization": f"Bearer {api_key}"},
+        "json": payload,
+    }
+
+
+def _error_message(response: httpx.Response) -> str:
+    try:
+        return response.json()["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        return f"Provider returned HTTP {response.status_code}"
+
+
+async def complete(config, api_key: str, messages: List[Dict[str, str]]) -> CompletionResult:
+    """
+    调用服务商的 chat/completions 接口并返回完整回复
+    """
+    request = build_request(config, api_key, messages)
+    try:
+        response = await get_client().post(**request)
+    except httpx.HTTPError as e:
+        raise LLMGatewayError(f"Provider request failed: {e.__class__.__name__}: {e}")
+
+    if response.status_code != 200:
+        raise LLMGatewayError(_error_message(response), status_code=response.status_code)
+
+    try:
+        data = response.json()
+        content = data["choices"][0]["message"]["content"] or ""
+    except (ValueError, KeyError, IndexError, TypeError):
+        raise LLMGatewayError("Provider returned an unexpected response body", status_code=response.status_code)
+
+    return CompletionResult(
+        content=content,
+        model=data.get("model") or config.model_name,
+        usage=data.get("usage")
+    )
+
+
+async def stream_complete(config, api_key: str, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+    """
+    以 SSE 流式调用服务商，逐个产出回复增量
+    调用方取消或提前关闭生成器时，上游响应随 async with 退出立即关闭，连接不会被占用
+    """
+    request = build_request(config, api_key, messages, stream=True)
+    try:
+        async with get_client().stream("POST", **request) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise LLMGatewayError(_error_message(response), status_code=response.status_code)
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                try:
+                    choices = json.loads(data).get("choices") or []
+                except (ValueError, AttributeError):
+                    raise LLMGatewayError("Provider returned an unexpected stream chunk", status_code=200)
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if delta:
+                    yield delta
+    except httpx.HTTPError as e:
+        raise LLMGatewayError(f"Provider request failed: {e.__class__.__name__}: {e}")
+
+
+__all__ = [
+    "LLMGatewayError",
+    "CompletionResult",
+    "get_client",
+    "close_client",
+    "completions_url",
+    "build_request",
+    "complete",
+    "stream_complete"
+]
@@ -0,0 +1,275 @@
+"""
+LLM 服务商路由 - 在多个生效的 AIConfig 之间做故障转移和负载均衡
+按 priority 从高到低分组，同一优先级内按延迟和并发加权随机选择；
+每个配置在内存中维护滚动延迟、错误率和熔断器状态，超时、429、5xx 时自动切换到下一个配置
+"""
+import os
+import random
+import time
+from collections import deque
+from itertools import groupby
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import anyio
+
+import llm_gateway
+from llm_gateway import LLMGatewayError, CompletionResult
+from logger import logger
+
+# 每个配置保留的最近调用样本数
+LLM_HEALTH_WINDOW = int(os.getenv("LLM_HEALTH_WINDOW", "50"))
+# 连续失败多少次后熔断，熔断持续多少秒后放行一个探测请求
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+# 还有备选配置时，单次尝试（流式为首个增量）的最长等待秒数
+LLM_FAILOVER_TIMEOUT = float(os.getenv("LLM_FAILOVER_TIMEOUT", "20"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 由请求本身引起的错误，换一个服务商也不会成功，不计入健康状态
+CLIENT_ERRORS = {400, 413, 422}
+
+
+def is_client_error(error: LLMGatewayError) -> bool:
+    return error.status_code in CLIENT_ERRORS
+
+
+class ProviderHealth:
+    """
+    单个 AIConfig 的健康状态：最近 N 次调用的延迟和成败、当前并发数、熔断器
+    """
+
+    def __init__(self, window: int = LLM_HEALTH_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.last_error: Optional[str] = None
+        self.total_requests = 0
+        self.total_failures = 0
+
+    def available(self, now: float) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now - self.opened_at >= LLM_BREAKER_COOLDOWN:
+            self.state = HALF_OPEN
+            self.probing = False
+        # 半开状态同一时间只放行一个探测请求
+        return self.state == HALF_OPEN and not self.probing
+
+    def acquire(self) -> None:
+        self.in_flight += 1
+        if self.state == HALF_OPEN:
+            self.probing = True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self.probing = False
+
+    def record_success(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.total_requests += 1
+        self.consecutive_failures = 0
+        self.state = CLOSED
+
+    def record_failure(self, error: LLMGatewayError) -> None:
+        self.outcomes.append(False)
+        self.total_requests += 1
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        if self.state == HALF_OPEN or self.consecutive_failures >= LLM_BREAKER_FAILURES:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    @property
+    def latency(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        return sum(self.latencies) / len(self.latencies)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def snapshot(self) -> Dict:
+        ordered = sorted(self.latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else None
+        return {
+            "state": self.state,
+            "in_flight": self.in_flight,
+            "avg_latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "p95_latency_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate, 4),
+            "samples": len(self.outcomes),
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": max(0.0, round(self.opened_at + LLM_BREAKER_COOLDOWN - time.monotonic(), 1)) if self.state == OPEN else None,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+            "last_error": self.last_error,
+        }
+
+
+class ProviderRouter:
+    """
+    进程内的服务商路由，健康状态按 AIConfig.id 保存
+    """
+
+    def __init__(self):
+        self._health: Dict[str, ProviderHealth] = {}
+
+    def health(self, config_id: str) -> ProviderHealth:
+        state = self._health.get(config_id)
+        if state is None:
+            state = self._health[config_id] = ProviderHealth()
+        return state
+
+    def _weight(self, state: ProviderHealth, default_latency: float) -> float:
+        latency = state.latency if state.latency is not None else default_latency
+        return 1.0 / (max(latency, 0.001) * (state.in_flight + 1))
+
+    def candidates(self, configs: List) -> List:
+        """
+        返回本次请求的尝试顺序：优先级从高到低，熔断中的配置被跳过，
+        同一优先级内按 1 / (平均延迟 × (并发 + 1)) 加权随机排列
+        """
+        now = time.monotonic()
+        ordered = []
+        configs = sorted(configs, key=lambda c: c.priority or 0, reverse=True)
+        for _, group in groupby(configs, key=lambda c: c.priority or 0):
+            group = [c for c in group if self.health(c.id).available(now)]
+            known = [self.health(c.id).latency for c in group if self.health(c.id).latency is not None]
+            # 没有样本的配置按同组平均延迟计算，保证新配置也能分到流量
+            default_latency = sum(known) / len(known) if known else 1.0
+            weights = [self._weight(self.health(c.id), default_latency) for c in group]
+            while group:
+                i = random.choices(range(len(group)), weights=weights)[0]
+                ordered.append(group.pop(i))
+                weights.pop(i)
+        return ordered
+
+    def _exhausted(self, configs: List, last_error: Optional[LLMGatewayError]) -> LLMGatewayError:
+        if last_error is not None:
+            return last_error
+        if configs:
+            return LLMGatewayError("All AI providers are temporarily unavailable (circuit open)", status_code=503)
+        return LLMGatewayError("No active AI config found", status_code=404)
+
+    def _failed(self, config, state: ProviderHealth, error: LLMGatewayError) -> None:
+        state.record_failure(error)
+        logger.warning(f"⚠️  AI provider {config.provider}/{config.model_name} ({config.id}) failed: {error}")
+        if state.state == OPEN:
+            logger.warning(f"⚠️  Circuit opened for AI provider {config.id} for {LLM_BREAKER_COOLDOWN:.0f}s")
+
+    async def complete(self, configs: List, api_key_for, messages: List[Dict[str, str]]) -> Tuple[object, CompletionResult]:
+        """
+        依次尝试候选配置，返回 (实际应答的配置, 回复)
+        api_key_for(config) 返回该配置解密后的 API Key
+        """
+        candidates = self.candidates(configs)
+        last_error = None
+        for i, config in enumerate(candidates):
+            state = self.health(config.id)
+            timeout = LLM_FAILOVER_TIMEOUT if i < len(candidates) - 1 else None
+            state.acquire()
+            started = time.monotonic()
+            try:
+                with anyio.fail_after(timeout):
+                    result = await llm_gateway.complete(config, api_key_for(config), messages)
+            except TimeoutError:
+                last_error = LLMGatewayError(f"Provider did not answer within {timeout:g}s")
+                self._failed(config, state, last_error)
+                continue
+            except LLMGatewayError as e:
+                if is_client_error(e):
+                    raise
+                last_error = e
+                self._failed(config, state, e)
+                continue
+            finally:
+                state.release()
+            state.record_success(time.monotonic() - started)
+            return config, result
+        raise self._exhausted(configs, last_error)
+
+    async def stream(self, configs: List, api_key_for, messages: List[Dict[str, str]]) -> AsyncIterator[Tuple[object, str]]:
+        """
+        流式版本，产出 (实际应答的配置, 增量)
+        只能在收到首个增量之前切换配置；延迟按首个增量的到达时间统计
+        """
+        candidates = self.candidates(configs)
+        last_error = None
+        for i, config in enumerate(candidates):
+            state = self.health(config.id)
+            timeout = LLM_FAILOVER_TIMEOUT if i < len(candidates) - 1 else None
+            deltas = llm_gateway.stream_complete(config, api_key_for(config), messages)
+            state.acquire()
+            started = time.monotonic()
+            try:
+                try:
+                    with anyio.fail_after(timeout):
+                        first = await deltas.__anext__()
+                except StopAsyncIteration:
+                    first = None
+                except TimeoutError:
+                    last_error = LLMGatewayError(f"Provider did not start streaming within {timeout:g}s")
+                    self._failed(config, state, last_error)
+                    continue
+                except LLMGatewayError as e:
+                    if is_client_error(e):
+                        raise
+                    last_error = e
+                    self._failed(config, state, e)
+                    continue
+
+                latency = time.monotonic() - started
+                if first is not None:
+                    yield config, first
+                    try:
+                        async for delta in deltas:
+                            yield config, delta
+                    except LLMGatewayError as e:
+                        # 已经向客户端输出了内容，不再切换
+                        self._failed(config, state, e)
+                        raise
+                state.record_success(latency)
+                return
+            finally:
+                state.release()
+                await deltas.aclose()
+        raise self._exhausted(configs, last_error)
+
+    def reset(self, config_id: str) -> bool:
+        return self._health.pop(config_id, None) is not None
+
+    def snapshot(self, configs: List) -> List[Dict]:
+        return [
+            {
+                "config_id": config.id,
+                "provider": config.provider,
+                "model_name": config.model_name,
+                "priority": config.priority,
+                "is_active": config.is_active,
+                **self.health(config.id).snapshot()
+            }
+            for config in configs
+        ]
+
+
+provider_router = ProviderRouter()
+
+
+__all__ = [
+    "ProviderHealth",
+    "ProviderRouter",
+    "provider_router",
+    "is_client_error"
+]
@@ -0,0 +1,214 @@
+import heapq
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from logger import LOG_DIR, LOG_BACKUP_COUNT
+
+
+def time_key(timestamp: str) -> int:
+    """
+    将 "YYYY-MM-DD HH:MM:SS[,mmm]" 转为可比较的整数 YYYYMMDDHHMMSS，无法解析时返回 0
+    """
+    try:
+        return int(
+            timestamp[0:4] + timestamp[5:7] + timestamp[8:10]
+            + timestamp[11:13] + timestamp[14:16] + timestamp[17:19]
+        )
+    except (ValueError, IndexError):
+        return 0
+
+
+def datetime_key(value: datetime) -> int:
+    return int(value.strftime("%Y%m%d%H%M%S"))
+
+
+def parse_log_line(line: str) -> Optional[dict]:
+    """
+    解析一行日志（JSON 或文本格式），不是日志头的行返回 None
+    """
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+            if isinstance(entry, dict):
+                return entry
+        except json.JSONDecodeError:
+            pass
+
+    parts = line.strip().split(' - ', 3)
+    if len(parts) < 4:
+        return None
+    return {
+        "timestamp": parts[0],
+        "logger": parts[1],
+        "level": parts[2],
+        "message": parts[3]
+    }
+
+
+class _FileIndex:
+    """
+    单个日志文件的索引：每个级别一组按时间递增的 (时间, 字节偏移) 数组
+    只索引以换行结尾的完整行，下次从 indexed_to 继续增量解析
+    """
+
+    def __init__(self):
+        self.indexed_to = 0
+        self.levels: Dict[str, Tuple[array, array]] = {}
+
+    def reset(self):
+        self.indexed_to = 0
+        self.levels = {}
+
+    def update(self, f) -> None:
+        f.seek(self.indexed_to)
+        offset = self.indexed_to
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                # 正在写入的半行，留到下次
+                break
+            entry = parse_log_line(raw.decode("utf-8", errors="replace"))
+            if entry is not None:
+                times, offsets = self.levels.setdefault(str(entry.get("level", "")), (array("q"), array("q")))
+                times.append(time_key(str(entry.get("timestamp", ""))))
+                offsets.append(offset)
+            offset += len(raw)
+        self.indexed_to = offset
+
+    def select(self, level: Optional[str], start: Optional[int], end: Optional[int]) -> List[array]:
+        """
+        返回每个级别落在 [start, end] 内的偏移切片
+        """
+        ranges = []
+        for name, (times, offsets) in self.levels.items():
+            if level is not None and name != level:
+                continue
+            lo = bisect_left(times, start) if start is not None else 0
+            hi = bisect_right(times, end) if end is not None else len(times)
+            if lo < hi:
+                ranges.append(offsets[lo:hi])
+        return ranges
+
+
+class LogIndex:
+    """
+    RotatingFileHandler 日志的增量索引，覆盖当前文件及 .1 - .N 历史文件
+    按 (st_dev, st_ino) 识别文件，轮转时索引随文件改名保留，文件被截断时重建
+    """
+
+    def __init__(self, path: str, backup_count: int = LOG_BACKUP_COUNT):
+        self.path = path
+        self.backup_count = backup_count
+        self._files: Dict[Tuple[int, int], _FileIndex] = {}
+        self._lock = threading.Lock()
+
+    def _paths(self) -> List[str]:
+        # 从最旧到最新，与日志写入顺序一致
+        return [f"{self.path}.{i}" for i in range(self.backup_count, 0, -1)] + [self.path]
+
+    def _refresh(self) -> List[Tuple[str, Tuple[int, int], _FileIndex]]:
+        files = []
+        for path in self._paths():
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            with f:
+                stat = os.fstat(f.fileno())
+                key = (stat.st_dev, stat.st_ino)
+                index = self._files.get(key)
+                if index is None:
+                    index = self._files[key] = _FileIndex()
+                elif stat.st_size < index.indexed_to:
+                    index.reset()
+                index.update(f)
+            files.append((path, key, index))
+
+        # 轮转时被删除的最旧文件
+        live = {key for _, key, _ in files}
+        for key in list(self._files):
+            if key not in live:
+                del self._files[key]
+        return files
+
+    def query(
+        self,
+        level: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        search: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 50
+    ) -> Tuple[int, List[dict]]:
+        """
+        按级别和时间范围从索引定位日志行，只读取需要返回（或需要关键词匹配）的行
+        返回 (匹配总数, 当前页日志)
+        """
+        search = search.lower() if search else None
+        with self._lock:
+            files = self._refresh()
+            total = 0
+            page: List[dict] = []
+
+            for path, key, index in files:
+                ranges = index.select(level, start, end)
+                if not ranges:
+                    continue
+
+                if search is None:
+                    count = sum(len(offsets) for offsets in ranges)
+                    # 整个文件都在当前页之前或之后时无需读取
+                    if total + count <= skip or len(page) >= limit:
+                        total += count
+                        continue
+
+                f = self._open(path, key)
+                if f is None:
+                    continue
+                with f:
+                    for offset in heapq.merge(*ranges):
+                        if search is None and not (skip <= total < skip + limit):
+                            total += 1
+                            continue
+                        f.seek(offset)
+                        entry = parse_log_line(f.readline().decode("utf-8", errors="replace"))
+                        if entry is None:
+                            continue
+                        if search is not None and search not in str(entry.get("message", "")).lower():
+                            continue
+                        if skip <= total < skip + limit:
+                            page.append(entry)
+                        total += 1
+
+            return total, page
+
+    def _open(self, path: str, key: Tuple[int, int]):
+        """
+        打开索引对应的文件，若刚好发生轮转导致路径已指向其他文件则返回 None
+        """
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        stat = os.fstat(f.fileno())
+        if (stat.st_dev, stat.st_ino) != key:
+            f.close()
+            return None
+        return f
+
+
+# 主日志文件的索引
+log_index = LogIndex(os.path.join(LOG_DIR, "ai_time_management.log"))
+
+
+__all__ = [
+    "LogIndex",
+    "log_index",
+    "parse_log_line",
+    "time_key",
+    "datetime_key"
+]
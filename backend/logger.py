@@ -1,7 +1,10 @@
 import logging
 import os
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
 from datetime import datetime
+from typing import Dict, List
+import atexit
 import json
 
 # 日志目录
@@ -11,6 +14,18 @@ os.makedirs(LOG_DIR, exist_ok=True)
 # 日志级别
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
+# 主日志文件按大小轮转：单个文件上限与保留的历史文件数 (.1 - .5)
+LOG_MAX_BYTES = 10 * 1024 * 1024  # 10MB
+LOG_BACKUP_COUNT = 5
+
+# 异步日志：调用方只把记录放入内存队列，由后台线程批量写入控制台和文件
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() in ("1", "true", "yes")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# 队列满时的策略: drop（丢弃并计数）或 block（阻塞调用方直到有空位）
+LOG_QUEUE_FULL = os.getenv("LOG_QUEUE_FULL", "drop").lower()
+# 后台线程每批最多处理的记录数，每批结束后才 flush 一次
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "256"))
+
 # 日志格式
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 JSON_LOG_FORMAT = {
@@ -53,13 +68,144 @@ class JSONFormatter(logging.Formatter):
         return json.dumps(log_data, ensure_ascii=False)
 
 
-def setup_logger(name: str = "ai_time_management", use_json: bool = False) -> logging.Logger:
+class _BatchFlushMixin:
+    """
+    在后台写线程中逐条 emit 时跳过 flush，由 BatchingQueueListener 每批 flush 一次
+    """
+    defer_flush = False
+
+    def flush(self):
+        if not self.defer_flush:
+            super().flush()
+
+
+class BatchedStreamHandler(_BatchFlushMixin, logging.StreamHandler):
+    pass
+
+
+class BatchedRotatingFileHandler(_BatchFlushMixin, RotatingFileHandler):
+    pass
+
+
+class BatchedTimedRotatingFileHandler(_BatchFlushMixin, TimedRotatingFileHandler):
+    pass
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    写入有界队列的处理器，队列满时按 block 参数阻塞或丢弃
+    """
+
+    def __init__(self, log_queue: queue.Queue, block: bool = False):
+        super().__init__(log_queue)
+        self.block = block
+        self.dropped = 0
+
+    def enqueue(self, record):
+        if self.block:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingQueueListener(QueueListener):
+    """
+    每次从队列取出最多 batch_size 条记录，全部写完后统一 flush
+    """
+
+    def __init__(self, log_queue: queue.Queue, *handlers, batch_size: int = LOG_BATCH_SIZE):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = max(1, batch_size)
+
+    def enqueue_sentinel(self):
+        # 队列满时也要保证停止信号送达
+        self.queue.put(self._sentinel)
+
+    def _monitor(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for handler in self.handlers:
+                handler.defer_flush = True
+            try:
+                for record in batch:
+                    if record is not self._sentinel:
+                        self.handle(record)
+            finally:
+                for handler in self.handlers:
+                    handler.defer_flush = False
+                    handler.flush()
+                for _ in batch:
+                    self.queue.task_done()
+
+            if self._sentinel in batch:
+                return
+
+
+class LogPipeline:
+    """
+    一个日志记录器的异步写入管道
+    运行时记录器只挂 BoundedQueueHandler；停止后把真实处理器挂回记录器，之后的日志同步写入
+    """
+
+    def __init__(self, logger: logging.Logger, handlers: List[logging.Handler]):
+        self.logger = logger
+        self.handlers = handlers
+        self.queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.queue_handler = BoundedQueueHandler(self.queue, block=LOG_QUEUE_FULL == "block")
+        self.listener = BatchingQueueListener(self.queue, *handlers)
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return
+        for handler in self.handlers:
+            self.logger.removeHandler(handler)
+        self.logger.addHandler(self.queue_handler)
+        self.listener.start()
+        self.running = True
+
+    def stop(self):
+        """
+        写完队列中剩余的日志后停止后台线程
+        """
+        if not self.running:
+            return
+        self.logger.removeHandler(self.queue_handler)
+        for handler in self.handlers:
+            self.logger.addHandler(handler)
+        self.listener.stop()
+        self.running = False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "running": self.running,
+            "queued": self.queue.qsize(),
+            "max_size": LOG_QUEUE_SIZE,
+            "dropped": self.queue_handler.dropped
+        }
+
+
+# 已创建的异步日志管道，按记录器名称索引
+_pipelines: Dict[str, LogPipeline] = {}
+
+
+def setup_logger(name: str = "ai_time_management", use_json: bool = False, use_async: bool = LOG_ASYNC) -> logging.Logger:
     """
     设置日志记录器
     
     Args:
         name: 日志记录器名称
         use_json: 是否使用JSON格式
+        use_async: 是否经由队列在后台线程写入
     
     Returns:
         配置好的日志记录器
@@ -72,7 +218,7 @@ def setup_logger(name: str = "ai_time_management", use_json: bool = False) -> lo
         return logger
     
     # 控制台处理器
-    console_handler = logging.StreamHandler()
+    console_handler = BatchedStreamHandler()
     console_handler.setLevel(logging.INFO)
     
     if use_json:
@@ -83,10 +229,10 @@ def setup_logger(name: str = "ai_time_management", use_json: bool = False) -> lo
     logger.addHandler(console_handler)
     
     # 文件处理器 - 按大小轮转
-    file_handler = RotatingFileHandler(
+    file_handler = BatchedRotatingFileHandler(
         filename=os.path.join(LOG_DIR, f"{name}.log"),
-        maxBytes=10 * 1024 * 1024,  # 10MB
-        backupCount=5,
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
         encoding="utf-8"
     )
     file_handler.setLevel(logging.DEBUG)
@@ -99,7 +245,7 @@ def setup_logger(name: str = "ai_time_management", use_json: bool = False) -> lo
     logger.addHandler(file_handler)
     
     # 错误日志文件处理器 - 按时间轮转
-    error_handler = TimedRotatingFileHandler(
+    error_handler = BatchedTimedRotatingFileHandler(
         filename=os.path.join(LOG_DIR, f"{name}_error.log"),
         when="midnight",
         interval=1,
@@ -110,11 +256,37 @@ def setup_logger(name: str = "ai_time_management", use_json: bool = False) -> lo
     error_handler.setFormatter(logging.Formatter(LOG_FORMAT))
     logger.addHandler(error_handler)
     
+    if use_async:
+        pipeline = LogPipeline(logger, [console_handler, file_handler, error_handler])
+        pipeline.start()
+        _pipelines[name] = pipeline
+    
     return logger
 
 
+def start_logging():
+    """
+    启动（或在关闭后重新启动）所有异步日志管道
+    """
+    for pipeline in _pipelines.values():
+        pipeline.start()
+
+
+def shutdown_logging():
+    """
+    写完排队中的日志并停止后台线程，在应用关闭时调用
+    """
+    for pipeline in _pipelines.values():
+        pipeline.stop()
+
+
+def get_logging_stats() -> Dict[str, Dict[str, int]]:
+    return {name: pipeline.stats() for name, pipeline in _pipelines.items()}
+
+
 # 创建默认日志记录器
 logger = setup_logger()
+atexit.register(shutdown_logging)
 
 
 def log_request(request_id: str, method: str, path: str, user_id: str = None, ip_address: str = None):
@@ -172,6 +344,9 @@ def log_auth_event(event_type: str, user_id: str, ip_address: str, success: bool
 __all__ = [
     "logger",
     "setup_logger",
+    "start_logging",
+    "shutdown_logging",
+    "get_logging_stats",
     "log_request",
     "log_response",
     "log_error",
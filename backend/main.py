@@ -1,15 +1,15 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 from contextlib import asynccontextmanager
 
-from database import engine, get_db, Base
-from routers import auth, tasks, insights, goals, habits, admin, ai_config, logs, chat
+from database import engine, async_engine, get_db, SessionLocal, Base
+from routers import auth, tasks, insights, goals, habits, admin, ai_config, logs, chat, sync, analytics
 from models import User, Task, Insight, Goal, Habit, AIConfig, Subscription, ChatMessage
 from database import print_db_info
-from logger import logger
+from logger import logger, start_logging, shutdown_logging
 from middleware import LoggingMiddleware
 
 # Create database tables
@@ -18,21 +18,92 @@ Base.metadata.create_all(bind=engine)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    start_logging()
     logger.info("🚀 Starting AI Time Management API...")
     print_db_info()
     
+    # 旧数据库升级时补齐模型中新增的字段（如 insights.updated_at）
+    try:
+        from migrate_indexes import ensure_columns
+        for column in ensure_columns():
+            logger.info(f"🧱 Added column {column}")
+    except Exception as e:
+        logger.warning(f"⚠️  Column migration: {str(e)}")
+    
     # 初始化默认管理员账户
     try:
         from init_admin import create_admin_user
-        db = next(get_db())
+        db = SessionLocal()
         create_admin_user(db)
         db.close()
     except Exception as e:
         logger.warning(f"⚠️  Admin initialization: {str(e)}")
     
+    # 旧数据库首次升级时从业务表重建统计计数器
+    try:
+        from counters import ensure_counters, ensure_task_spans
+        db = SessionLocal()
+        if ensure_counters(db):
+            logger.info("📈 Usage counters rebuilt from existing data")
+        elif ensure_task_spans(db):
+            logger.info("📈 Task span counters computed from existing tasks")
+        db.close()
+    except Exception as e:
+        logger.warning(f"⚠️  Usage counter initialization: {str(e)}")
+    
+    try:
+        from chat_sessions import ensure_chat_sessions
+        db = SessionLocal()
+        if ensure_chat_sessions(db):
+            logger.info("💬 Chat session summaries rebuilt from existing messages")
+        db.close()
+    except Exception as e:
+        logger.warning(f"⚠️  Chat session initialization: {str(e)}")
+    
+    try:
+        from habit_streaks import ensure_habit_runs
+        db = SessionLocal()
+        migrated = ensure_habit_runs(db)
+        if migrated:
+            logger.info(f"📅 Moved check-in history of {migrated} habit(s) into habit_checkin_runs")
+        db.close()
+    except Exception as e:
+        logger.warning(f"⚠️  Habit check-in migration: {str(e)}")
+    
+    try:
+        from rollups import ensure_rollups
+        db = SessionLocal()
+        if ensure_rollups(db):
+            logger.info("📊 Daily time-usage rollups rebuilt from existing tasks")
+        db.close()
+    except Exception as e:
+        logger.warning(f"⚠️  Daily rollup initialization: {str(e)}")
+    
+    # 加载生效的 AI 配置并解密 API Key，请求中不再逐次查询和解密
+    try:
+        from provider_registry import provider_registry
+        db = SessionLocal()
+        logger.info(f"🤖 Loaded {provider_registry.load_sync(db)} active AI config(s)")
+        db.close()
+    except Exception as e:
+        logger.warning(f"⚠️  AI config registry initialization: {str(e)}")
+    
+    # 后台任务调度器（每天为任务有变化的用户生成洞察）；使用独立 worker（python jobs.py worker）时关闭
+    from jobs import JOB_SCHEDULER_ENABLED, job_scheduler
+    if JOB_SCHEDULER_ENABLED:
+        job_scheduler.start()
+        logger.info("🌙 Background job scheduler started")
+    
     yield
     # Shutdown
     logger.info("👋 Shutting down...")
+    await job_scheduler.stop()
+    if async_engine is not None:
+        await async_engine.dispose()
+    from llm_gateway import close_client
+    await close_client()
+    # Flush queued log records before the process exits
+    shutdown_logging()
 
 app = FastAPI(
     title="AI Time Management API",
@@ -51,6 +122,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Include routers
@@ -63,6 +135,8 @@ app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 app.include_router(ai_config.router, prefix="/api/ai-config", tags=["AI Configuration"])
 app.include_router(logs.router, prefix="/api/logs", tags=["Logs"])
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
+app.include_router(sync.router, prefix="/api/sync", tags=["Sync"])
+app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
 
 @app.get("/")
 async def root():
@@ -73,11 +147,11 @@ async def root():
     }
 
 @app.get("/api/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_db)):
     try:
         # Test database connection
         from sqlalchemy import text
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         return {
             "status": "healthy",
             "database": "connected"
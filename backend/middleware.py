@@ -1,38 +1,44 @@
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import time
 import uuid
 from logger import log_request, log_response, log_error
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
+class LoggingMiddleware:
     """
     日志记录中间件
     记录所有API请求和响应
+    纯 ASGI 实现，不包装响应流，流式响应可正常逐块发送
     """
     
     def __init__(self, app: ASGIApp):
-        super().__init__(app)
+        self.app = app
     
-    async def dispatch(self, request: Request, call_next):
-        # 生成请求ID
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        # 生成请求ID（request.state 即 scope["state"]）
         request_id = str(uuid.uuid4())
-        request.state.request_id = request_id
+        state = scope.setdefault("state", {})
+        state["request_id"] = request_id
         
         # 获取客户端IP
-        client_ip = request.client.host if request.client else "unknown"
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
         
         # 获取用户ID（如果已认证）
-        user_id = None
-        if hasattr(request.state, "user"):
-            user_id = getattr(request.state.user, "id", None)
+        user_id = getattr(state.get("user"), "id", None)
         
         # 记录请求
         log_request(
             request_id=request_id,
-            method=request.method,
-            path=request.url.path,
+            method=scope["method"],
+            path=scope["path"],
             user_id=user_id,
             ip_address=client_ip
         )
@@ -40,28 +46,27 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         # 记录开始时间
         start_time = time.time()
         
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                # 计算处理时间
+                duration = time.time() - start_time
+                
+                # 记录响应
+                log_response(
+                    request_id=request_id,
+                    status_code=message["status"],
+                    duration=duration
+                )
+                
+                # 添加请求ID到响应头
+                headers = MutableHeaders(scope=message)
+                headers["X-Request-ID"] = request_id
+            await send(message)
+        
         try:
-            # 处理请求
-            response = await call_next(request)
-            
-            # 计算处理时间
-            duration = time.time() - start_time
-            
-            # 记录响应
-            log_response(
-                request_id=request_id,
-                status_code=response.status_code,
-                duration=duration
-            )
-            
-            # 添加请求ID到响应头
-            response.headers["X-Request-ID"] = request_id
-            
-            return response
-            
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
             # 记录错误
-            duration = time.time() - start_time
             log_error(request_id=request_id, error=e, user_id=user_id)
             
             # 重新抛出异常，让FastAPI的异常处理器处理
@@ -96,20 +101,26 @@ class CORSMiddleware(BaseHTTPMiddleware):
         return response
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
+class RateLimitMiddleware:
     """
     简单的速率限制中间件
+    纯 ASGI 实现，限流头在响应开始时写入
     """
     
     def __init__(self, app: ASGIApp, max_requests: int = 100, window: int = 60):
-        super().__init__(app)
+        self.app = app
         self.max_requests = max_requests
         self.window = window
         self.requests = {}
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         # 获取客户端IP
-        client_ip = request.client.host if request.client else "unknown"
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
         
         # 获取当前时间窗口
         current_window = int(time.time() / self.window)
@@ -125,21 +136,25 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         count = self.requests.get(key, 0)
         
         if count >= self.max_requests:
-            return Response(
+            response = Response(
                 content="Too many requests",
                 status_code=429,
                 headers={"Retry-After": str(self.window)}
             )
+            await response(scope, receive, send)
+            return
         
         # 增加计数
         self.requests[key] = count + 1
         
-        # 处理请求
-        response = await call_next(request)
-        
-        # 添加速率限制头
-        response.headers["X-RateLimit-Limit"] = str(self.max_requests)
-        response.headers["X-RateLimit-Remaining"] = str(self.max_requests - count - 1)
-        response.headers["X-RateLimit-Reset"] = str((current_window + 1) * self.window)
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                # 添加速率限制头
+                headers = MutableHeaders(scope=message)
+                headers["X-RateLimit-Limit"] = str(self.max_requests)
+                headers["X-RateLimit-Remaining"] = str(self.max_requests - count - 1)
+                headers["X-RateLimit-Reset"] = str((current_window + 1) * self.window)
+            await send(message)
         
-        return response
+        # 处理请求
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,88 @@
+"""
+数据库迁移脚本 - 为已有数据库补建字段和索引
+create_all 只会为新建的表创建字段和索引，已有的 SQLite / MySQL 数据库需要运行此脚本
+（缺失的字段在应用启动时也会自动补齐）
+"""
+from sqlalchemy import inspect, text
+from database import engine, Base, print_db_info
+import models  # noqa: F401  注册所有模型
+import sys
+import os
+
+# 设置控制台编码为 UTF-8
+if sys.platform == "win32":
+    os.system("chcp 65001 >nul 2>&1")
+
+def ensure_columns(bind=engine) -> list:
+    """
+    为已有的表添加模型中新增的可空字段，返回新增的 "表.字段"
+    新增的 updated_at 用 created_at 回填，使旧记录也有合理的修改时间
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                print(f"[信息] 添加字段 {table.name}.{column.name} ({column_type})")
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                if column.name == "updated_at" and "created_at" in existing_columns:
+                    conn.execute(text(f"UPDATE {table.name} SET updated_at = created_at"))
+                added.append(f"{table.name}.{column.name}")
+
+    return added
+
+def ensure_indexes(bind=engine) -> list:
+    """创建模型中声明但数据库中缺失的索引，返回新建的索引名"""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            # 新表由 create_all 连同索引一起创建
+            continue
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            print(f"[信息] 创建索引 {table.name}.{index.name} ({', '.join(c.name for c in index.columns)})")
+            index.create(bind=bind)
+            created.append(index.name)
+
+    return created
+
+def main():
+    """主函数"""
+    print("=" * 60)
+    print("  AI时间管理系统 - 数据库字段与索引迁移")
+    print("=" * 60)
+    print_db_info()
+    print("")
+
+    try:
+        Base.metadata.create_all(bind=engine)
+        added = ensure_columns()
+        created = ensure_indexes()
+    except Exception as e:
+        print(f"[错误] 索引迁移失败: {str(e)}")
+        sys.exit(1)
+
+    if added:
+        print(f"[完成] 新增 {len(added)} 个字段")
+    if created:
+        print(f"[完成] 新建 {len(created)} 个索引")
+    else:
+        print("[完成] 所有索引均已存在，无需迁移")
+
+if __name__ == "__main__":
+    main()
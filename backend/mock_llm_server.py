@@ -0,0 +1,113 @@
+"""
+本地 OpenAI 兼容模拟服务 - 用于在没有真实 API Key 时联调 LLM 网关
+
+用法（在 backend 目录下运行）:
+    python mock_llm_server.py [--port 8001] [--delay 0.0]
+
+然后在管理后台添加 AI 配置，api_endpoint 填写 http://127.0.0.1:8001/v1
+回复内容为最后一条用户消息的回显
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from fastapi import FastAPI, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
+
+app = FastAPI(title="Mock OpenAI-compatible API")
+
+# 模拟上游处理耗时（秒）
+RESPONSE_DELAY = 0.0
+
+
+class MockMessage(BaseModel):
+    role: str
+    content: str
+
+
+class MockCompletionRequest(BaseModel):
+    model: str
+    messages: List[MockMessage]
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    stream: bool = False
+
+
+def mock_reply(request: MockCompletionRequest) -> str:
+    last_user = next((m.content for m in reversed(request.messages) if m.role == "user"), "")
+    return f"Echo: {last_user}"
+
+
+async def stream_reply(request: MockCompletionRequest, content: str):
+    """
+    按词输出 chat.completion.chunk，每个词之间间隔 RESPONSE_DELAY 秒
+    """
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    words = content.split(" ")
+    for i, word in enumerate(words):
+        if i and RESPONSE_DELAY:
+            await asyncio.sleep(RESPONSE_DELAY)
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.model,
+            "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}]
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: MockCompletionRequest, authorization: Optional[str] = Header(None)):
+    if not authorization or not authorization.startswith("Bearer "):
+        # 与 OpenAI 相同的错误格式
+        return JSONResponse(status_code=401, content={
+            "error": {"message": "Missing API key", "type": "invalid_request_error"}
+        })
+    if RESPONSE_DELAY and not request.stream:
+        await asyncio.sleep(RESPONSE_DELAY)
+
+    content = mock_reply(request)
+    if request.stream:
+        return StreamingResponse(stream_reply(request, content), media_type="text/event-stream")
+    
+    prompt_tokens = sum(len(m.content.split()) for m in request.messages)
+    completion_tokens = len(content.split())
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+def main():
+    global RESPONSE_DELAY
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before replying (between words when streaming)")
+    args = parser.parse_args()
+    RESPONSE_DELAY = args.delay
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
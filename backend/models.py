@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, Text, Enum, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, Float, Boolean, Date, DateTime, Text, Enum, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -21,6 +21,7 @@ class User(Base):
     subscription_tier = Column(String(20), default="free")  # free, premium, pro
     subscription_start_date = Column(DateTime)
     subscription_end_date = Column(DateTime)
+    is_admin = Column(Boolean, default=False)  # 可调用 /api/admin 下的管理操作
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -31,6 +32,12 @@ class User(Base):
     habits = relationship("Habit", back_populates="user", cascade="all, delete-orphan")
     subscriptions = relationship("Subscription", back_populates="user", cascade="all, delete-orphan")
     chat_messages = relationship("ChatMessage", back_populates="user", cascade="all, delete-orphan")
+    chat_sessions = relationship("ChatSession", back_populates="user", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Admin user listing: ORDER BY created_at DESC, id DESC
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
 class Task(Base):
     __tablename__ = "tasks"
@@ -52,6 +59,18 @@ class Task(Base):
     
     # Relationships
     user = relationship("User", back_populates="tasks")
+    
+    __table_args__ = (
+        # Task list: WHERE user_id = ? [AND status = ?] ORDER BY start_time DESC, id DESC
+        Index("ix_tasks_user_status_start", "user_id", "status", "start_time", "id"),
+        Index("ix_tasks_user_start", "user_id", "start_time", "id"),
+        # Calendar window / conflicts: WHERE user_id = ? AND start_time BETWEEN ? AND ?, end_time checked in the index
+        Index("ix_tasks_user_start_end", "user_id", "start_time", "end_time"),
+        # Admin stats: tasks created today, COUNT(DISTINCT user_id)
+        Index("ix_tasks_created_user", "created_at", "user_id"),
+        # Delta sync: WHERE user_id = ? AND updated_at > ?
+        Index("ix_tasks_user_updated", "user_id", "updated_at", "id"),
+    )
 
 class Insight(Base):
     __tablename__ = "insights"
@@ -66,10 +85,19 @@ class Insight(Base):
     action_text = Column(String(255))
     is_read = Column(Boolean, default=False)
     is_favorite = Column(Boolean, default=False)
+    source = Column(String(20))  # NULL for insights saved by the client, "engine" for POST /api/insights/generate
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="insights")
+    
+    __table_args__ = (
+        # Insight list: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_insights_user_created", "user_id", "created_at", "id"),
+        # Delta sync: WHERE user_id = ? AND updated_at > ?
+        Index("ix_insights_user_updated", "user_id", "updated_at", "id"),
+    )
 
 class Goal(Base):
     __tablename__ = "goals"
@@ -91,6 +119,11 @@ class Goal(Base):
     
     # Relationships
     user = relationship("User", back_populates="goals")
+    
+    __table_args__ = (
+        # Delta sync: WHERE user_id = ? AND updated_at > ?
+        Index("ix_goals_user_updated", "user_id", "updated_at", "id"),
+    )
 
 class Habit(Base):
     __tablename__ = "habits"
@@ -101,14 +134,21 @@ class Habit(Base):
     description = Column(Text)
     frequency = Column(String(20), default="daily")  # daily, weekly, custom
     target_days = Column(JSON)  # Array of day numbers (0-6)
-    streak = Column(Integer, default=0)
+    streak = Column(Integer, default=0)  # Length of the most recent run, ending at last_checkin_date
     longest_streak = Column(Integer, default=0)
-    completed_dates = Column(JSON)  # Array of date strings
+    last_checkin_date = Column(Date)
+    completed_dates = Column(JSON)  # Legacy array of date strings, moved into habit_checkin_runs on startup
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="habits")
+    checkin_runs = relationship("HabitCheckinRun", cascade="all, delete-orphan", passive_deletes=True)
+    
+    __table_args__ = (
+        # Delta sync: WHERE user_id = ? AND updated_at > ?
+        Index("ix_habits_user_updated", "user_id", "updated_at", "id"),
+    )
 
 class AIConfig(Base):
     __tablename__ = "ai_configs"
@@ -179,4 +219,115 @@ class ChatMessage(Base):
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
-    user = relationship("User", back_populates="chat_messages")
\ No newline at end of file
+    user = relationship("User", back_populates="chat_messages")
+    
+    __table_args__ = (
+        # Session listing / per-session history: WHERE user_id = ? [AND session_id = ?] ORDER BY created_at
+        Index("ix_chat_messages_user_session_created", "user_id", "session_id", "created_at"),
+        # Full history: WHERE user_id = ? ORDER BY created_at, id
+        Index("ix_chat_messages_user_created", "user_id", "created_at", "id"),
+    )
+
+class ChatSession(Base):
+    __tablename__ = "chat_sessions"
+    
+    # 会话摘要，随 chat_messages 的写入同步维护
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    session_id = Column(String(36), primary_key=True)
+    message_count = Column(Integer, nullable=False, default=0)
+    first_message_id = Column(String(36))
+    first_message = Column(String(100))  # 首条消息预览
+    last_message_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    user = relationship("User", back_populates="chat_sessions")
+    
+    __table_args__ = (
+        # Session listing: WHERE user_id = ? ORDER BY last_message_at DESC
+        Index("ix_chat_sessions_user_last_message", "user_id", "last_message_at", "session_id"),
+    )
+
+class UsageCounter(Base):
+    __tablename__ = "usage_counters"
+    
+    # scope is a user id, or "global" for system-wide counters
+    scope = Column(String(36), primary_key=True)
+    name = Column(String(64), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+    
+    # 已删除记录的 ID，供 /api/sync 向客户端下发删除；超过保留期后清理
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    collection = Column(String(20), nullable=False)  # tasks, insights, goals, habits
+    entity_id = Column(String(36), nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        # Delta sync: WHERE user_id = ? AND deleted_at > ?
+        Index("ix_sync_tombstones_user_deleted", "user_id", "deleted_at"),
+    )
+
+class HabitCheckinRun(Base):
+    __tablename__ = "habit_checkin_runs"
+    
+    # 打卡记录按连续区间 [start_date, end_date] 存储（游程编码），每段连续打卡一行
+    habit_id = Column(String(36), ForeignKey("habits.id", ondelete="CASCADE"), primary_key=True)
+    start_date = Column(Date, primary_key=True)
+    end_date = Column(Date, nullable=False)
+    length = Column(Integer, nullable=False)  # end_date - start_date + 1
+    
+    __table_args__ = (
+        # Check-in / heatmap: first run with end_date >= ? for a habit
+        Index("ix_habit_checkin_runs_habit_end", "habit_id", "end_date"),
+        # Longest streak after an uncheck: MAX(length) for a habit
+        Index("ix_habit_checkin_runs_habit_length", "habit_id", "length"),
+    )
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+    
+    # 每个后台任务每天一行，id 为 "<job>:<YYYY-MM-DD>"；主键冲突即表示已有进程认领
+    id = Column(String(64), primary_key=True)
+    job = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default="running")  # running, completed, failed
+    owner = Column(String(100))  # host:pid of the process holding the lease
+    cursor = Column(String(36))  # Last user id fully processed, resume point after a crash
+    processed = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+    
+    __table_args__ = (
+        # Admin listing: WHERE job = ? ORDER BY started_at DESC
+        Index("ix_job_runs_job_started", "job", "started_at"),
+    )
+
+class JobUserMark(Base):
+    __tablename__ = "job_user_marks"
+    
+    # 用户上次被后台任务处理时任务数据的高水位（MAX(tasks.updated_at) 与任务墓碑的 deleted_at 中较大者）
+    job = Column(String(50), primary_key=True)
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    high_water = Column(DateTime, nullable=False)
+    ran_at = Column(DateTime, default=datetime.utcnow)
+
+class DailyUserStat(Base):
+    __tablename__ = "daily_user_stats"
+    
+    # 按用户时区的自然日、分类汇总的任务用时，随任务写入增量维护；category 为空字符串表示未分类
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    category = Column(String(50), primary_key=True, default="")
+    planned_minutes = Column(Integer, nullable=False, default=0)
+    completed_minutes = Column(Integer, nullable=False, default=0)
+    task_count = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,82 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+
+# 下一页游标通过响应头返回，保持列表接口的响应体不变
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort_value: Any, row_id: str) -> str:
+    """
+    将 (排序列, id) 编码为不透明游标
+    """
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    解析游标，格式错误时返回 400
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if sort_value is not None:
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, str(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_condition(sort_column, id_column, cursor: str, descending: bool):
+    """
+    生成游标之后的 WHERE 条件（按 sort_column, id_column 排序）
+    NULL 视为最小值，与 SQLite / MySQL 的排序行为一致
+    """
+    sort_value, row_id = decode_cursor(cursor)
+
+    if descending:
+        if sort_value is None:
+            return and_(sort_column.is_(None), id_column < row_id)
+        return or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, id_column < row_id),
+            sort_column.is_(None)
+        )
+
+    if sort_value is None:
+        return or_(
+            sort_column.is_not(None),
+            and_(sort_column.is_(None), id_column > row_id)
+        )
+    return or_(
+        sort_column > sort_value,
+        and_(sort_column == sort_value, id_column > row_id)
+    )
+
+
+def set_next_cursor(response: Response, rows: Sequence, limit: int, sort_attr: str) -> Optional[str]:
+    """
+    当本页已满时，把最后一行编码为下一页游标写入响应头
+    """
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    next_cursor = encode_cursor(getattr(last, sort_attr), last.id)
+    response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return next_cursor
+
+
+__all__ = [
+    "NEXT_CURSOR_HEADER",
+    "encode_cursor",
+    "decode_cursor",
+    "keyset_condition",
+    "set_next_cursor"
+]
@@ -0,0 +1,232 @@
+"""
+AI 服务商配置注册表 - 在内存中保存生效的 AIConfig 及解密后的 API Key
+
+加密密钥来自 ENCRYPTION_KEY，可用逗号分隔多个（MultiFernet）：
+第一个用于加密，其余只用于解密，便于轮换；所有 worker 使用同一组密钥。
+未设置时使用 ENCRYPTION_KEY_FILE 中的密钥，文件不存在时由第一个启动的 worker 原子创建。
+
+用法（在 backend 目录下运行）:
+    python provider_registry.py rotate    用当前主密钥重新加密所有 API Key
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, db_session, engine, Base, print_db_info
+from logger import logger
+from models import AIConfig
+
+ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY", "")
+ENCRYPTION_KEY_FILE = os.getenv("ENCRYPTION_KEY_FILE", "./data/.encryption_key")
+# 其他 worker 修改配置后，本进程最迟在这么多秒后重新加载
+AI_CONFIG_REFRESH_SECONDS = float(os.getenv("AI_CONFIG_REFRESH_SECONDS", "30"))
+
+
+def _fernet(key: str) -> Fernet:
+    """
+    合法的 Fernet 密钥直接使用，其他字符串（如 openssl rand -base64 生成的口令）经 SHA-256 派生
+    """
+    try:
+        return Fernet(key)
+    except (ValueError, binascii.Error):
+        return Fernet(base64.urlsafe_b64encode(hashlib.sha256(key.encode()).digest()))
+
+
+def _shared_key_file(path: str) -> str:
+    """
+    读取共享密钥文件，不存在时先写临时文件再 link 到目标路径，多个 worker 同时启动也只会有一个密钥生效
+    """
+    if not os.path.exists(path):
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(Fernet.generate_key())
+            os.chmod(tmp_path, 0o600)
+            os.link(tmp_path, path)
+            logger.warning(f"⚠️  ENCRYPTION_KEY not set, generated a shared key in {path}; set ENCRYPTION_KEY for multi-host deployments")
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp_path)
+    with open(path, "r") as f:
+        return f.read().strip()
+
+
+def load_cipher() -> MultiFernet:
+    keys = [k.strip() for k in ENCRYPTION_KEY.split(",") if k.strip()]
+    if not keys:
+        keys = [_shared_key_file(ENCRYPTION_KEY_FILE)]
+    return MultiFernet([_fernet(k) for k in keys])
+
+
+cipher_suite = load_cipher()
+
+
+def encrypt_api_key(api_key: str) -> str:
+    return cipher_suite.encrypt(api_key.encode()).decode()
+
+
+def decrypt_api_key(encrypted_key: str) -> str:
+    return cipher_suite.decrypt(encrypted_key.encode()).decode()
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    """
+    生效 AIConfig 的只读快照，api_key 为明文，仅供 llm_gateway 调用上游使用，
+    不得出现在任何接口响应中（也不出现在 repr / 日志中）
+    """
+    id: str
+    provider: str
+    model_name: str
+    api_endpoint: Optional[str]
+    temperature: float
+    max_tokens: int
+    priority: int
+    api_key: str = field(repr=False)
+    is_active: bool = True
+
+
+class ProviderRegistry:
+    """
+    生效配置的进程内快照：启动时加载，本进程增改配置后立即重新加载，
+    其他 worker 的修改在 AI_CONFIG_REFRESH_SECONDS 内生效；每个密文只解密一次
+    """
+
+    def __init__(self, refresh_seconds: float = AI_CONFIG_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._configs: List[ProviderConfig] = []
+        self._keys: Dict[Tuple[str, str], str] = {}
+        self._undecryptable = set()
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _query():
+        return select(AIConfig).where(AIConfig.is_active == True).order_by(AIConfig.priority.desc())
+
+    def _build(self, rows: List[AIConfig]) -> None:
+        keys = {}
+        configs = []
+        for row in rows:
+            cache_key = (row.id, row.api_key_encrypted)
+            api_key = self._keys.get(cache_key)
+            if api_key is None:
+                if cache_key in self._undecryptable:
+                    continue
+                try:
+                    api_key = decrypt_api_key(row.api_key_encrypted)
+                except InvalidToken:
+                    self._undecryptable.add(cache_key)
+                    logger.warning(f"⚠️  AI config {row.id} cannot be decrypted with the configured ENCRYPTION_KEY, skipped")
+                    continue
+            keys[cache_key] = api_key
+            configs.append(ProviderConfig(
+                id=row.id,
+                provider=row.provider,
+                model_name=row.model_name,
+                api_endpoint=row.api_endpoint,
+                temperature=row.temperature,
+                max_tokens=row.max_tokens,
+                priority=row.priority or 0,
+                api_key=api_key
+            ))
+        self._keys = keys
+        self._configs = configs
+        self._loaded_at = time.monotonic()
+
+    def load_sync(self, db: Session) -> int:
+        """
+        应用启动时加载，返回生效配置数
+        """
+        self._build(db.scalars(self._query()).all())
+        return len(self._configs)
+
+    async def reload(self, db) -> None:
+        self._build((await db.scalars(self._query())).all())
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def _fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds
+
+    async def active(self) -> List[ProviderConfig]:
+        """
+        返回生效配置（优先级从高到低），快照过期时用独立会话重新加载
+        """
+        if not self._fresh():
+            async with self._lock:
+                if not self._fresh():
+                    async with db_session() as db:
+                        await self.reload(db)
+        return self._configs
+
+
+provider_registry = ProviderRegistry()
+
+
+def rotate_api_keys(db: Session) -> int:
+    """
+    用当前主密钥重新加密所有 API Key，返回更新的行数；由调用方提交
+    轮换步骤：把新密钥加到 ENCRYPTION_KEY 最前面并重启，执行本函数，之后即可移除旧密钥
+    """
+    rotated = 0
+    for config in db.scalars(select(AIConfig)).all():
+        try:
+            token = cipher_suite.rotate(config.api_key_encrypted.encode()).decode()
+        except InvalidToken:
+            logger.warning(f"⚠️  AI config {config.id} cannot be decrypted with the configured ENCRYPTION_KEY, not rotated")
+            continue
+        config.api_key_encrypted = token
+        rotated += 1
+    return rotated
+
+
+def main():
+    """主函数"""
+    # 设置控制台编码为 UTF-8
+    if sys.platform == "win32":
+        os.system("chcp 65001 >nul 2>&1")
+
+    if sys.argv[1:] != ["rotate"]:
+        print("用法: python provider_registry.py rotate")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("  AI时间管理系统 - 轮换 AI API Key 加密密钥")
+    print("=" * 60)
+    print_db_info()
+    print("")
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        rotated = rotate_api_keys(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[错误] 密钥轮换失败: {str(e)}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"[完成] 已重新加密 {rotated} 个 API Key")
+
+
+if __name__ == "__main__":
+    main()
+
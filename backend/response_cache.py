@@ -0,0 +1,238 @@
+"""
+AI 回复缓存 - 位于服务商路由之前，相同（规范化后）的提示直接返回已缓存的回复
+只缓存 temperature == 0 的配置：此时同样的输入应得到同样的输出
+
+两级缓存：
+- 进程内 LRU（cache.TTLCache），按条数淘汰
+- 可选的 SQLite 持久层（LLM_CACHE_PATH），重启后仍然有效，按 TTL 和条数淘汰
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from cache import TTLCache, register_cache
+from llm_gateway import CompletionResult
+from llm_router import provider_router
+from logger import logger
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1000"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+# 持久层数据库文件，留空则只使用内存缓存
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+LLM_CACHE_DB_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DB_MAX_ENTRIES", "10000"))
+# 超过该长度的流式回复不缓存，避免为缓存在内存中拼接过长的回复
+LLM_CACHE_MAX_CHARS = int(os.getenv("LLM_CACHE_MAX_CHARS", "32000"))
+
+
+def normalize_messages(messages: List[Dict[str, str]]) -> List[List[str]]:
+    """
+    统一 Unicode 形式并折叠空白，只在空格、换行上有差异的提示视为相同
+    """
+    return [
+        [m["role"].strip().lower(), " ".join(unicodedata.normalize("NFKC", m.get("content") or "").split())]
+        for m in messages
+    ]
+
+
+def cache_key(config, messages: List[Dict[str, str]]) -> str:
+    """
+    计入配置 ID、服务商和端点：停用、切换或替换配置后，不会再用到其他服务商生成的回复
+    """
+    payload = [
+        config.id, config.provider, config.api_endpoint, config.model_name,
+        config.temperature, config.max_tokens, normalize_messages(messages)
+    ]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class SQLiteResponseStore:
+    """
+    SQLite 持久层：过期时间用墙钟时间保存；每写入 evict_every 次清理一次过期条目和超出上限的最久未使用条目
+    """
+
+    def __init__(self, name: str, path: str, max_entries: int = LLM_CACHE_DB_MAX_ENTRIES, ttl: float = LLM_CACHE_TTL, evict_every: int = 100):
+        self.name = name
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_last_used ON llm_responses (last_used)")
+        register_cache(self)
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + self.ttl, now)
+            )
+            self._writes += 1
+            if self._writes % self.evict_every == 1:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self.evictions += self._conn.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (now,)).rowcount
+        overflow = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            self.evictions += self._conn.execute(
+                "DELETE FROM llm_responses WHERE key IN "
+                "(SELECT key FROM llm_responses ORDER BY last_used LIMIT ?)",
+                (overflow,)
+            ).rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "path": self.path,
+            "size": size,
+            "max_size": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class ResponseCache:
+    """
+    包装 provider_router：先查缓存，未命中再调用服务商并写入缓存
+    """
+
+    def __init__(self):
+        self.memory = TTLCache("llm_responses", max_size=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL)
+        self.store: Optional[SQLiteResponseStore] = None
+        if LLM_CACHE_ENABLED and LLM_CACHE_PATH:
+            try:
+                self.store = SQLiteResponseStore("llm_responses_sqlite", LLM_CACHE_PATH)
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️  LLM response cache database unavailable, using memory only: {str(e)}")
+
+    def cacheable(self, config) -> bool:
+        return LLM_CACHE_ENABLED and config.temperature == 0
+
+    async def get(self, key: str) -> Optional[CompletionResult]:
+        result = self.memory.get(key)
+        if result is None and self.store is not None:
+            value = await run_in_threadpool(self.store.get, key)
+            if value is not None:
+                result = CompletionResult(**value)
+                self.memory.set(key, result)
+        return result
+
+    async def set(self, key: str, result: CompletionResult) -> None:
+        self.memory.set(key, result)
+        if self.store is not None:
+            value = {"content": result.content, "model": result.model, "usage": result.usage}
+            await run_in_threadpool(self.store.set, key, value)
+
+    async def _lookup(self, configs: List, messages: List[Dict[str, str]]) -> Optional[Tuple[object, CompletionResult]]:
+        # 按优先级依次查找每个可用配置自己的缓存
+        for config in configs:
+            if not self.cacheable(config):
+                continue
+            result = await self.get(cache_key(config, messages))
+            if result is not None:
+                return config, result
+        return None
+
+    async def complete(self, configs: List, api_key_for, messages: List[Dict[str, str]]) -> Tuple[object, CompletionResult, bool]:
+        """
+        返回 (应答的配置, 回复, 是否来自缓存)
+        """
+        hit = await self._lookup(configs, messages)
+        if hit is not None:
+            return hit[0], hit[1], True
+
+        config, result = await provider_router.complete(configs, api_key_for, messages)
+        if self.cacheable(config):
+            await self.set(cache_key(config, messages), result)
+        return config, result, False
+
+    async def stream(self, configs: List, api_key_for, messages: List[Dict[str, str]]) -> AsyncIterator[Tuple[object, str]]:
+        """
+        流式版本：命中时一次性产出缓存的回复；未命中且可缓存时边转发边拼接，完整结束后写入缓存
+        """
+        hit = await self._lookup(configs, messages)
+        if hit is not None:
+            yield hit[0], hit[1].content
+            return
+
+        parts: Optional[List[str]] = []
+        length = 0
+        config = None
+        deltas = provider_router.stream(configs, api_key_for, messages)
+        try:
+            async for config, delta in deltas:
+                if parts is not None and self.cacheable(config):
+                    length += len(delta)
+                    if length <= LLM_CACHE_MAX_CHARS:
+                        parts.append(delta)
+                    else:
+                        parts = None
+                yield config, delta
+        finally:
+            await deltas.aclose()
+        if config is not None and parts and self.cacheable(config):
+            await self.set(cache_key(config, messages), CompletionResult(content="".join(parts), model=config.model_name))
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.store is not None:
+            self.store.clear()
+
+
+response_cache = ResponseCache()
+
+
+__all__ = [
+    "ResponseCache",
+    "SQLiteResponseStore",
+    "response_cache",
+    "cache_key",
+    "normalize_messages"
+]
@@ -0,0 +1,198 @@
+"""
+每日用时汇总 - daily_user_stats 按 (用户, 用户时区的自然日, 分类) 汇总计划用时、完成用时和任务数，
+在写入任务时与业务数据同一事务内增量维护；/api/analytics/range 只读取汇总行，不再加载全部任务
+任务按 start_time（没有时按 created_at）换算到 User.timezone 后归入某一天
+运行此脚本可从任务表全量重建汇总
+"""
+from datetime import date, datetime, timezone, tzinfo
+from functools import lru_cache
+from itertools import groupby
+from typing import Any, Dict, Iterable, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from database import DATABASE_TYPE, SessionLocal, engine, Base, print_db_info
+from models import DailyUserStat, Task, User
+import sys
+import os
+
+# 汇总变更: {(day, category): (planned_minutes, completed_minutes, task_count, completed_count)}
+Stats = Tuple[int, int, int, int]
+Changes = Dict[Tuple[date, str], Stats]
+
+# 计算汇总需要的任务列，批量修改 / 删除前只查询这些列
+ROLLUP_COLUMNS = (Task.start_time, Task.end_time, Task.duration, Task.status, Task.category, Task.created_at)
+
+STAT_FIELDS = ("planned_minutes", "completed_minutes", "task_count", "completed_count")
+
+
+@lru_cache(maxsize=256)
+def user_zone(timezone_name: Optional[str]) -> tzinfo:
+    """
+    用户时区，无效的时区名按 UTC 处理
+    """
+    try:
+        return ZoneInfo(timezone_name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def local_day(moment: datetime, zone: tzinfo) -> date:
+    # 数据库中的时间均为 UTC（naive）
+    return moment.replace(tzinfo=timezone.utc).astimezone(zone).date()
+
+
+def task_field(task: Any, name: str):
+    # task 可以是 Task、查询结果行或列值字典
+    return task.get(name) if isinstance(task, dict) else getattr(task, name, None)
+
+
+def task_minutes(duration: Optional[int], start_time: Optional[datetime], end_time: Optional[datetime]) -> int:
+    """
+    任务的计划用时：优先取 duration，否则取起止时间之差
+    """
+    if duration is not None:
+        return max(duration, 0)
+    if start_time and end_time and end_time > start_time:
+        return int((end_time - start_time).total_seconds() // 60)
+    return 0
+
+
+def task_changes(tasks: Iterable[Any], zone: tzinfo, sign: int = 1, overrides: Optional[Dict[str, Any]] = None) -> Changes:
+    """
+    一组任务对汇总的贡献，sign=-1 表示撤销；tasks 可以是 Task、查询结果行或列值字典
+    overrides 中的字段（如批量修改的 status / category）覆盖任务本身的值
+    """
+    overrides = overrides or {}
+    changes: Changes = {}
+    for task in tasks:
+        value = lambda name: overrides[name] if name in overrides else task_field(task, name)
+        start_time = value("start_time")
+        moment = start_time or value("created_at") or datetime.utcnow()
+        key = (local_day(moment, zone), value("category") or "")
+        minutes = task_minutes(value("duration"), start_time, value("end_time"))
+        completed = value("status") == "completed"
+        stats = (minutes, minutes if completed else 0, 1, 1 if completed else 0)
+        previous = changes.get(key, (0, 0, 0, 0))
+        changes[key] = tuple(old + sign * delta for old, delta in zip(previous, stats))
+    return changes
+
+
+def merge(*changes: Changes) -> Changes:
+    merged: Changes = {}
+    for item in changes:
+        for key, stats in item.items():
+            previous = merged.get(key, (0, 0, 0, 0))
+            merged[key] = tuple(old + delta for old, delta in zip(previous, stats))
+    return merged
+
+
+def _upsert_statement(user_id: str, day: date, category: str, stats: Stats):
+    values = dict(zip(STAT_FIELDS, stats), user_id=user_id, day=day, category=category, updated_at=datetime.utcnow())
+
+    if DATABASE_TYPE.lower() == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(DailyUserStat).values(**values)
+        increments = {field: getattr(DailyUserStat, field) + getattr(stmt.inserted, field) for field in STAT_FIELDS}
+        return stmt.on_duplicate_key_update(updated_at=stmt.inserted.updated_at, **increments)
+
+    from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(DailyUserStat).values(**values)
+    increments = {field: getattr(DailyUserStat, field) + getattr(stmt.excluded, field) for field in STAT_FIELDS}
+    return stmt.on_conflict_do_update(
+        index_elements=[DailyUserStat.user_id, DailyUserStat.day, DailyUserStat.category],
+        set_=dict(increments, updated_at=stmt.excluded.updated_at)
+    )
+
+
+async def apply(db, user_id: str, changes: Changes) -> None:
+    """
+    在当前事务内累加汇总，任务数减到 0 的行随即删除，由调用方负责 commit
+    """
+    emptied = set()
+    for (day, category), stats in sorted(changes.items()):
+        if any(stats):
+            await db.execute(_upsert_statement(user_id, day, category, stats))
+            if stats[2] < 0:
+                emptied.add(day)
+    if emptied:
+        await db.execute(delete(DailyUserStat).where(
+            DailyUserStat.user_id == user_id,
+            DailyUserStat.day.in_(sorted(emptied)),
+            DailyUserStat.task_count <= 0
+        ))
+
+
+def rebuild_rollups(db: Session, user_id: Optional[str] = None) -> int:
+    """
+    从任务表重建汇总（指定 user_id 时只重建该用户，如修改时区后），返回写入的行数，由调用方负责 commit
+    可通过 AsyncSession.run_sync 在请求中调用
+    """
+    query = select(Task.user_id, User.timezone, *ROLLUP_COLUMNS).join(User, User.id == Task.user_id)
+    purge = delete(DailyUserStat)
+    if user_id is not None:
+        query = query.where(Task.user_id == user_id)
+        purge = purge.where(DailyUserStat.user_id == user_id)
+
+    totals: Dict[str, Changes] = {}
+    result = db.execute(query.order_by(Task.user_id).execution_options(yield_per=1000))
+    for owner, user_rows in groupby(result, key=lambda row: row.user_id):
+        user_rows = list(user_rows)
+        totals[owner] = task_changes(user_rows, user_zone(user_rows[0].timezone))
+
+    now = datetime.utcnow()
+    rows = [
+        dict(zip(STAT_FIELDS, stats), user_id=owner, day=day, category=category, updated_at=now)
+        for owner, user_totals in totals.items()
+        for (day, category), stats in user_totals.items()
+    ]
+    db.execute(purge)
+    if rows:
+        db.execute(insert(DailyUserStat), rows)
+    return len(rows)
+
+
+def ensure_rollups(db: Session) -> bool:
+    """
+    汇总表为空而任务表不为空（旧数据库升级）时重建，返回是否执行了重建
+    """
+    if db.scalar(select(func.count()).select_from(select(DailyUserStat.user_id).limit(1).subquery())):
+        return False
+    if not db.scalar(select(func.count()).select_from(select(Task.id).limit(1).subquery())):
+        return False
+    rebuild_rollups(db)
+    db.commit()
+    return True
+
+
+def main():
+    """主函数"""
+    # 设置控制台编码为 UTF-8
+    if sys.platform == "win32":
+        os.system("chcp 65001 >nul 2>&1")
+
+    print("=" * 60)
+    print("  AI时间管理系统 - 重建每日用时汇总")
+    print("=" * 60)
+    print_db_info()
+    print("")
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        written = rebuild_rollups(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[错误] 汇总重建失败: {str(e)}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"[完成] 已重建 {written} 行每日汇总")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from pydantic import BaseModel
-from typing import List
-from datetime import datetime, timedelta
+from typing import List, Optional
+from datetime import datetime
 
 from database import get_db
-from models import User, Task, Insight, AdminUser, AuditLog
+from models import User, AdminUser, AuditLog, AIConfig, JobRun
+from cache import get_cache_stats
+from llm_router import provider_router, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN
+from response_cache import response_cache
+from provider_registry import provider_registry, rotate_api_keys
+from pagination import keyset_condition, set_next_cursor
+from jobs import job_scheduler
+from routers.auth import get_current_admin
+import counters
 
 router = APIRouter()
 
@@ -31,62 +39,136 @@ class UserListItem(BaseModel):
         from_attributes = True
 
 @router.get("/stats", response_model=AdminStats)
-async def get_admin_stats(db: Session = Depends(get_db)):
+async def get_admin_stats(db: AsyncSession = Depends(get_db)):
     # In production, add admin authentication
     
-    total_users = db.query(func.count(User.id)).scalar()
-    
-    # Active users today (users who created tasks today)
-    today = datetime.utcnow().date()
-    active_users_today = db.query(func.count(func.distinct(Task.user_id))).filter(
-        func.date(Task.created_at) == today
-    ).scalar()
-    
-    total_tasks = db.query(func.count(Task.id)).scalar()
-    completed_tasks = db.query(func.count(Task.id)).filter(Task.status == "completed").scalar()
-    total_insights = db.query(func.count(Insight.id)).scalar()
-    
-    premium_users = db.query(func.count(User.id)).filter(User.subscription_tier == "premium").scalar()
-    pro_users = db.query(func.count(User.id)).filter(User.subscription_tier == "pro").scalar()
-    
-    return {
-        "total_users": total_users or 0,
-        "active_users_today": active_users_today or 0,
-        "total_tasks": total_tasks or 0,
-        "completed_tasks": completed_tasks or 0,
-        "total_insights": total_insights or 0,
-        "premium_users": premium_users or 0,
-        "pro_users": pro_users or 0
+    # Counters are maintained on every write; active users are tracked per UTC day
+    names = {
+        "total_users": counters.USERS,
+        "active_users_today": counters.active_users_on(datetime.utcnow().date()),
+        "total_tasks": counters.TASKS,
+        "completed_tasks": counters.COMPLETED_TASKS,
+        "total_insights": counters.INSIGHTS,
+        "premium_users": counters.users_by_tier("premium"),
+        "pro_users": counters.users_by_tier("pro")
     }
+    values = await counters.read(db, counters.GLOBAL_SCOPE, names.values())
+    return {field: values[name] for field, name in names.items()}
+
+@router.post("/stats/rebuild")
+async def rebuild_admin_stats(
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    written = await db.run_sync(counters.rebuild_counters)
+    await db.commit()
+    return {"message": "Counters rebuilt", "counters": written}
 
 @router.get("/users", response_model=List[UserListItem])
 async def get_users_list(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
     # In production, add admin authentication
-    users = db.query(User).order_by(User.created_at.desc()).offset(skip).limit(limit).all()
+    query = select(User)
+    if cursor:
+        query = query.where(keyset_condition(User.created_at, User.id, cursor, descending=True))
+    else:
+        query = query.offset(skip)
+    
+    users = (await db.scalars(query.order_by(User.created_at.desc(), User.id.desc()).limit(limit))).all()
+    set_next_cursor(response, users, limit, "created_at")
     return users
 
 @router.get("/users/{user_id}")
-async def get_user_detail(user_id: str, db: Session = Depends(get_db)):
+async def get_user_detail(user_id: str, db: AsyncSession = Depends(get_db)):
     # In production, add admin authentication
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get user statistics
-    task_count = db.query(func.count(Task.id)).filter(Task.user_id == user_id).scalar()
-    completed_task_count = db.query(func.count(Task.id)).filter(
-        Task.user_id == user_id,
-        Task.status == "completed"
-    ).scalar()
+    values = await counters.read(db, user_id, [counters.TASKS, counters.COMPLETED_TASKS])
     
     return {
         "user": user,
         "stats": {
-            "total_tasks": task_count or 0,
-            "completed_tasks": completed_task_count or 0
+            "total_tasks": values[counters.TASKS],
+            "completed_tasks": values[counters.COMPLETED_TASKS]
         }
     }
+
+@router.get("/cache/stats")
+async def get_admin_cache_stats(current_admin: User = Depends(get_current_admin)):
+    return get_cache_stats()
+
+@router.get("/ai-providers/health")
+async def get_ai_provider_health(
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    configs = (await db.scalars(select(AIConfig).order_by(AIConfig.priority.desc()))).all()
+    return {
+        "breaker": {"failures": LLM_BREAKER_FAILURES, "cooldown_seconds": LLM_BREAKER_COOLDOWN},
+        "providers": provider_router.snapshot(configs)
+    }
+
+@router.post("/ai-providers/{config_id}/reset")
+async def reset_ai_provider_health(config_id: str, current_admin: User = Depends(get_current_admin)):
+    # Closes the circuit and clears the rolling stats for one config
+    return {"message": "Provider health reset", "config_id": config_id, "existed": provider_router.reset(config_id)}
+
+@router.post("/cache/llm-responses/clear")
+async def clear_llm_response_cache(current_admin: User = Depends(get_current_admin)):
+    response_cache.clear()
+    return {"message": "LLM response cache cleared"}
+
+@router.post("/ai-providers/rotate-keys")
+async def rotate_ai_provider_keys(
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    # Re-encrypts every stored API key with the first ENCRYPTION_KEY entry
+    rotated = await db.run_sync(rotate_api_keys)
+    await db.commit()
+    await provider_registry.reload(db)
+    return {"message": "API keys re-encrypted with the primary key", "rotated": rotated}
+
+@router.get("/jobs")
+async def get_job_runs(
+    limit: int = Query(20, ge=1, le=200),
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    最近的后台任务执行记录（每个任务每天一条）
+    """
+    runs = (await db.scalars(select(JobRun).order_by(JobRun.started_at.desc()).limit(limit))).all()
+    return [
+        {
+            "id": run.id,
+            "job": run.job,
+            "status": run.status,
+            "owner": run.owner,
+            "cursor": run.cursor,
+            "processed": run.processed,
+            "skipped": run.skipped,
+            "failed": run.failed,
+            "error": run.error,
+            "started_at": run.started_at,
+            "heartbeat_at": run.heartbeat_at,
+            "finished_at": run.finished_at
+        }
+        for run in runs
+    ]
+
+@router.post("/jobs/insights/run", status_code=202)
+async def run_insight_job(current_admin: User = Depends(get_current_admin)):
+    """
+    立即在后台执行当天的洞察任务；当天已完成或正由其他进程执行时不做任何事
+    """
+    job_scheduler.trigger()
+    return {"message": "Insight job triggered"}
@@ -1,19 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from pydantic import BaseModel
 from typing import List, Optional
-from cryptography.fernet import Fernet
-import os
 
 from database import get_db
-from models import AIConfig
+from models import AIConfig, User
+from routers.auth import get_current_admin, get_current_user
+import llm_gateway
+from llm_router import provider_router
+# Key material (ENCRYPTION_KEY, MultiFernet rotation) lives in provider_registry
+from provider_registry import provider_registry, encrypt_api_key, decrypt_api_key
 
 router = APIRouter()
 
-# Encryption key for API keys (in production, use proper key management)
-ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY", Fernet.generate_key())
-cipher_suite = Fernet(ENCRYPTION_KEY)
-
 class AIConfigCreate(BaseModel):
     provider: str
     model_name: str
@@ -36,25 +36,31 @@ class AIConfigResponse(BaseModel):
     class Config:
         from_attributes = True
 
-def encrypt_api_key(api_key: str) -> str:
-    return cipher_suite.encrypt(api_key.encode()).decode()
+class ActiveAIConfigResponse(BaseModel):
+    provider: str
+    model_name: str
+    api_endpoint: Optional[str]
+    temperature: float
+    max_tokens: int
 
-def decrypt_api_key(encrypted_key: str) -> str:
-    return cipher_suite.decrypt(encrypted_key.encode()).decode()
+    class Config:
+        from_attributes = True
 
 @router.get("/", response_model=List[AIConfigResponse])
-async def get_ai_configs(db: Session = Depends(get_db)):
-    # In production, add admin authentication
-    configs = db.query(AIConfig).order_by(AIConfig.priority.desc()).all()
+async def get_ai_configs(
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    configs = (await db.scalars(select(AIConfig).order_by(AIConfig.priority.desc()))).all()
     return configs
 
 @router.post("/", response_model=AIConfigResponse)
 async def create_ai_config(
     config_data: AIConfigCreate,
-    db: Session = Depends(get_db)
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
 ):
-    # In production, add admin authentication
-    
+    # api_endpoint is called server-side by llm_gateway, so only admins may register configs
     # Encrypt API key
     encrypted_key = encrypt_api_key(config_data.api_key)
     
@@ -70,43 +76,41 @@ async def create_ai_config(
     )
     
     db.add(new_config)
-    db.commit()
-    db.refresh(new_config)
+    await db.commit()
+    await db.refresh(new_config)
+    await provider_registry.reload(db)
     
     return new_config
 
 @router.put("/{config_id}/toggle")
 async def toggle_ai_config(
     config_id: str,
-    db: Session = Depends(get_db)
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
 ):
-    # In production, add admin authentication
-    config = db.query(AIConfig).filter(AIConfig.id == config_id).first()
+    config = await db.get(AIConfig, config_id)
     if not config:
         raise HTTPException(status_code=404, detail="AI config not found")
     
     config.is_active = not config.is_active
-    db.commit()
+    await db.commit()
+    await provider_registry.reload(db)
     
     return {"message": "AI config toggled", "is_active": config.is_active}
 
-@router.get("/active")
-async def get_active_ai_config(db: Session = Depends(get_db)):
-    # Get the highest priority active config
-    config = db.query(AIConfig).filter(
-        AIConfig.is_active == True
-    ).order_by(AIConfig.priority.desc()).first()
+@router.get("/active", response_model=ActiveAIConfigResponse)
+async def get_active_ai_config(current_user: User = Depends(get_current_user)):
+    # The config the provider router would try first (skips configs with an open circuit);
+    # the decrypted key stays server-side, requests go through llm_gateway
+    candidates = provider_router.candidates(await provider_registry.active())
     
-    if not config:
+    if not candidates:
         raise HTTPException(status_code=404, detail="No active AI config found")
-    
-    # Decrypt API key for use
-    decrypted_key = decrypt_api_key(config.api_key_encrypted)
+    config = candidates[0]
     
     return {
         "provider": config.provider,
         "model_name": config.model_name,
-        "api_key": decrypted_key,
         "api_endpoint": config.api_endpoint,
         "temperature": config.temperature,
         "max_tokens": config.max_tokens
@@ -116,19 +120,34 @@ async def get_active_ai_config(db: Session = Depends(get_db)):
 async def test_ai_config(
     config_id: str,
     test_prompt: str = "Hello, this is a test.",
-    db: Session = Depends(get_db)
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
 ):
-    # In production, add admin authentication
-    config = db.query(AIConfig).filter(AIConfig.id == config_id).first()
+    # Spends provider quota, so only admins may call it
+    config = await db.get(AIConfig, config_id)
     if not config:
         raise HTTPException(status_code=404, detail="AI config not found")
     
-    # Here you would actually call the AI API
-    # For now, return a mock response
+    # Send the test prompt through the shared gateway client
+    try:
+        result = await llm_gateway.complete(
+            config,
+            decrypt_api_key(config.api_key_encrypted),
+            [{"role": "user", "content": test_prompt}]
+        )
+    except llm_gateway.LLMGatewayError as e:
+        return {
+            "success": False,
+            "message": f"AI config test failed: {str(e)}",
+            "provider": config.provider,
+            "model": config.model_name,
+            "upstream_status": e.status_code
+        }
+    
     return {
         "success": True,
         "message": "AI config test successful",
         "provider": config.provider,
-        "model": config.model_name,
-        "test_response": "Mock AI response - integration pending"
+        "model": result.model,
+        "test_response": result.content
     }
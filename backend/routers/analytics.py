@@ -0,0 +1,132 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+import os
+
+from database import get_db
+from models import DailyUserStat, User
+from routers.auth import get_current_user
+import rollups
+
+router = APIRouter()
+
+# 一次查询最多覆盖的天数（年视图按自然年为 365 / 366 天）
+ANALYTICS_MAX_RANGE_DAYS = int(os.getenv("ANALYTICS_MAX_RANGE_DAYS", "366"))
+
+GRANULARITIES = ("day", "week", "month")
+
+class UsageStats(BaseModel):
+    planned_minutes: int = 0
+    completed_minutes: int = 0
+    task_count: int = 0
+    completed_count: int = 0
+    completion_rate: float = 0.0
+
+class CategoryUsage(UsageStats):
+    # null 表示未分类
+    category: Optional[str]
+
+class PeriodUsage(UsageStats):
+    # 周期的第一天：day 为当天，week 为周一，month 为 1 号（可能早于 start）
+    period: date
+
+class RangeResponse(BaseModel):
+    start: date
+    end: date
+    granularity: str
+    totals: UsageStats
+    categories: List[CategoryUsage]
+    series: List[PeriodUsage]
+
+def _stats(planned, completed, tasks, completed_tasks) -> dict:
+    tasks = tasks or 0
+    return {
+        "planned_minutes": planned or 0,
+        "completed_minutes": completed or 0,
+        "task_count": tasks,
+        "completed_count": completed_tasks or 0,
+        "completion_rate": round((completed_tasks or 0) / tasks, 4) if tasks else 0.0
+    }
+
+def _period_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def _next_period(period: date, granularity: str) -> date:
+    if granularity == "week":
+        return period + timedelta(days=7)
+    if granularity == "month":
+        return (period + timedelta(days=32)).replace(day=1)
+    return period + timedelta(days=1)
+
+@router.get("/range", response_model=RangeResponse)
+async def get_usage_range(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = "day",
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    [start, end]（用户时区的自然日，默认最近 7 天）内的任务用时与完成率：
+    总计、按分类汇总，以及按 day / week / month 划分的时间序列（没有任务的周期补 0）
+    只读取 daily_user_stats，按天汇总最多 ANALYTICS_MAX_RANGE_DAYS 行，按分类汇总每个分类一行
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=422, detail=f"granularity must be one of {', '.join(GRANULARITIES)}")
+    end = end or datetime.now(rollups.user_zone(current_user.timezone)).date()
+    start = start or end - timedelta(days=6)
+    if start > end:
+        raise HTTPException(status_code=422, detail="start must not be after end")
+    if (end - start).days + 1 > ANALYTICS_MAX_RANGE_DAYS:
+        raise HTTPException(status_code=422, detail=f"At most {ANALYTICS_MAX_RANGE_DAYS} days per query")
+
+    sums = (
+        func.sum(DailyUserStat.planned_minutes),
+        func.sum(DailyUserStat.completed_minutes),
+        func.sum(DailyUserStat.task_count),
+        func.sum(DailyUserStat.completed_count)
+    )
+    in_range = (
+        DailyUserStat.user_id == current_user.id,
+        DailyUserStat.day >= start,
+        DailyUserStat.day <= end
+    )
+
+    category_rows = (await db.execute(
+        select(DailyUserStat.category, *sums).where(*in_range).group_by(DailyUserStat.category)
+    )).all()
+    day_rows = (await db.execute(
+        select(DailyUserStat.day, *sums).where(*in_range).group_by(DailyUserStat.day)
+    )).all()
+
+    periods = {}
+    period = _period_start(start, granularity)
+    while period <= end:
+        periods[period] = [0, 0, 0, 0]
+        period = _next_period(period, granularity)
+    for day, *values in day_rows:
+        totals = periods[_period_start(day, granularity)]
+        for index, value in enumerate(values):
+            totals[index] += value or 0
+
+    categories = sorted(
+        ({"category": category or None, **_stats(*values)} for category, *values in category_rows),
+        key=lambda item: -item["planned_minutes"]
+    )
+    totals = [sum(item[field] for item in categories) for field in rollups.STAT_FIELDS]
+
+    return {
+        "start": start,
+        "end": end,
+        "granularity": granularity,
+        "totals": _stats(*totals),
+        "categories": categories,
+        "series": [{"period": period, **_stats(*values)} for period, values in periods.items()]
+    }
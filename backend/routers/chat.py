@@ -1,17 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, func, update
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
+from contextlib import aclosing
+import anyio
+import json
+import os
+import textwrap
+import time
 import uuid
 
-from database import get_db
-from models import ChatMessage, User
+from database import get_db, db_session
+from models import ChatMessage, ChatSession, User
 from routers.auth import get_current_user
+from pagination import encode_cursor, keyset_condition, set_next_cursor
+import counters
+import chat_sessions
+import llm_gateway
+from response_cache import response_cache
+from provider_registry import provider_registry
 
 router = APIRouter()
 
+# 导出时每页读取的消息数，每页使用一个短会话
+EXPORT_BATCH_SIZE = int(os.getenv("CHAT_EXPORT_BATCH_SIZE", "500"))
+
+# 调用 AI 时随请求发送的历史消息条数
+CHAT_CONTEXT_MESSAGES = int(os.getenv("CHAT_CONTEXT_MESSAGES", "20"))
+
+# 流式回复的检查点：累计字数或间隔秒数达到其一即写入数据库
+CHAT_STREAM_CHECKPOINT_CHARS = int(os.getenv("CHAT_STREAM_CHECKPOINT_CHARS", "1024"))
+CHAT_STREAM_CHECKPOINT_SECONDS = float(os.getenv("CHAT_STREAM_CHECKPOINT_SECONDS", "2"))
+
 class ChatMessageCreate(BaseModel):
     session_id: Optional[str] = None
     role: str
@@ -35,11 +58,50 @@ class ChatSessionResponse(BaseModel):
     first_message: str
     last_message_at: datetime
 
+class ChatCompleteRequest(BaseModel):
+    session_id: Optional[str] = None
+    content: str
+    system_prompt: Optional[str] = None
+
+class ChatCompleteResponse(BaseModel):
+    session_id: str
+    user_message: ChatMessageResponse
+    assistant_message: ChatMessageResponse
+    usage: Optional[dict] = None
+
+async def _persist_messages(db: AsyncSession, user_id: str, messages: List[ChatMessage]):
+    """
+    写入消息并同步更新会话摘要与计数器，由调用方负责 commit
+    """
+    db.add_all(messages)
+    await db.flush()
+    
+    roles = {}
+    new_sessions = 0
+    for message in messages:
+        roles[message.role] = roles.get(message.role, 0) + 1
+        if await chat_sessions.record_message(db, message):
+            new_sessions += 1
+    
+    await counters.apply(db, counters.chat_changes(user_id, roles, sessions=new_sessions))
+
+async def _session_context(db: AsyncSession, user_id: str, session_id: str) -> List[dict]:
+    """
+    读取会话最近的消息作为上下文，按时间正序返回
+    """
+    rows = (await db.execute(select(ChatMessage.role, ChatMessage.content).where(
+        ChatMessage.user_id == user_id,
+        ChatMessage.session_id == session_id
+    ).order_by(
+        ChatMessage.created_at.desc(), ChatMessage.id.desc()
+    ).limit(CHAT_CONTEXT_MESSAGES))).all()
+    return [{"role": row.role, "content": row.content} for row in reversed(rows)]
+
 @router.post("/messages", response_model=ChatMessageResponse)
 async def create_chat_message(
     message_data: ChatMessageCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     创建聊天消息
@@ -56,34 +118,209 @@ async def create_chat_message(
             message_metadata=message_data.message_metadata
         )
         
-        db.add(new_message)
-        db.commit()
-        db.refresh(new_message)
+        await _persist_messages(db, current_user.id, [new_message])
+        await db.commit()
+        await db.refresh(new_message)
         
         return new_message
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create message: {str(e)}")
 
+async def _prepare_turn(db: AsyncSession, user_id: str, request_data: ChatCompleteRequest):
+    """
+    取出所有生效的 AI 配置，拼装发给服务商的消息（系统提示 + 会话上下文 + 本轮用户消息）
+    """
+    configs = await provider_registry.active()
+    if not configs:
+        raise HTTPException(status_code=404, detail="No active AI config found")
+    
+    session_id = request_data.session_id or str(uuid.uuid4())
+    messages = await _session_context(db, user_id, session_id) if request_data.session_id else []
+    if request_data.system_prompt:
+        messages.insert(0, {"role": "system", "content": request_data.system_prompt})
+    messages.append({"role": "user", "content": request_data.content})
+    return configs, session_id, messages
+
+def _api_key(config) -> str:
+    # 注册表中的配置已带有解密后的 Key
+    return config.api_key
+
+def _sse(data: dict, event: Optional[str] = None) -> bytes:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+async def _start_streamed_turn(user_id: str, session_id: str, content: str, asked_at: datetime, metadata: dict) -> str:
+    """
+    收到第一个增量时保存用户消息和空的 AI 回复占位，返回回复消息ID
+    每次写入使用独立的短会话，流式过程中不占用数据库连接和事务；
+    写入期间屏蔽取消，客户端断开不会打断进行中的事务
+    """
+    user_message = ChatMessage(user_id=user_id, session_id=session_id, role="user", content=content, created_at=asked_at)
+    assistant_message = ChatMessage(
+        user_id=user_id,
+        session_id=session_id,
+        role="assistant",
+        content="",
+        message_metadata=metadata,
+        created_at=datetime.utcnow()
+    )
+    with anyio.CancelScope(shield=True):
+        async with db_session() as db:
+            await _persist_messages(db, user_id, [user_message, assistant_message])
+            await db.commit()
+    return assistant_message.id
+
+async def _append_streamed_content(message_id: str, delta: str, metadata: Optional[dict] = None):
+    """
+    在数据库中追加回复内容（content = content || delta），内存中只保留上次检查点之后的增量
+    """
+    values = {"content": ChatMessage.content + delta} if delta else {}
+    if metadata is not None:
+        values["message_metadata"] = metadata
+    if not values:
+        return
+    with anyio.CancelScope(shield=True):
+        async with db_session() as db:
+            await db.execute(update(ChatMessage).where(ChatMessage.id == message_id).values(**values))
+            await db.commit()
+
+async def _stream_turn(user_id: str, session_id: str, configs: List, messages: List[dict], content: str):
+    """
+    转发服务商的增量，并按字数 / 时间间隔把回复检查点写入数据库
+    客户端断开时 Starlette 取消本生成器，上游连接随 aclosing 立即释放，已收到的内容仍会保存
+    """
+    asked_at = datetime.utcnow()
+    metadata = None
+    message_id = None
+    pending: List[str] = []
+    pending_chars = 0
+    last_checkpoint = time.monotonic()
+    status = "cancelled"
+    error = None
+    
+    yield _sse({"session_id": session_id}, event="start")
+    try:
+        async with aclosing(response_cache.stream(configs, _api_key, messages)) as deltas:
+            async for config, delta in deltas:
+                if message_id is None:
+                    metadata = {"provider": config.provider, "model": config.model_name, "status": "streaming"}
+                    message_id = await _start_streamed_turn(user_id, session_id, content, asked_at, metadata)
+                pending.append(delta)
+                pending_chars += len(delta)
+                yield _sse({"delta": delta})
+                
+                if pending_chars >= CHAT_STREAM_CHECKPOINT_CHARS or time.monotonic() - last_checkpoint >= CHAT_STREAM_CHECKPOINT_SECONDS:
+                    await _append_streamed_content(message_id, "".join(pending))
+                    pending, pending_chars = [], 0
+                    last_checkpoint = time.monotonic()
+        status = "complete"
+    except llm_gateway.LLMGatewayError as e:
+        status = "error"
+        error = str(e)
+    finally:
+        if message_id is not None:
+            await _append_streamed_content(message_id, "".join(pending), dict(metadata, status=status))
+    
+    if status == "complete":
+        yield _sse({"session_id": session_id, "message_id": message_id}, event="done")
+    else:
+        yield _sse({"detail": f"AI provider error: {error}", "message_id": message_id}, event="error")
+
+@router.post("/complete/stream")
+async def stream_chat_completion(
+    request_data: ChatCompleteRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    流式（SSE）调用 AI：event: start → data: {"delta"} ... → event: done / error
+    """
+    configs, session_id, messages = await _prepare_turn(db, current_user.id, request_data)
+    return StreamingResponse(
+        _stream_turn(current_user.id, session_id, configs, messages, request_data.content),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/complete", response_model=ChatCompleteResponse)
+async def complete_chat(
+    request_data: ChatCompleteRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    通过服务端网关调用 AI（按优先级故障转移），并在同一事务中保存用户消息和 AI 回复
+    """
+    configs, session_id, messages = await _prepare_turn(db, current_user.id, request_data)
+    asked_at = datetime.utcnow()
+    
+    try:
+        config, result, cached = await response_cache.complete(configs, _api_key, messages)
+    except llm_gateway.LLMGatewayError as e:
+        raise HTTPException(status_code=502, detail=f"AI provider error: {str(e)}")
+    # 缓存命中时没有消耗服务商的 token
+    usage = None if cached else result.usage
+    
+    try:
+        user_message = ChatMessage(
+            user_id=current_user.id,
+            session_id=session_id,
+            role="user",
+            content=request_data.content,
+            created_at=asked_at
+        )
+        assistant_message = ChatMessage(
+            user_id=current_user.id,
+            session_id=session_id,
+            role="assistant",
+            content=result.content,
+            message_metadata={"provider": config.provider, "model": result.model, "usage": usage, "cached": cached},
+            created_at=datetime.utcnow()
+        )
+        await _persist_messages(db, current_user.id, [user_message, assistant_message])
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to save chat turn: {str(e)}")
+    
+    return ChatCompleteResponse(
+        session_id=session_id,
+        user_message=user_message,
+        assistant_message=assistant_message,
+        usage=usage
+    )
+
 @router.get("/messages", response_model=List[ChatMessageResponse])
 async def get_chat_messages(
+    response: Response,
     session_id: Optional[str] = Query(None, description="会话ID"),
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(50, ge=1, le=200, description="返回数量"),
+    cursor: Optional[str] = Query(None, description="分页游标，来自上一页响应头 X-Next-Cursor"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     获取聊天消息列表
     """
     try:
-        query = db.query(ChatMessage).filter(ChatMessage.user_id == current_user.id)
+        query = select(ChatMessage).where(ChatMessage.user_id == current_user.id)
         
         if session_id:
-            query = query.filter(ChatMessage.session_id == session_id)
+            query = query.where(ChatMessage.session_id == session_id)
+        
+        # 提供游标时按 (created_at, id) 定位，否则兼容 skip/limit
+        if cursor:
+            query = query.where(keyset_condition(ChatMessage.created_at, ChatMessage.id, cursor, descending=False))
+        else:
+            query = query.offset(skip)
         
-        messages = query.order_by(ChatMessage.created_at.asc()).offset(skip).limit(limit).all()
+        messages = (await db.scalars(query.order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc()).limit(limit))).all()
+        set_next_cursor(response, messages, limit, "created_at")
         return messages
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get messages: {str(e)}")
 
@@ -92,31 +329,24 @@ async def get_chat_sessions(
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(20, ge=1, le=100, description="返回数量"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     获取聊天会话列表
     """
     try:
-        # 查询所有会话，按最后消息时间排序
-        sessions = db.query(
-            ChatMessage.session_id,
-            func.count(ChatMessage.id).label('message_count'),
-            func.min(ChatMessage.content).label('first_message'),
-            func.max(ChatMessage.created_at).label('last_message_at')
-        ).filter(
-            ChatMessage.user_id == current_user.id
-        ).group_by(
-            ChatMessage.session_id
+        # 会话摘要随消息写入维护，按最后消息时间走索引
+        sessions = (await db.scalars(select(ChatSession).where(
+            ChatSession.user_id == current_user.id
         ).order_by(
-            desc('last_message_at')
-        ).offset(skip).limit(limit).all()
+            ChatSession.last_message_at.desc(), ChatSession.session_id.desc()
+        ).offset(skip).limit(limit))).all()
         
         return [
             ChatSessionResponse(
                 session_id=session.session_id,
                 message_count=session.message_count,
-                first_message=session.first_message[:100] if session.first_message else "",
+                first_message=session.first_message or "",
                 last_message_at=session.last_message_at
             )
             for session in sessions
@@ -128,148 +358,184 @@ async def get_chat_sessions(
 async def delete_chat_session(
     session_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     删除聊天会话及其所有消息
     """
     try:
-        deleted_count = db.query(ChatMessage).filter(
+        # 删除前按角色统计，用于扣减计数器
+        role_counts = (await db.execute(select(
+            ChatMessage.role, func.count(ChatMessage.id)
+        ).where(
             ChatMessage.user_id == current_user.id,
             ChatMessage.session_id == session_id
-        ).delete()
+        ).group_by(ChatMessage.role))).all()
         
-        db.commit()
+        result = await db.execute(delete(ChatMessage).where(
+            ChatMessage.user_id == current_user.id,
+            ChatMessage.session_id == session_id
+        ))
+        deleted_count = result.rowcount
+        await chat_sessions.remove_session(db, current_user.id, session_id)
+        
+        if role_counts:
+            await counters.apply(db, counters.chat_changes(
+                current_user.id, {role: -count for role, count in role_counts}, sessions=-1
+            ))
+        await db.commit()
         
         return {
             "message": "Session deleted successfully",
             "deleted_messages": deleted_count
         }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete session: {str(e)}")
 
 @router.delete("/messages/{message_id}")
 async def delete_chat_message(
     message_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     删除单条聊天消息
     """
     try:
-        message = db.query(ChatMessage).filter(
+        message = await db.scalar(select(ChatMessage).where(
             ChatMessage.id == message_id,
             ChatMessage.user_id == current_user.id
-        ).first()
+        ))
         
         if not message:
             raise HTTPException(status_code=404, detail="Message not found")
         
-        db.delete(message)
-        db.commit()
+        await db.delete(message)
+        await db.flush()
+        # 会话的最后一条消息被删除时，会话数同步减一
+        session_emptied = await chat_sessions.remove_message(db, message)
+        await counters.apply(db, counters.chat_changes(
+            current_user.id, {message.role: -1}, sessions=-1 if session_emptied else 0
+        ))
+        await db.commit()
         
         return {"message": "Message deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete message: {str(e)}")
 
+def _export_record(row) -> dict:
+    return {
+        "id": row.id,
+        "session_id": row.session_id,
+        "role": row.role,
+        "content": row.content,
+        "message_metadata": row.message_metadata,
+        "created_at": row.created_at.isoformat()
+    }
+
+def _export_json(batch, first: bool) -> str:
+    # 与 json.dumps(list, indent=2) 的整体输出保持一致
+    items = [textwrap.indent(json.dumps(_export_record(row), ensure_ascii=False, indent=2), "  ") for row in batch]
+    return ("[\n" if first else ",\n") + ",\n".join(items)
+
+def _export_ndjson(batch, first: bool) -> str:
+    return "".join(json.dumps(_export_record(row), ensure_ascii=False) + "\n" for row in batch)
+
+def _export_txt(batch, first: bool) -> str:
+    lines = [
+        f"[{row.created_at.strftime('%Y-%m-%d %H:%M:%S')}] {row.role.upper()}: {row.content}\n"
+        for row in batch
+    ]
+    return ("" if first else "\n") + "\n".join(lines)
+
+# 导出格式: (序列化函数, media_type, 文件扩展名, 空结果时的输出, 结尾)
+EXPORT_FORMATS = {
+    "json": (_export_json, "application/json", "json", "[]", "\n]"),
+    "ndjson": (_export_ndjson, "application/x-ndjson", "ndjson", "", ""),
+    "txt": (_export_txt, "text/plain", "txt", "", "")
+}
+
+async def _stream_export(query, serialize, empty: str, closing: str):
+    """
+    按 (created_at, id) 键集分页，每页用一个短会话读取 EXPORT_BATCH_SIZE 条后立即关闭再输出，
+    客户端下载缓慢时不会一直占用连接池连接和读事务（SQLite 上长读事务会阻塞 WAL checkpoint）
+    响应体在依赖注入的会话关闭后才发送，因此这里单独打开会话
+    """
+    first = True
+    cursor = None
+    while True:
+        page = query
+        if cursor is not None:
+            page = page.where(keyset_condition(ChatMessage.created_at, ChatMessage.id, cursor, descending=False))
+        async with db_session() as db:
+            batch = (await db.execute(page.limit(EXPORT_BATCH_SIZE))).all()
+        if batch:
+            yield serialize(batch, first).encode("utf-8")
+            first = False
+        if len(batch) < EXPORT_BATCH_SIZE:
+            break
+        cursor = encode_cursor(batch[-1].created_at, batch[-1].id)
+    yield (empty if first else closing).encode("utf-8")
+
 @router.get("/export")
 async def export_chat_history(
     session_id: Optional[str] = Query(None, description="会话ID，不提供则导出所有"),
-    format: str = Query("json", description="导出格式: json, txt"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    format: str = Query("json", description="导出格式: json, ndjson, txt"),
+    current_user: User = Depends(get_current_user)
 ):
     """
-    导出聊天历史
+    导出聊天历史（流式响应）
     """
-    try:
-        query = db.query(ChatMessage).filter(ChatMessage.user_id == current_user.id)
-        
-        if session_id:
-            query = query.filter(ChatMessage.session_id == session_id)
-        
-        messages = query.order_by(ChatMessage.created_at.asc()).all()
-        
-        if format == "txt":
-            # 文本格式导出
-            lines = []
-            for msg in messages:
-                timestamp = msg.created_at.strftime("%Y-%m-%d %H:%M:%S")
-                lines.append(f"[{timestamp}] {msg.role.upper()}: {msg.content}\n")
-            
-            content = "\n".join(lines)
-            
-            from fastapi.responses import Response
-            return Response(
-                content=content,
-                media_type="text/plain",
-                headers={
-                    "Content-Disposition": f"attachment; filename=chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-                }
-            )
-        else:
-            # JSON格式导出
-            data = [
-                {
-                    "id": msg.id,
-                    "session_id": msg.session_id,
-                    "role": msg.role,
-                    "content": msg.content,
-                    "message_metadata": msg.message_metadata,
-                    "created_at": msg.created_at.isoformat()
-                }
-                for msg in messages
-            ]
-            
-            import json
-            from fastapi.responses import Response
-            return Response(
-                content=json.dumps(data, ensure_ascii=False, indent=2),
-                media_type="application/json",
-                headers={
-                    "Content-Disposition": f"attachment; filename=chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-                }
-            )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to export chat history: {str(e)}")
+    query = select(
+        ChatMessage.id,
+        ChatMessage.session_id,
+        ChatMessage.role,
+        ChatMessage.content,
+        ChatMessage.message_metadata,
+        ChatMessage.created_at
+    ).where(ChatMessage.user_id == current_user.id)
+    
+    if session_id:
+        query = query.where(ChatMessage.session_id == session_id)
+    
+    query = query.order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc())
+    
+    # 未知格式按 JSON 导出
+    serialize, media_type, extension, empty, closing = EXPORT_FORMATS.get(format, EXPORT_FORMATS["json"])
+    return StreamingResponse(
+        _stream_export(query, serialize, empty, closing),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+        }
+    )
 
 @router.get("/stats")
 async def get_chat_stats(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     获取聊天统计信息
     """
     try:
-        total_messages = db.query(func.count(ChatMessage.id)).filter(
-            ChatMessage.user_id == current_user.id
-        ).scalar()
-        
-        total_sessions = db.query(func.count(func.distinct(ChatMessage.session_id))).filter(
-            ChatMessage.user_id == current_user.id
-        ).scalar()
-        
-        user_messages = db.query(func.count(ChatMessage.id)).filter(
-            ChatMessage.user_id == current_user.id,
-            ChatMessage.role == "user"
-        ).scalar()
-        
-        assistant_messages = db.query(func.count(ChatMessage.id)).filter(
-            ChatMessage.user_id == current_user.id,
-            ChatMessage.role == "assistant"
-        ).scalar()
+        # 计数器在写消息时增量维护，这里只读取一次
+        values = await counters.read(db, current_user.id, [
+            counters.CHAT_MESSAGES,
+            counters.CHAT_SESSIONS,
+            counters.chat_messages_by_role("user"),
+            counters.chat_messages_by_role("assistant")
+        ])
         
         return {
-            "total_messages": total_messages or 0,
-            "total_sessions": total_sessions or 0,
-            "user_messages": user_messages or 0,
-            "assistant_messages": assistant_messages or 0
+            "total_messages": values[counters.CHAT_MESSAGES],
+            "total_sessions": values[counters.CHAT_SESSIONS],
+            "user_messages": values[counters.chat_messages_by_role("user")],
+            "assistant_messages": values[counters.chat_messages_by_role("assistant")]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get chat stats: {str(e)}")
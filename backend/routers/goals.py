@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
@@ -7,9 +8,14 @@ from datetime import datetime
 from database import get_db
 from models import Goal, User
 from routers.auth import get_current_user
+from etag import not_modified
+import counters
 
 router = APIRouter()
 
+# Collection name for the per-user version stamp behind the list ETag
+COLLECTION = "goals"
+
 class GoalCreate(BaseModel):
     title: str
     description: Optional[str] = None
@@ -38,20 +44,26 @@ class GoalResponse(BaseModel):
 
 @router.get("/", response_model=List[GoalResponse])
 async def get_goals(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    goals = db.query(Goal).filter(Goal.user_id == current_user.id).all()
+    cached = await not_modified(request, response, db, current_user.id, COLLECTION)
+    if cached is not None:
+        return cached
+    goals = (await db.scalars(select(Goal).where(Goal.user_id == current_user.id))).all()
     return goals
 
 @router.post("/", response_model=GoalResponse)
 async def create_goal(
     goal_data: GoalCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     new_goal = Goal(user_id=current_user.id, **goal_data.dict())
     db.add(new_goal)
-    db.commit()
-    db.refresh(new_goal)
+    await counters.apply(db, counters.version_changes(current_user.id, COLLECTION))
+    await db.commit()
+    await db.refresh(new_goal)
     return new_goal
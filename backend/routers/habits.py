@@ -1,14 +1,27 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import date, datetime, timedelta
+import os
 
 from database import get_db
 from models import Habit, User
 from routers.auth import get_current_user
+from etag import not_modified
+import counters
+import habit_streaks
+import rollups
 
 router = APIRouter()
 
+# Collection name for the per-user version stamp behind the list ETag
+COLLECTION = "habits"
+
+# Longest date range one heatmap request may cover
+HABIT_HEATMAP_MAX_DAYS = int(os.getenv("HABIT_HEATMAP_MAX_DAYS", "1100"))
+
 class HabitCreate(BaseModel):
     title: str
     description: Optional[str] = None
@@ -21,28 +34,133 @@ class HabitResponse(BaseModel):
     description: Optional[str]
     frequency: str
     target_days: Optional[List[int]]
+    # Current streak: 0 once the latest run ended before yesterday
     streak: int
     longest_streak: int
+    # The streak is still alive when this is today or yesterday
+    last_checkin_date: Optional[date] = None
 
     class Config:
         from_attributes = True
 
+class HabitCheckin(BaseModel):
+    # Defaults to today in the user's timezone
+    day: Optional[date] = None
+
+class HabitCheckinsResponse(BaseModel):
+    start: date
+    end: date
+    dates: List[date]
+
 @router.get("/", response_model=List[HabitResponse])
 async def get_habits(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    habits = db.query(Habit).filter(Habit.user_id == current_user.id).all()
-    return habits
+    today = _today(current_user)
+    # The current streak drops to 0 as days pass without a write, so the ETag also varies by day
+    cached = await not_modified(request, response, db, current_user.id, COLLECTION, variant=today.isoformat())
+    if cached is not None:
+        return cached
+    habits = (await db.scalars(select(Habit).where(Habit.user_id == current_user.id))).all()
+    return [_habit_response(habit, today) for habit in habits]
 
 @router.post("/", response_model=HabitResponse)
 async def create_habit(
     habit_data: HabitCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     new_habit = Habit(user_id=current_user.id, **habit_data.dict())
     db.add(new_habit)
-    db.commit()
-    db.refresh(new_habit)
+    await counters.apply(db, counters.version_changes(current_user.id, COLLECTION))
+    await db.commit()
+    await db.refresh(new_habit)
     return new_habit
+
+def _today(user: User) -> date:
+    return datetime.now(rollups.user_zone(user.timezone)).date()
+
+def _habit_response(habit: Habit, today: date) -> HabitResponse:
+    # Habit.streak is the length of the latest run; it only counts while that run reaches yesterday or today
+    result = HabitResponse.model_validate(habit)
+    if habit.last_checkin_date is None or habit.last_checkin_date < today - timedelta(days=1):
+        result.streak = 0
+    return result
+
+async def _get_habit(db: AsyncSession, habit_id: str, user_id: str) -> Habit:
+    # Row lock (MySQL) so concurrent check-ins on one habit merge runs one at a time
+    habit = await db.scalar(select(Habit).where(
+        Habit.id == habit_id,
+        Habit.user_id == user_id
+    ).with_for_update())
+    if not habit:
+        raise HTTPException(status_code=404, detail="Habit not found")
+    return habit
+
+async def _save_checkin_change(db: AsyncSession, habit: Habit, user_id: str) -> Habit:
+    habit.updated_at = datetime.utcnow()
+    await counters.apply(db, counters.version_changes(user_id, COLLECTION))
+    await db.commit()
+    await db.refresh(habit)
+    return habit
+
+@router.post("/{habit_id}/checkins", response_model=HabitResponse)
+async def check_in_habit(
+    habit_id: str,
+    checkin: HabitCheckin,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    打卡，重复打卡同一天不报错，不能为将来的日期打卡；只读写相邻的打卡区间，streak 增量更新
+    """
+    today = _today(current_user)
+    day = checkin.day or today
+    if day > today:
+        raise HTTPException(status_code=400, detail="Cannot check in for a future date")
+    habit = await _get_habit(db, habit_id, current_user.id)
+    if await habit_streaks.check_in(db, habit, day):
+        habit = await _save_checkin_change(db, habit, current_user.id)
+    return _habit_response(habit, today)
+
+@router.delete("/{habit_id}/checkins/{day}", response_model=HabitResponse)
+async def uncheck_habit(
+    habit_id: str,
+    day: date,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    habit = await _get_habit(db, habit_id, current_user.id)
+    if await habit_streaks.uncheck(db, habit, day):
+        habit = await _save_checkin_change(db, habit, current_user.id)
+    return _habit_response(habit, _today(current_user))
+
+@router.get("/{habit_id}/checkins", response_model=HabitCheckinsResponse)
+async def get_habit_checkins(
+    habit_id: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    热力图数据：[start, end] 内已打卡的日期，默认为截至今天的最近一年
+    """
+    habit = await db.scalar(select(Habit.id).where(
+        Habit.id == habit_id,
+        Habit.user_id == current_user.id
+    ))
+    if not habit:
+        raise HTTPException(status_code=404, detail="Habit not found")
+    
+    end = end or _today(current_user)
+    start = start or end - timedelta(days=364)
+    if start > end:
+        raise HTTPException(status_code=422, detail="start must not be after end")
+    if (end - start).days >= HABIT_HEATMAP_MAX_DAYS:
+        raise HTTPException(status_code=422, detail=f"At most {HABIT_HEATMAP_MAX_DAYS} days per request")
+    
+    return {"start": start, "end": end, "dates": await habit_streaks.checked_days(db, habit_id, start, end)}
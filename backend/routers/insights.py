@@ -1,15 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete, and_, or_
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 
 from database import get_db
-from models import Insight, User
+from models import Insight, Task, User, generate_uuid
 from routers.auth import get_current_user
+from pagination import keyset_condition, set_next_cursor
+from etag import not_modified
+import counters
+import tombstones
+import insight_engine
+import rollups
+from routers.tasks import BULK_MAX_IDS
 
 router = APIRouter()
 
+# Collection name for the per-user version stamp behind the list ETag
+COLLECTION = "insights"
+# Insight.source of rows written by the insight engine
+ENGINE_SOURCE = "engine"
+
 class InsightCreate(BaseModel):
     type: str
     title: str
@@ -33,30 +47,62 @@ class InsightResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class InsightFilter(BaseModel):
+    type: Optional[str] = None
+    priority: Optional[str] = None
+    is_read: Optional[bool] = None
+    is_favorite: Optional[bool] = None
+    created_before: Optional[datetime] = None
+
+class InsightBulkSelect(BaseModel):
+    # Rows to touch: the given IDs, the filter, or both (AND); at least one is required
+    ids: Optional[List[str]] = None
+    filter: Optional[InsightFilter] = None
+
+class InsightBulkChanges(BaseModel):
+    is_read: Optional[bool] = None
+    is_favorite: Optional[bool] = None
+
+class InsightBulkUpdate(InsightBulkSelect):
+    changes: InsightBulkChanges
+
 @router.get("/", response_model=List[InsightResponse])
 async def get_insights(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     is_read: Optional[bool] = None,
     is_favorite: Optional[bool] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(Insight).filter(Insight.user_id == current_user.id)
+    cached = await not_modified(request, response, db, current_user.id, COLLECTION)
+    if cached is not None:
+        return cached
+    
+    query = select(Insight).where(Insight.user_id == current_user.id)
     
     if is_read is not None:
-        query = query.filter(Insight.is_read == is_read)
+        query = query.where(Insight.is_read == is_read)
     if is_favorite is not None:
-        query = query.filter(Insight.is_favorite == is_favorite)
+        query = query.where(Insight.is_favorite == is_favorite)
     
-    insights = query.order_by(Insight.created_at.desc()).offset(skip).limit(limit).all()
+    if cursor:
+        query = query.where(keyset_condition(Insight.created_at, Insight.id, cursor, descending=True))
+    else:
+        query = query.offset(skip)
+    
+    insights = (await db.scalars(query.order_by(Insight.created_at.desc(), Insight.id.desc()).limit(limit))).all()
+    set_next_cursor(response, insights, limit, "created_at")
     return insights
 
 @router.post("/", response_model=InsightResponse)
 async def create_insight(
     insight_data: InsightCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     new_insight = Insight(
         user_id=current_user.id,
@@ -64,8 +110,12 @@ async def create_insight(
     )
     
     db.add(new_insight)
-    db.commit()
-    db.refresh(new_insight)
+    await counters.apply(db, counters.merge(
+        counters.insight_changes(current_user.id),
+        counters.version_changes(current_user.id, COLLECTION)
+    ))
+    await db.commit()
+    await db.refresh(new_insight)
     
     return new_insight
 
@@ -73,18 +123,19 @@ async def create_insight(
 async def mark_insight_read(
     insight_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    insight = db.query(Insight).filter(
+    insight = await db.scalar(select(Insight).where(
         Insight.id == insight_id,
         Insight.user_id == current_user.id
-    ).first()
+    ))
     
     if not insight:
         raise HTTPException(status_code=404, detail="Insight not found")
     
     insight.is_read = True
-    db.commit()
+    await counters.apply(db, counters.version_changes(current_user.id, COLLECTION))
+    await db.commit()
     
     return {"message": "Insight marked as read"}
 
@@ -92,17 +143,158 @@ async def mark_insight_read(
 async def toggle_insight_favorite(
     insight_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    insight = db.query(Insight).filter(
+    insight = await db.scalar(select(Insight).where(
         Insight.id == insight_id,
         Insight.user_id == current_user.id
-    ).first()
+    ))
     
     if not insight:
         raise HTTPException(status_code=404, detail="Insight not found")
     
     insight.is_favorite = not insight.is_favorite
-    db.commit()
+    await counters.apply(db, counters.version_changes(current_user.id, COLLECTION))
+    await db.commit()
     
     return {"message": "Insight favorite toggled", "is_favorite": insight.is_favorite}
+
+def _bulk_condition(user_id: str, selection: InsightBulkSelect):
+    """
+    把 ids / filter 转为 WHERE 条件，始终限定在当前用户名下
+    """
+    conditions = [Insight.user_id == user_id]
+    if selection.ids is not None:
+        if len(selection.ids) > BULK_MAX_IDS:
+            raise HTTPException(status_code=422, detail=f"At most {BULK_MAX_IDS} ids per request")
+        conditions.append(Insight.id.in_(selection.ids))
+    criteria = selection.filter.dict(exclude_none=True) if selection.filter else {}
+    if selection.ids is None and not criteria:
+        raise HTTPException(status_code=422, detail="Provide ids or at least one filter field")
+    for field in ("type", "priority", "is_read", "is_favorite"):
+        if field in criteria:
+            conditions.append(getattr(Insight, field) == criteria[field])
+    if "created_before" in criteria:
+        conditions.append(Insight.created_at < criteria["created_before"])
+    return and_(*conditions)
+
+async def _bulk_execute(db: AsyncSession, statement) -> int:
+    result = await db.execute(statement.execution_options(synchronize_session=False))
+    return result.rowcount
+
+@router.put("/read-all")
+async def mark_all_insights_read(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    一条 UPDATE 把当前用户的所有未读洞察标记为已读
+    """
+    updated = await _bulk_execute(db, update(Insight).where(
+        Insight.user_id == current_user.id,
+        Insight.is_read == False
+    ).values(is_read=True))
+    if updated:
+        await counters.apply(db, counters.version_changes(current_user.id, COLLECTION))
+    await db.commit()
+    
+    return {"message": "All insights marked as read", "updated": updated}
+
+@router.post("/bulk/update")
+async def bulk_update_insights(
+    request_data: InsightBulkUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    values = request_data.changes.dict(exclude_none=True)
+    if not values:
+        raise HTTPException(status_code=422, detail="No changes given")
+    
+    updated = await _bulk_execute(db, update(Insight).where(
+        _bulk_condition(current_user.id, request_data)
+    ).values(**values))
+    if updated:
+        await counters.apply(db, counters.version_changes(current_user.id, COLLECTION))
+    await db.commit()
+    
+    return {"message": "Insights updated", "updated": updated}
+
+@router.post("/bulk/delete")
+async def bulk_delete_insights(
+    request_data: InsightBulkSelect,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    condition = _bulk_condition(current_user.id, request_data)
+    await tombstones.record_matching(db, COLLECTION, Insight, condition)
+    deleted = await _bulk_execute(db, delete(Insight).where(condition))
+    if deleted:
+        await counters.apply(db, counters.merge(
+            counters.insight_changes(current_user.id, -deleted),
+            counters.version_changes(current_user.id, COLLECTION)
+        ))
+    await db.commit()
+    
+    return {"message": "Insights deleted", "deleted": deleted}
+
+async def load_task_columns(db: AsyncSession, user_id: str, days: int) -> list:
+    """
+    洞察引擎的输入：窗口内任务的 (start_time, end_time, duration, category, title, description)，按索引范围读取
+    """
+    since = insight_engine.window_start(days)
+    return (await db.execute(select(
+        Task.start_time, Task.end_time, Task.duration, Task.category, Task.title, Task.description
+    ).where(
+        Task.user_id == user_id,
+        or_(Task.start_time >= since, and_(Task.start_time.is_(None), Task.created_at >= since))
+    ))).all()
+
+async def save_generated_insights(db: AsyncSession, user_id: str, generated: List[dict]) -> List[dict]:
+    """
+    用新生成的洞察替换该用户上一次生成的（已收藏的保留），返回写入的行；由调用方负责 commit
+    """
+    stale = and_(
+        Insight.user_id == user_id,
+        Insight.source == ENGINE_SOURCE,
+        Insight.is_favorite == False
+    )
+    await tombstones.record_matching(db, COLLECTION, Insight, stale)
+    replaced = await _bulk_execute(db, delete(Insight).where(stale))
+    
+    now = datetime.utcnow()
+    new_rows = [
+        dict(item, id=generate_uuid(), user_id=user_id, source=ENGINE_SOURCE,
+             is_read=False, is_favorite=False, created_at=now, updated_at=now)
+        for item in generated
+    ]
+    if new_rows:
+        await db.execute(insert(Insight), new_rows)
+    if new_rows or replaced:
+        await counters.apply(db, counters.merge(
+            counters.insight_changes(user_id, len(new_rows) - replaced),
+            counters.version_changes(user_id, COLLECTION)
+        ))
+    return new_rows
+
+@router.post("/generate", response_model=List[InsightResponse])
+async def generate_insights(
+    days: int = insight_engine.INSIGHT_WINDOW_DAYS,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    分析最近 days 天的任务并生成洞察，替换上一次生成的洞察（已收藏的保留）
+    只按索引读取窗口内任务的几列，计算在线程池中用 NumPy 完成，历史任务再多也不影响耗时
+    夜间任务（jobs.py）会为任务有变化的用户自动执行同样的生成
+    """
+    if not 1 <= days <= insight_engine.INSIGHT_MAX_WINDOW_DAYS:
+        raise HTTPException(status_code=422, detail=f"days must be between 1 and {insight_engine.INSIGHT_MAX_WINDOW_DAYS}")
+    
+    rows = await load_task_columns(db, current_user.id, days)
+    generated = await run_in_threadpool(
+        insight_engine.analyze, rows, rollups.user_zone(current_user.timezone), days, current_user.occupation
+    )
+    new_rows = await save_generated_insights(db, current_user.id, generated)
+    await db.commit()
+    
+    return new_rows
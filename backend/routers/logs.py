@@ -1,13 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
+from starlette.concurrency import run_in_threadpool
 import os
-import json
 
-from database import get_db
-from logger import logger, LOG_DIR
+from logger import logger, LOG_DIR, get_logging_stats
+from log_index import log_index, datetime_key
 
 router = APIRouter()
 
@@ -70,71 +69,23 @@ async def get_logs(
     查询日志
     """
     try:
-        # 读取日志文件
-        log_file = os.path.join(LOG_DIR, "ai_time_management.log")
-        
-        if not os.path.exists(log_file):
-            return LogQueryResponse(
-                total=0,
-                logs=[],
-                page=page,
-                page_size=page_size
-            )
-        
-        # 读取并解析日志
-        logs = []
-        with open(log_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    # 尝试解析JSON格式
-                    log_entry = json.loads(line)
-                    logs.append(LogEntry(**log_entry))
-                except json.JSONDecodeError:
-                    # 解析文本格式
-                    parts = line.strip().split(' - ', 3)
-                    if len(parts) >= 4:
-                        logs.append(LogEntry(
-                            timestamp=parts[0],
-                            logger=parts[1],
-                            level=parts[2],
-                            message=parts[3]
-                        ))
-        
-        # 过滤日志
-        filtered_logs = logs
-        
-        if level:
-            filtered_logs = [log for log in filtered_logs if log.level == level.upper()]
-        
-        if start_date:
-            start_dt = datetime.fromisoformat(start_date)
-            filtered_logs = [
-                log for log in filtered_logs
-                if datetime.fromisoformat(log.timestamp.split(',')[0]) >= start_dt
-            ]
-        
-        if end_date:
-            end_dt = datetime.fromisoformat(end_date)
-            filtered_logs = [
-                log for log in filtered_logs
-                if datetime.fromisoformat(log.timestamp.split(',')[0]) <= end_dt
-            ]
-        
-        if search:
-            filtered_logs = [
-                log for log in filtered_logs
-                if search.lower() in log.message.lower()
-            ]
-        
-        # 分页
-        total = len(filtered_logs)
-        start_idx = (page - 1) * page_size
-        end_idx = start_idx + page_size
-        paginated_logs = filtered_logs[start_idx:end_idx]
+        start_key = datetime_key(datetime.fromisoformat(start_date)) if start_date else None
+        end_key = datetime_key(datetime.fromisoformat(end_date)) if end_date else None
+        
+        # 索引按级别、时间范围定位，只读取当前页（或关键词匹配所需）的日志行
+        total, entries = await run_in_threadpool(
+            log_index.query,
+            level=level.upper() if level else None,
+            start=start_key,
+            end=end_key,
+            search=search,
+            skip=(page - 1) * page_size,
+            limit=page_size
+        )
         
         return LogQueryResponse(
             total=total,
-            logs=paginated_logs,
+            logs=[LogEntry(**entry) for entry in entries],
             page=page,
             page_size=page_size
         )
@@ -157,7 +108,8 @@ async def get_log_stats():
             "error_logs": 0,
             "log_file_size": 0,
             "error_log_file_size": 0,
-            "last_updated": None
+            "last_updated": None,
+            "pipelines": get_logging_stats()
         }
         
         if os.path.exists(log_file):
@@ -0,0 +1,104 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime, timedelta
+import base64
+import os
+
+from database import get_db
+from models import Task, Insight, Goal, Habit, SyncTombstone, User
+from routers.auth import get_current_user
+from routers.tasks import TaskResponse
+from routers.insights import InsightResponse
+from routers.goals import GoalResponse
+from routers.habits import HabitResponse
+from tombstones import retention_horizon
+
+router = APIRouter()
+
+# 令牌时间之前这么多秒内的修改会再次下发，覆盖写入时间早于提交时间的事务；客户端按 ID 覆盖，重复无害
+SYNC_OVERLAP_SECONDS = float(os.getenv("SYNC_OVERLAP_SECONDS", "5"))
+
+class TaskChanges(BaseModel):
+    upserts: List[TaskResponse]
+    deleted: List[str]
+
+class InsightChanges(BaseModel):
+    upserts: List[InsightResponse]
+    deleted: List[str]
+
+class GoalChanges(BaseModel):
+    upserts: List[GoalResponse]
+    deleted: List[str]
+
+class HabitChanges(BaseModel):
+    upserts: List[HabitResponse]
+    deleted: List[str]
+
+class SyncResponse(BaseModel):
+    # 下次请求时作为 since 传回
+    token: str
+    # true 表示没有 since 或 since 已超出墓碑保留期：upserts 为全部数据，客户端应替换本地集合
+    full: bool
+    tasks: TaskChanges
+    insights: InsightChanges
+    goals: GoalChanges
+    habits: HabitChanges
+
+# 集合名 -> 模型
+COLLECTIONS = {
+    "tasks": Task,
+    "insights": Insight,
+    "goals": Goal,
+    "habits": Habit,
+}
+
+def encode_token(moment: datetime) -> str:
+    return base64.urlsafe_b64encode(moment.isoformat().encode()).decode().rstrip("=")
+
+def decode_token(token: str) -> datetime:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return datetime.fromisoformat(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+@router.get("", response_model=SyncResponse, include_in_schema=False)
+@router.get("/", response_model=SyncResponse)
+async def sync_changes(
+    since: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    返回 since 之后 tasks / insights / goals / habits 的新增修改（upserts）和删除（deleted）
+    按 (user_id, updated_at) 和墓碑表的 (user_id, deleted_at) 索引查询，开销与变化量成正比
+    """
+    # 令牌取查询开始前的时间，查询期间提交的修改留给下一次同步
+    now = datetime.utcnow()
+    changed_after = decode_token(since) if since else None
+    full = changed_after is None or changed_after < retention_horizon(now)
+    if not full:
+        changed_after -= timedelta(seconds=SYNC_OVERLAP_SECONDS)
+
+    deleted = {name: [] for name in COLLECTIONS}
+    if not full:
+        tombstones = await db.execute(select(SyncTombstone.collection, SyncTombstone.entity_id).where(
+            SyncTombstone.user_id == current_user.id,
+            SyncTombstone.deleted_at > changed_after
+        ))
+        for collection, entity_id in tombstones:
+            if collection in deleted:
+                deleted[collection].append(entity_id)
+
+    changes = {}
+    for name, model in COLLECTIONS.items():
+        query = select(model).where(model.user_id == current_user.id)
+        if not full:
+            query = query.where(model.updated_at > changed_after)
+        rows = (await db.scalars(query.order_by(model.updated_at, model.id))).all()
+        changes[name] = {"upserts": rows, "deleted": deleted[name]}
+
+    return {"token": encode_token(now), "full": full, **changes}
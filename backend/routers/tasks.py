@@ -1,15 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime
-
-from database import get_db
-from models import Task, User
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete, and_, or_, func, case, bindparam, literal_column, DateTime
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from datetime import datetime, time, timedelta, timezone
+import codecs
+import heapq
+import json
+import os
+
+from database import DATABASE_TYPE, get_db
+from models import Task, User, generate_uuid
 from routers.auth import get_current_user
+from pagination import keyset_condition, set_next_cursor
+from etag import not_modified
+import auto_scheduler
+import counters
+import rollups
+import tombstones
 
 router = APIRouter()
 
+# Collection name for the per-user version stamp behind the list ETag
+COLLECTION = "tasks"
+
+# Bulk import: rows validated and inserted per chunk, upper bound per request
+TASK_IMPORT_CHUNK_SIZE = int(os.getenv("TASK_IMPORT_CHUNK_SIZE", "500"))
+TASK_IMPORT_MAX_ROWS = int(os.getenv("TASK_IMPORT_MAX_ROWS", "50000"))
+# A single JSON row may not exceed this many characters while waiting for the rest of it
+TASK_IMPORT_MAX_ROW_CHARS = int(os.getenv("TASK_IMPORT_MAX_ROW_CHARS", "65536"))
+# Upper bound on explicit IDs in one bulk update/delete
+BULK_MAX_IDS = int(os.getenv("BULK_MAX_IDS", "5000"))
+# Upper bound on overlapping pairs returned by one conflicts request
+TASK_CONFLICTS_MAX_PAIRS = int(os.getenv("TASK_CONFLICTS_MAX_PAIRS", "1000"))
+
 # Pydantic models
 class TaskCreate(BaseModel):
     title: str
@@ -49,34 +74,181 @@ class TaskResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class TaskImportError(BaseModel):
+    index: int
+    errors: List[Dict[str, Any]]
+
+class TaskImportResponse(BaseModel):
+    created: int
+    failed: int
+    # Aligned with the input rows: the new task ID, or null where the row failed
+    ids: List[Optional[str]]
+    errors: List[TaskImportError]
+
+class TaskFilter(BaseModel):
+    status: Optional[str] = None
+    priority: Optional[str] = None
+    category: Optional[str] = None
+    start_after: Optional[datetime] = None
+    start_before: Optional[datetime] = None
+
+class TaskBulkSelect(BaseModel):
+    # Rows to touch: the given IDs, the filter, or both (AND); at least one is required
+    ids: Optional[List[str]] = None
+    filter: Optional[TaskFilter] = None
+
+class TaskBulkChanges(BaseModel):
+    status: Optional[str] = None
+    priority: Optional[str] = None
+    category: Optional[str] = None
+
+class TaskBulkUpdate(TaskBulkSelect):
+    changes: TaskBulkChanges
+
+class TaskConflict(BaseModel):
+    # Two overlapping tasks, the earlier-starting one first
+    task_ids: List[str]
+    overlap_start: datetime
+    overlap_end: datetime
+    overlap_minutes: int
+
+class TaskConflictsResponse(BaseModel):
+    conflicts: List[TaskConflict]
+    # The tasks referenced by conflicts
+    tasks: List[TaskResponse]
+    # True when more than `limit` pairs overlap
+    truncated: bool
+
+class WorkingHours(BaseModel):
+    # Local times in the user's timezone; weekdays: 0 = Monday
+    start: time = time(9, 0)
+    end: time = time(18, 0)
+    weekdays: List[int] = [0, 1, 2, 3, 4]
+
+class TaskScheduleRequest(BaseModel):
+    # Tasks to place; defaults to all pending / in-progress tasks without a start_time
+    task_ids: Optional[List[str]] = None
+    # Planning horizon (UTC), defaults to now
+    start: Optional[datetime] = None
+    days: int = 7
+    working_hours: WorkingHours = WorkingHours()
+    # Free minutes kept after every task and around existing tasks
+    gap_minutes: int = 0
+    mode: str = auto_scheduler.GREEDY  # greedy, search
+    # Time budget for mode=search
+    time_budget_ms: int = 200
+
+class TaskScheduleChange(BaseModel):
+    id: str
+    start_time: datetime
+    end_time: datetime
+
+class TaskScheduleSkip(BaseModel):
+    id: str
+    reason: str  # already_scheduled, not_pending (completed / cancelled), not_found, no_free_slot
+
+class TaskScheduleResponse(BaseModel):
+    mode: str
+    # Apply with POST /api/tasks/schedule/apply
+    changes: List[TaskScheduleChange]
+    unscheduled: List[TaskScheduleSkip]
+    # True when more than SCHEDULE_MAX_TASKS tasks were waiting; the rest were not considered
+    truncated: bool
+    scheduled_minutes: int
+    elapsed_ms: int
+
+class TaskScheduleApply(BaseModel):
+    changes: List[TaskScheduleChange]
+
+def _task_end():
+    """
+    任务的结束时间：end_time，否则 start_time + duration；两者都没有时等于 start_time
+    """
+    if DATABASE_TYPE.lower() == "mysql":
+        shifted = func.timestampadd(literal_column("MINUTE"), Task.duration, Task.start_time)
+    else:
+        shifted = func.datetime(Task.start_time, func.printf("+%d minutes", Task.duration))
+    return func.coalesce(Task.end_time, shifted, Task.start_time, type_=DateTime)
+
+def _task_end_value(start_time: datetime, end_time: Optional[datetime], duration: Optional[int]) -> datetime:
+    if end_time is not None:
+        return end_time
+    return start_time + timedelta(minutes=duration or 0)
+
+async def _window_conditions(db: AsyncSession, user_id: str, start: Optional[datetime], end: Optional[datetime]) -> list:
+    """
+    与时间窗口 [start, end) 相交的任务：start_time < end 且结束时间 > start（start 时刻的零时长任务也算）
+    任务最长跨度为 span 时，相交的任务一定满足 start_time >= start - span，
+    因此查询是 (user_id, start_time, end_time) 索引上的有界范围扫描，结束时间只在这段范围内逐行判断
+    """
+    if start and end and start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    conditions = [Task.start_time.is_not(None)]
+    if end:
+        conditions.append(Task.start_time < end)
+    if start:
+        span = (await counters.read(db, user_id, [counters.TASK_MAX_SPAN]))[counters.TASK_MAX_SPAN]
+        conditions.append(Task.start_time >= start - timedelta(minutes=span))
+        conditions.append(or_(Task.start_time >= start, _task_end() > start))
+    return conditions
+
+async def _raise_max_span(db: AsyncSession, user_id: str, rows) -> None:
+    span = max((counters.task_span_minutes(
+        rollups.task_field(row, "start_time"), rollups.task_field(row, "end_time"), rollups.task_field(row, "duration")
+    ) for row in rows), default=0)
+    if span:
+        await counters.raise_to(db, user_id, counters.TASK_MAX_SPAN, span)
+
 # Routes
 @router.get("/", response_model=List[TaskResponse])
 async def get_tasks(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
     priority: Optional[str] = None,
     category: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(Task).filter(Task.user_id == current_user.id)
+    """
+    start / end（UTC）给出时只返回与该时间窗口相交的任务（日历视图），没有 start_time 的任务不在任何窗口内
+    """
+    # Unchanged since the client's copy: answer 304 before touching the rows
+    cached = await not_modified(request, response, db, current_user.id, COLLECTION)
+    if cached is not None:
+        return cached
+    
+    query = select(Task).where(Task.user_id == current_user.id)
+    if start or end:
+        query = query.where(*await _window_conditions(db, current_user.id, start, end))
     
     if status:
-        query = query.filter(Task.status == status)
+        query = query.where(Task.status == status)
     if priority:
-        query = query.filter(Task.priority == priority)
+        query = query.where(Task.priority == priority)
     if category:
-        query = query.filter(Task.category == category)
+        query = query.where(Task.category == category)
+    
+    # Keyset seek on (start_time, id) when a cursor is given; skip/limit kept for compatibility
+    if cursor:
+        query = query.where(keyset_condition(Task.start_time, Task.id, cursor, descending=True))
+    else:
+        query = query.offset(skip)
     
-    tasks = query.order_by(Task.start_time.desc()).offset(skip).limit(limit).all()
+    tasks = (await db.scalars(query.order_by(Task.start_time.desc(), Task.id.desc()).limit(limit))).all()
+    set_next_cursor(response, tasks, limit, "start_time")
     return tasks
 
 @router.post("/", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
 async def create_task(
     task_data: TaskCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     new_task = Task(
         user_id=current_user.id,
@@ -88,25 +260,85 @@ async def create_task(
         priority=task_data.priority,
         category=task_data.category,
         tags=task_data.tags,
-        status="pending"
+        status="pending",
+        created_at=datetime.utcnow()
     )
     
     db.add(new_task)
-    db.commit()
-    db.refresh(new_task)
+    await rollups.apply(db, current_user.id, rollups.task_changes([new_task], rollups.user_zone(current_user.timezone)))
+    await _raise_max_span(db, current_user.id, [new_task])
+    await counters.apply(db, counters.merge(
+        counters.task_changes(current_user.id, tasks=1),
+        counters.version_changes(current_user.id, COLLECTION)
+    ))
+    await counters.mark_active(db, current_user.id)
+    await db.commit()
+    await db.refresh(new_task)
     
     return new_task
 
+@router.get("/conflicts", response_model=TaskConflictsResponse)
+async def get_task_conflicts(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 200,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    时间窗口内（不传则为全部任务）时间重叠的任务对，已取消的任务除外
+    按 start_time 顺序扫描一遍（sweep line），每个任务只与尚未结束的任务比较，
+    开销为 O(n log n + 冲突数) 而不是两两比较的 O(n²)
+    """
+    if not 1 <= limit <= TASK_CONFLICTS_MAX_PAIRS:
+        raise HTTPException(status_code=422, detail=f"limit must be between 1 and {TASK_CONFLICTS_MAX_PAIRS}")
+    
+    rows = await db.execute(select(Task.id, Task.start_time, Task.end_time, Task.duration).where(
+        Task.user_id == current_user.id,
+        or_(Task.status.is_(None), Task.status != "cancelled"),
+        *await _window_conditions(db, current_user.id, start, end)
+    ).order_by(Task.start_time, Task.id))
+    
+    # 尚未结束的任务，按结束时间组成最小堆
+    active: List[Tuple[datetime, str]] = []
+    conflicts: List[TaskConflict] = []
+    truncated = False
+    for task_id, task_start, task_end, duration in rows:
+        task_end = _task_end_value(task_start, task_end, duration)
+        while active and active[0][0] <= task_start:
+            heapq.heappop(active)
+        if task_end <= task_start:
+            # 零时长任务不占用时间
+            continue
+        for other_end, other_id in sorted(active):
+            if len(conflicts) == limit:
+                truncated = True
+                break
+            overlap_end = min(task_end, other_end)
+            conflicts.append(TaskConflict(
+                task_ids=[other_id, task_id],
+                overlap_start=task_start,
+                overlap_end=overlap_end,
+                overlap_minutes=int((overlap_end - task_start).total_seconds() // 60)
+            ))
+        if truncated:
+            break
+        heapq.heappush(active, (task_end, task_id))
+    
+    ids = {task_id for conflict in conflicts for task_id in conflict.task_ids}
+    tasks = (await db.scalars(select(Task).where(Task.id.in_(ids)).order_by(Task.start_time, Task.id))).all() if ids else []
+    return TaskConflictsResponse(conflicts=conflicts, tasks=tasks, truncated=truncated)
+
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task(
     task_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    task = db.query(Task).filter(
+    task = await db.scalar(select(Task).where(
         Task.id == task_id,
         Task.user_id == current_user.id
-    ).first()
+    ))
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -118,16 +350,20 @@ async def update_task(
     task_id: str,
     task_data: TaskUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    task = db.query(Task).filter(
+    task = await db.scalar(select(Task).where(
         Task.id == task_id,
         Task.user_id == current_user.id
-    ).first()
+    ))
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    was_completed = task.status == "completed"
+    zone = rollups.user_zone(current_user.timezone)
+    previous = rollups.task_changes([task], zone, sign=-1)
+    
     # Update fields
     update_data = task_data.dict(exclude_unset=True)
     for field, value in update_data.items():
@@ -137,8 +373,15 @@ async def update_task(
         task.completed_at = datetime.utcnow()
     
     task.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(task)
+    is_completed = task.status == "completed"
+    changes = counters.version_changes(current_user.id, COLLECTION)
+    if is_completed != was_completed:
+        changes = counters.merge(changes, counters.task_changes(current_user.id, completed=1 if is_completed else -1))
+    await counters.apply(db, changes)
+    await rollups.apply(db, current_user.id, rollups.merge(previous, rollups.task_changes([task], zone)))
+    await _raise_max_span(db, current_user.id, [task])
+    await db.commit()
+    await db.refresh(task)
     
     return task
 
@@ -146,47 +389,484 @@ async def update_task(
 async def delete_task(
     task_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    task = db.query(Task).filter(
+    task = await db.scalar(select(Task).where(
         Task.id == task_id,
         Task.user_id == current_user.id
-    ).first()
+    ))
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    db.delete(task)
-    db.commit()
+    await db.delete(task)
+    await tombstones.record(db, current_user.id, COLLECTION, [task.id])
+    await rollups.apply(db, current_user.id, rollups.task_changes([task], rollups.user_zone(current_user.timezone), sign=-1))
+    await counters.apply(db, counters.merge(
+        counters.task_changes(current_user.id, tasks=-1, completed=-1 if task.status == "completed" else 0),
+        counters.version_changes(current_user.id, COLLECTION)
+    ))
+    await db.commit()
     
     return None
 
+def _task_row(user_id: str, task_data: TaskCreate, now: datetime) -> Dict[str, Any]:
+    """
+    新任务的完整列值；ID 和时间戳在应用端生成，插入后无需再查询
+    """
+    return {
+        "id": generate_uuid(),
+        "user_id": user_id,
+        "title": task_data.title,
+        "description": task_data.description,
+        "start_time": task_data.start_time,
+        "end_time": task_data.end_time,
+        "duration": task_data.duration,
+        "priority": task_data.priority,
+        "status": "pending",
+        "category": task_data.category,
+        "tags": task_data.tags,
+        "created_at": now,
+        "updated_at": now,
+        "completed_at": None
+    }
+
+async def _insert_tasks(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    # 单条 INSERT 语句 + executemany（SQLAlchemy 会合并为多值 INSERT），不经过 ORM 对象和标识映射
+    if rows:
+        await db.execute(insert(Task), rows)
+
 @router.post("/batch", response_model=List[TaskResponse])
 async def create_tasks_batch(
     tasks_data: List[TaskCreate],
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
+):
+    now = datetime.utcnow()
+    rows = [_task_row(current_user.id, task_data, now) for task_data in tasks_data]
+    
+    await _insert_tasks(db, rows)
+    if rows:
+        await rollups.apply(db, current_user.id, rollups.task_changes(rows, rollups.user_zone(current_user.timezone)))
+        await _raise_max_span(db, current_user.id, rows)
+        await counters.apply(db, counters.merge(
+            counters.task_changes(current_user.id, tasks=len(rows)),
+            counters.version_changes(current_user.id, COLLECTION)
+        ))
+        await counters.mark_active(db, current_user.id)
+    await db.commit()
+    
+    return rows
+
+class _ImportFormatError(Exception):
+    pass
+
+async def _ndjson_items(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[Any, Optional[str]]]:
+    """
+    逐行解析 NDJSON，产出 (对象, 错误)；某一行无法解析只影响该行
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_line(line)
+        if len(buffer) > TASK_IMPORT_MAX_ROW_CHARS:
+            raise _ImportFormatError("NDJSON line too long")
+    if buffer.strip():
+        yield _parse_line(buffer)
+
+def _parse_line(line: bytes) -> Tuple[Any, Optional[str]]:
+    try:
+        return json.loads(line), None
+    except ValueError as e:
+        return None, f"Invalid JSON: {str(e)}"
+
+async def _json_array_items(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[Any, Optional[str]]]:
+    """
+    增量解析 JSON 数组，每解析出一个元素就产出，不需要把整个请求体读入内存
+    元素之间必须恰好有一个逗号；元素之后已收到其他字符时才解码，数字不会在块边界处被截断
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    # 已丢弃的字符数，用于在错误信息中给出整个请求体内的位置
+    offset = 0
+    # 下一个期望的记号："[" 数组开头，"first" 首个元素或 "]"，"value" 逗号后的元素，"," 逗号或 "]"，"end" 数组已结束
+    expect = "["
+    async for chunk in chunks:
+        offset += pos
+        buffer = buffer[pos:] + text.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if expect == "end":
+                raise _ImportFormatError(f"Unexpected data after the JSON array at character {offset + pos}")
+            if expect == "[":
+                if char != "[":
+                    raise _ImportFormatError("JSON body must be an array of tasks")
+                expect = "first"
+                pos += 1
+                continue
+            if expect == ",":
+                if char not in ",]":
+                    raise _ImportFormatError(f"Expected ',' or ']' at character {offset + pos}")
+                expect = "value" if char == "," else "end"
+                pos += 1
+                continue
+            if char == "]" and expect == "first":
+                expect = "end"
+                pos += 1
+                continue
+            if char in ",]":
+                raise _ImportFormatError(f"Unexpected '{char}' at character {offset + pos}")
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                end = None
+            if end is None or end == len(buffer):
+                # 元素还没有接收完整，或是可能被截断的数字 / 字面量，等待后续数据
+                if len(buffer) - pos > TASK_IMPORT_MAX_ROW_CHARS:
+                    raise _ImportFormatError(f"Malformed JSON near row starting at character {offset + pos}")
+                break
+            pos = end
+            expect = ","
+            yield item, None
+    if expect != "end":
+        raise _ImportFormatError("Malformed or truncated JSON array")
+
+def _validate_import_row(item: Any) -> Tuple[Optional[TaskCreate], List[Dict[str, Any]]]:
+    if not isinstance(item, dict):
+        return None, [{"loc": [], "msg": "Row must be a JSON object"}]
+    try:
+        return TaskCreate(**item), []
+    except ValidationError as e:
+        return None, [{"loc": list(error["loc"]), "msg": error["msg"]} for error in e.errors()]
+
+@router.post("/import", response_model=TaskImportResponse)
+async def import_tasks(
+    request: Request,
+    all_or_nothing: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    批量导入任务：请求体为 JSON 数组，或 Content-Type 为 application/x-ndjson 时每行一个任务
+    边接收边解析校验，请求体全部接收后才开始写入（每 TASK_IMPORT_CHUNK_SIZE 行一条 INSERT），
+    写事务不会因为客户端上传缓慢而长时间持有 SQLite 写锁；
+    无效行记录在 errors 中并跳过，all_or_nothing=true 时任一行无效则不写入任何任务并返回 422
+    """
+    content_type = request.headers.get("content-type", "")
+    ndjson = any(kind in content_type for kind in ("ndjson", "jsonl", "json-seq"))
+    items = _ndjson_items(request.stream()) if ndjson else _json_array_items(request.stream())
+    
+    now = datetime.utcnow()
+    ids: List[Optional[str]] = []
+    errors: List[TaskImportError] = []
+    rows: List[Dict[str, Any]] = []
+    
+    try:
+        async for item, parse_error in items:
+            index = len(ids)
+            if index >= TASK_IMPORT_MAX_ROWS:
+                raise HTTPException(status_code=413, detail=f"Too many rows, at most {TASK_IMPORT_MAX_ROWS} per import")
+            
+            task_data, row_errors = (None, [{"loc": [], "msg": parse_error}]) if parse_error else _validate_import_row(item)
+            if task_data is None:
+                ids.append(None)
+                errors.append(TaskImportError(index=index, errors=row_errors))
+                continue
+            
+            row = _task_row(current_user.id, task_data, now)
+            ids.append(row["id"])
+            rows.append(row)
+    except (_ImportFormatError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"{str(e)}; no tasks were created")
+    
+    if all_or_nothing and errors:
+        raise HTTPException(status_code=422, detail={
+            "message": "Import rejected, no tasks were created",
+            "failed": len(errors),
+            "errors": [error.dict() for error in errors[:100]]
+        })
+    
+    if rows:
+        for offset in range(0, len(rows), TASK_IMPORT_CHUNK_SIZE):
+            await _insert_tasks(db, rows[offset:offset + TASK_IMPORT_CHUNK_SIZE])
+        await _raise_max_span(db, current_user.id, rows)
+        await rollups.apply(db, current_user.id, rollups.task_changes(rows, rollups.user_zone(current_user.timezone)))
+        await counters.apply(db, counters.merge(
+            counters.task_changes(current_user.id, tasks=len(rows)),
+            counters.version_changes(current_user.id, COLLECTION)
+        ))
+        await counters.mark_active(db, current_user.id)
+        await db.commit()
+    
+    return TaskImportResponse(created=len(rows), failed=len(errors), ids=ids, errors=errors)
+
+def _bulk_condition(user_id: str, selection: TaskBulkSelect):
+    """
+    把 ids / filter 转为 WHERE 条件，始终限定在当前用户名下
+    """
+    conditions = [Task.user_id == user_id]
+    if selection.ids is not None:
+        if len(selection.ids) > BULK_MAX_IDS:
+            raise HTTPException(status_code=422, detail=f"At most {BULK_MAX_IDS} ids per request")
+        conditions.append(Task.id.in_(selection.ids))
+    criteria = selection.filter.dict(exclude_none=True) if selection.filter else {}
+    if selection.ids is None and not criteria:
+        raise HTTPException(status_code=422, detail="Provide ids or at least one filter field")
+    for field in ("status", "priority", "category"):
+        if field in criteria:
+            conditions.append(getattr(Task, field) == criteria[field])
+    if "start_after" in criteria:
+        conditions.append(Task.start_time >= criteria["start_after"])
+    if "start_before" in criteria:
+        conditions.append(Task.start_time < criteria["start_before"])
+    return and_(*conditions)
+
+def _is_completed(completed: bool):
+    if completed:
+        return Task.status == "completed"
+    return or_(Task.status.is_(None), Task.status != "completed")
+
+async def _bulk_execute(db: AsyncSession, statement) -> int:
+    result = await db.execute(statement.execution_options(synchronize_session=False))
+    return result.rowcount
+
+@router.post("/bulk/update")
+async def bulk_update_tasks(
+    request_data: TaskBulkUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    new_tasks = []
-    for task_data in tasks_data:
-        new_task = Task(
-            user_id=current_user.id,
-            title=task_data.title,
-            description=task_data.description,
-            start_time=task_data.start_time,
-            end_time=task_data.end_time,
-            duration=task_data.duration,
-            priority=task_data.priority,
-            category=task_data.category,
-            tags=task_data.tags,
-            status="pending"
+    """
+    一条 UPDATE 修改所有匹配的任务（如"完成这些任务"），返回受影响行数
+    修改状态时按是否已完成拆成两条语句，以便从行数得到已完成任务计数的变化
+    """
+    condition = _bulk_condition(current_user.id, request_data)
+    now = datetime.utcnow()
+    values = request_data.changes.dict(exclude_none=True)
+    if not values:
+        raise HTTPException(status_code=422, detail="No changes given")
+    values["updated_at"] = now
+    
+    # 修改状态或分类会移动任务在汇总中的归属：先读出受影响任务的汇总列
+    rollup_changes: rollups.Changes = {}
+    if "status" in values or "category" in values:
+        zone = rollups.user_zone(current_user.timezone)
+        affected = (await db.execute(select(*rollups.ROLLUP_COLUMNS).where(condition))).all()
+        rollup_changes = rollups.merge(
+            rollups.task_changes(affected, zone, sign=-1),
+            rollups.task_changes(affected, zone, overrides=values)
         )
-        new_tasks.append(new_task)
     
-    db.add_all(new_tasks)
-    db.commit()
+    completed_delta = 0
+    if "status" in values:
+        completing = values["status"] == "completed"
+        # 状态会发生"已完成 <-> 未完成"变化的行
+        moving = _is_completed(not completing)
+        moving_values = dict(values, completed_at=func.coalesce(Task.completed_at, now)) if completing else values
+        # 先更新已处于目标状态的行，否则会再次匹配到刚转换过去的行
+        staying = await _bulk_execute(db, update(Task).where(condition, _is_completed(completing)).values(**values))
+        moved = await _bulk_execute(db, update(Task).where(condition, moving).values(**moving_values))
+        updated = moved + staying
+        completed_delta = moved if completing else -moved
+    else:
+        updated = await _bulk_execute(db, update(Task).where(condition).values(**values))
+    
+    if updated:
+        await rollups.apply(db, current_user.id, rollup_changes)
+        await counters.apply(db, counters.merge(
+            counters.task_changes(current_user.id, completed=completed_delta),
+            counters.version_changes(current_user.id, COLLECTION)
+        ))
+    await db.commit()
+    
+    return {"message": "Tasks updated", "updated": updated}
+
+@router.post("/bulk/delete")
+async def bulk_delete_tasks(
+    request_data: TaskBulkSelect,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    按 ids / 条件批量删除任务（如"清除已完成任务"），返回删除行数
+    已完成和未完成分两条 DELETE 执行，用于维护计数器
+    """
+    condition = _bulk_condition(current_user.id, request_data)
+    await tombstones.record_matching(db, COLLECTION, Task, condition)
+    affected = (await db.execute(select(*rollups.ROLLUP_COLUMNS).where(condition))).all()
+    completed = await _bulk_execute(db, delete(Task).where(condition, _is_completed(True)))
+    others = await _bulk_execute(db, delete(Task).where(condition, _is_completed(False)))
+    
+    deleted = completed + others
+    if deleted:
+        await rollups.apply(db, current_user.id, rollups.task_changes(affected, rollups.user_zone(current_user.timezone), sign=-1))
+        await counters.apply(db, counters.merge(
+            counters.task_changes(current_user.id, tasks=-deleted, completed=-completed),
+            counters.version_changes(current_user.id, COLLECTION)
+        ))
+    await db.commit()
+    
+    return {"message": "Tasks deleted", "deleted": deleted}
+
+def _priority_rank():
+    return case((Task.priority == "high", 0), (Task.priority == "low", 2), else_=1)
+
+@router.post("/schedule", response_model=TaskScheduleResponse)
+async def schedule_tasks(
+    request_data: TaskScheduleRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    把尚未安排时间的任务装入接下来 days 天工作时间内的空闲时段，已有开始时间的任务视为固定占用
+    只计算方案不写入：返回的 changes 交给 POST /schedule/apply 一次性写入
+    单次最多 SCHEDULE_MAX_TASKS 个任务、SCHEDULE_MAX_DAYS 天，search 模式受 time_budget_ms 限制
+    """
+    if request_data.mode not in auto_scheduler.MODES:
+        raise HTTPException(status_code=422, detail=f"mode must be one of {', '.join(auto_scheduler.MODES)}")
+    if not 1 <= request_data.days <= auto_scheduler.SCHEDULE_MAX_DAYS:
+        raise HTTPException(status_code=422, detail=f"days must be between 1 and {auto_scheduler.SCHEDULE_MAX_DAYS}")
+    if not 0 <= request_data.time_budget_ms <= auto_scheduler.SCHEDULE_MAX_BUDGET_MS:
+        raise HTTPException(status_code=422, detail=f"time_budget_ms must be between 0 and {auto_scheduler.SCHEDULE_MAX_BUDGET_MS}")
+    hours = request_data.working_hours
+    if hours.start >= hours.end or any(day not in range(7) for day in hours.weekdays):
+        raise HTTPException(status_code=422, detail="Working hours must end after they start, weekdays are 0-6")
+    if request_data.task_ids is not None and len(request_data.task_ids) > auto_scheduler.SCHEDULE_MAX_TASKS:
+        raise HTTPException(status_code=422, detail=f"At most {auto_scheduler.SCHEDULE_MAX_TASKS} tasks per schedule")
+    
+    started = datetime.utcnow()
+    origin = request_data.start or started
+    if origin.tzinfo is not None:
+        # 数据库中的时间均为 UTC naive
+        origin = origin.astimezone(timezone.utc).replace(tzinfo=None)
+    # 从整 5 分钟开始排
+    origin = origin.replace(second=0, microsecond=0)
+    origin += timedelta(minutes=-origin.minute % 5)
+    horizon_end = origin + timedelta(days=request_data.days)
+    
+    query = select(Task.id, Task.duration, Task.priority).where(
+        Task.user_id == current_user.id,
+        Task.start_time.is_(None),
+        or_(Task.status.is_(None), Task.status.in_(["pending", "in-progress"]))
+    )
+    if request_data.task_ids is not None:
+        query = query.where(Task.id.in_(request_data.task_ids))
+    rows = (await db.execute(query.order_by(
+        _priority_rank(), Task.created_at, Task.id
+    ).limit(auto_scheduler.SCHEDULE_MAX_TASKS + 1))).all()
+    truncated = len(rows) > auto_scheduler.SCHEDULE_MAX_TASKS
+    tasks = [
+        auto_scheduler.SchedulingTask(task_id, duration or auto_scheduler.SCHEDULE_DEFAULT_DURATION_MINUTES, priority or "medium")
+        for task_id, duration, priority in rows[:auto_scheduler.SCHEDULE_MAX_TASKS]
+    ]
+    
+    unscheduled: List[TaskScheduleSkip] = []
+    if request_data.task_ids is not None:
+        candidates = {task.id for task in tasks}
+        missing = [task_id for task_id in dict.fromkeys(request_data.task_ids) if task_id not in candidates]
+        owned = dict((await db.execute(select(Task.id, Task.start_time).where(
+            Task.user_id == current_user.id,
+            Task.id.in_(missing)
+        ))).all()) if missing else {}
+        unscheduled += [
+            TaskScheduleSkip(id=task_id, reason="not_found" if task_id not in owned else "already_scheduled" if owned[task_id] else "not_pending")
+            for task_id in missing
+        ]
+    
+    # 排程范围内已有的任务（已取消的除外）占用的时间
+    busy = [
+        (start_time, _task_end_value(start_time, end_time, duration))
+        for start_time, end_time, duration in await db.execute(select(Task.start_time, Task.end_time, Task.duration).where(
+            Task.user_id == current_user.id,
+            or_(Task.status.is_(None), Task.status != "cancelled"),
+            *await _window_conditions(db, current_user.id, origin, horizon_end)
+        ))
+    ]
+    
+    zone = rollups.user_zone(current_user.timezone)
+    windows = auto_scheduler.working_windows(rollups.local_day(origin, zone), request_data.days + 1, hours.start, hours.end, hours.weekdays, zone)
+    windows = [(start, min(end, horizon_end)) for start, end in windows if start < horizon_end]
+    slots = auto_scheduler.free_slots(origin, windows, busy, request_data.gap_minutes)
+    plan = await run_in_threadpool(
+        auto_scheduler.schedule, tasks, slots, request_data.mode, request_data.time_budget_ms, request_data.gap_minutes
+    )
+    
+    changes = []
+    for task in tasks:
+        if task.id not in plan.starts:
+            unscheduled.append(TaskScheduleSkip(id=task.id, reason="no_free_slot"))
+            continue
+        start_time = origin + timedelta(minutes=plan.starts[task.id])
+        changes.append(TaskScheduleChange(id=task.id, start_time=start_time, end_time=start_time + timedelta(minutes=task.minutes)))
+    changes.sort(key=lambda change: change.start_time)
+    
+    return TaskScheduleResponse(
+        mode=request_data.mode,
+        changes=changes,
+        unscheduled=unscheduled,
+        truncated=truncated,
+        scheduled_minutes=sum(task.minutes for task in tasks if task.id in plan.starts),
+        elapsed_ms=int((datetime.utcnow() - started).total_seconds() * 1000)
+    )
+
+@router.post("/schedule/apply")
+async def apply_task_schedule(
+    request_data: TaskScheduleApply,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    写入 /schedule 返回的 changes：一条 UPDATE（executemany）设置 start_time / end_time
+    只更新仍未安排时间的任务，期间已被安排的任务保持不变；返回实际更新的任务数
+    """
+    if len(request_data.changes) > BULK_MAX_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {BULK_MAX_IDS} changes per request")
+    if any(change.end_time < change.start_time for change in request_data.changes):
+        raise HTTPException(status_code=422, detail="end_time must not be before start_time")
+    changes = {change.id: change for change in request_data.changes}
+    if not changes:
+        return {"message": "Schedule applied", "updated": 0}
+    
+    now = datetime.utcnow()
+    pending = and_(Task.user_id == current_user.id, Task.id.in_(list(changes)), Task.start_time.is_(None))
+    affected = (await db.execute(select(Task.id, *rollups.ROLLUP_COLUMNS).where(pending).with_for_update())).all()
+    
+    # 单条语句按主键逐行绑定参数，仍带 user_id 和 start_time IS NULL 条件
+    result = await db.execute(
+        update(Task.__table__).where(
+            Task.__table__.c.id == bindparam("task_id"),
+            Task.__table__.c.user_id == current_user.id,
+            Task.__table__.c.start_time.is_(None)
+        ).values(start_time=bindparam("new_start"), end_time=bindparam("new_end"), updated_at=now),
+        [
+            {"task_id": row.id, "new_start": changes[row.id].start_time, "new_end": changes[row.id].end_time}
+            for row in affected
+        ]
+    ) if affected else None
+    updated = result.rowcount if result is not None else 0
     
-    for task in new_tasks:
-        db.refresh(task)
+    if updated:
+        zone = rollups.user_zone(current_user.timezone)
+        moved = [
+            rollups.task_changes([row], zone, overrides={"start_time": changes[row.id].start_time, "end_time": changes[row.id].end_time})
+            for row in affected
+        ]
+        await rollups.apply(db, current_user.id, rollups.merge(rollups.task_changes(affected, zone, sign=-1), *moved))
+        await _raise_max_span(db, current_user.id, [
+            {"start_time": changes[row.id].start_time, "end_time": changes[row.id].end_time, "duration": row.duration}
+            for row in affected
+        ])
+        await counters.apply(db, counters.version_changes(current_user.id, COLLECTION))
+    await db.commit()
     
-    return new_tasks
+    return {"message": "Schedule applied", "updated": updated}
@@ -0,0 +1,54 @@
+"""
+测试使用临时 SQLite 数据库和日志目录，需在导入 database / main 之前设置环境变量
+在 backend 目录下运行: python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="ai-time-tests-")
+os.environ.setdefault("DATABASE_TYPE", "sqlite")
+os.environ["DATABASE_PATH"] = os.path.join(_tmp, "test.db")
+os.environ["LOG_DIR"] = os.path.join(_tmp, "logs")
+os.environ["ENCRYPTION_KEY_FILE"] = os.path.join(_tmp, ".encryption_key")
+os.environ["JOB_SCHEDULER_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    # 整个测试会话共用一次应用启动（建表、默认管理员）与关闭
+    import main
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def register(client):
+    """
+    注册一个新用户并返回其认证头，email 默认随机生成
+    """
+    def register(email=None, timezone="UTC"):
+        email = email or f"user-{uuid.uuid4().hex[:12]}@example.com"
+        response = client.post("/api/auth/register", json={"email": email, "password": "x", "timezone": timezone})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return register
+
+
+@pytest.fixture
+def user_headers(register):
+    return register()
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client):
+    # 默认管理员由 init_admin 在应用启动时创建
+    response = client.post("/api/auth/login", data={"username": "admin@admin.com", "password": "admin123456"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,44 @@
+def _check(client, user_headers, admin_headers, path, expected=200, method="POST"):
+    assert client.request(method, path).status_code == 401
+    assert client.request(method, path, headers=user_headers).status_code == 403
+    assert client.request(method, path, headers=admin_headers).status_code == expected
+
+
+def test_rotate_keys_requires_admin(client, user_headers, admin_headers):
+    _check(client, user_headers, admin_headers, "/api/admin/ai-providers/rotate-keys")
+
+
+def test_llm_cache_clear_requires_admin(client, user_headers, admin_headers):
+    _check(client, user_headers, admin_headers, "/api/admin/cache/llm-responses/clear")
+
+
+def test_provider_reset_requires_admin(client, user_headers, admin_headers):
+    _check(client, user_headers, admin_headers, "/api/admin/ai-providers/missing/reset")
+
+
+def test_ai_config_test_requires_admin(client, user_headers, admin_headers):
+    # Unknown config: admins get past the auth check to the 404
+    _check(client, user_headers, admin_headers, "/api/ai-config/test?config_id=missing", expected=404)
+
+
+def test_insight_job_run_requires_admin(client, user_headers):
+    # Not called as admin: it would start the insight job in the background
+    assert client.post("/api/admin/jobs/insights/run").status_code == 401
+    assert client.post("/api/admin/jobs/insights/run", headers=user_headers).status_code == 403
+
+
+def test_stats_rebuild_requires_admin(client, user_headers, admin_headers):
+    _check(client, user_headers, admin_headers, "/api/admin/stats/rebuild")
+
+
+def test_provider_health_requires_admin(client, user_headers, admin_headers):
+    _check(client, user_headers, admin_headers, "/api/admin/ai-providers/health", method="GET")
+
+
+def test_cache_stats_requires_admin(client, user_headers, admin_headers):
+    _check(client, user_headers, admin_headers, "/api/admin/cache/stats", method="GET")
+
+
+def test_job_runs_require_admin_and_bound_limit(client, user_headers, admin_headers):
+    _check(client, user_headers, admin_headers, "/api/admin/jobs", method="GET")
+    assert client.get("/api/admin/jobs?limit=201", headers=admin_headers).status_code == 422
@@ -0,0 +1,40 @@
+SECRET = "sk-test-do-not-leak"
+
+
+def test_active_config_requires_login(client):
+    assert client.get("/api/ai-config/active").status_code == 401
+
+
+def test_config_management_requires_admin(client, user_headers, admin_headers):
+    config = {"provider": "openai", "model_name": "gpt-admin-only", "api_key": SECRET, "api_endpoint": "http://attacker.invalid"}
+
+    for headers, status in ((None, 401), (user_headers, 403)):
+        assert client.get("/api/ai-config/", headers=headers).status_code == status
+        assert client.post("/api/ai-config/", json=config, headers=headers).status_code == status
+        assert client.put("/api/ai-config/missing/toggle", headers=headers).status_code == status
+
+    assert "gpt-admin-only" not in client.get("/api/ai-config/", headers=admin_headers).text
+    assert client.put("/api/ai-config/missing/toggle", headers=admin_headers).status_code == 404
+
+
+def test_active_config_does_not_expose_api_key(client, user_headers, admin_headers):
+    response = client.post("/api/ai-config/", headers=admin_headers,
+                           json={"provider": "openai", "model_name": "gpt-test", "api_key": SECRET, "priority": 100})
+    assert response.status_code == 200
+
+    response = client.get("/api/ai-config/active", headers=user_headers)
+
+    assert response.status_code == 200
+    assert response.json()["model_name"] == "gpt-test"
+    assert "api_key" not in response.json()
+    assert SECRET not in response.text
+
+
+def test_registry_snapshot_hides_api_key_from_repr():
+    from provider_registry import ProviderConfig
+
+    config = ProviderConfig(id="1", provider="openai", model_name="gpt-test", api_endpoint=None,
+                            temperature=0.7, max_tokens=2000, priority=0, api_key=SECRET)
+
+    assert config.api_key == SECRET
+    assert SECRET not in repr(config)
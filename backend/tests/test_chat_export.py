@@ -0,0 +1,34 @@
+import asyncio
+import json
+from datetime import datetime
+
+from database import db_session
+from models import ChatMessage
+from routers import chat
+
+
+def test_export_pages_through_all_messages_in_order(client, user_headers, monkeypatch):
+    monkeypatch.setattr(chat, "EXPORT_BATCH_SIZE", 2)
+    user_id = client.get("/api/auth/me", headers=user_headers).json()["id"]
+    # Several messages share a timestamp, so pages must continue on (created_at, id)
+    stamps = [datetime(2025, 1, 6, 9), datetime(2025, 1, 6, 9), datetime(2025, 1, 6, 9), datetime(2025, 1, 6, 10), datetime(2025, 1, 6, 11)]
+
+    async def seed():
+        async with db_session() as db:
+            db.add_all([
+                ChatMessage(id=f"m{index}", user_id=user_id, session_id="s1", role="user", content=f"#{index}", created_at=stamp)
+                for index, stamp in enumerate(stamps)
+            ])
+            await db.commit()
+
+    asyncio.run(seed())
+
+    response = client.get("/api/chat/export?format=ndjson", headers=user_headers)
+    assert [json.loads(line)["content"] for line in response.text.splitlines()] == [f"#{index}" for index in range(5)]
+
+    exported = client.get("/api/chat/export?format=json", headers=user_headers).json()
+    assert [message["id"] for message in exported] == [f"m{index}" for index in range(5)]
+
+
+def test_export_of_empty_history_is_an_empty_array(client, user_headers):
+    assert client.get("/api/chat/export", headers=user_headers).json() == []
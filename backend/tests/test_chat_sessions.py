@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import select
+
+import chat_sessions
+from database import db_session
+from models import ChatMessage, ChatSession, User
+
+
+def test_record_message_upserts_without_moving_last_message_at_backwards(client):
+    async def run():
+        async with db_session() as db:
+            user = User(email="chat-sessions@example.com", password_hash="x")
+            db.add(user)
+            await db.flush()
+
+            def message(content, created_at):
+                return ChatMessage(user_id=user.id, session_id="s1", role="user", content=content, created_at=created_at)
+
+            newer = message("second", datetime(2025, 1, 6, 10, 0))
+            older = message("first", datetime(2025, 1, 6, 9, 0))
+            db.add_all([newer, older])
+            await db.flush()
+
+            created = [await chat_sessions.record_message(db, item) for item in (newer, older)]
+            summary = (await db.execute(select(
+                ChatSession.message_count, ChatSession.first_message, ChatSession.last_message_at
+            ).where(ChatSession.user_id == user.id))).one()
+            await db.rollback()
+            return created, summary
+
+    # client: runs inside the app lifespan so tables exist and logging shuts down cleanly
+    created, summary = asyncio.run(run())
+
+    assert created == [True, False]
+    assert summary.message_count == 2
+    assert summary.first_message == "second"
+    # A message recorded late must not move the session's last activity backwards
+    assert summary.last_message_at == datetime(2025, 1, 6, 10, 0)
+
+
+def test_remove_message_recomputes_summary_in_place(client):
+    async def run():
+        async with db_session() as db:
+            user = User(email="chat-sessions-remove@example.com", password_hash="x")
+            db.add(user)
+            await db.flush()
+
+            messages = [
+                ChatMessage(user_id=user.id, session_id="s1", role="user", content=content,
+                            created_at=datetime(2025, 1, 6, hour))
+                for hour, content in ((9, "first"), (10, "second"), (11, "third"))
+            ]
+            db.add_all(messages)
+            await db.flush()
+            for message in messages:
+                await chat_sessions.record_message(db, message)
+
+            summary = select(
+                ChatSession.message_count, ChatSession.first_message, ChatSession.last_message_at
+            ).where(ChatSession.user_id == user.id)
+            states = []
+            for message in (messages[0], messages[2], messages[1]):
+                await db.delete(message)
+                await db.flush()
+                emptied = await chat_sessions.remove_message(db, message)
+                states.append((emptied, (await db.execute(summary)).first()))
+            await db.rollback()
+            return states
+
+    states = asyncio.run(run())
+
+    assert states[0] == (False, (2, "second", datetime(2025, 1, 6, 11)))
+    assert states[1] == (False, (1, "second", datetime(2025, 1, 6, 10)))
+    assert states[2] == (True, None)
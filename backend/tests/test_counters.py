@@ -0,0 +1,22 @@
+import asyncio
+from datetime import date
+
+import counters
+from database import db_session
+
+
+def test_mark_active_counts_each_user_once_per_day(client):
+    first, second = date(2025, 1, 6), date(2025, 1, 7)
+
+    async def run():
+        async with db_session() as db:
+            for day in (first, first, second, second):
+                await counters.mark_active(db, "mark-active-user", today=day)
+            await counters.mark_active(db, "mark-active-other", today=second)
+            values = await counters.read(db, counters.GLOBAL_SCOPE, [counters.active_users_on(first), counters.active_users_on(second)])
+            await db.rollback()
+            return values
+
+    values = asyncio.run(run())
+
+    assert values == {counters.active_users_on(first): 1, counters.active_users_on(second): 2}
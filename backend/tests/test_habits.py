@@ -0,0 +1,67 @@
+from datetime import date, datetime, timedelta
+
+
+def _habit(client, headers):
+    return client.post("/api/habits/", json={"title": "read"}, headers=headers).json()["id"]
+
+
+def _check_in(client, headers, habit_id, day):
+    return client.post(f"/api/habits/{habit_id}/checkins", json={"day": day.isoformat()}, headers=headers)
+
+
+def test_streak_is_zero_once_the_latest_run_has_lapsed(client, user_headers):
+    habit_id = _habit(client, user_headers)
+
+    for day in (date(2025, 1, 1), date(2025, 1, 3), date(2025, 1, 2)):
+        response = _check_in(client, user_headers, habit_id, day)
+
+    assert response.status_code == 200
+    assert (response.json()["streak"], response.json()["longest_streak"]) == (0, 3)
+    assert response.json()["last_checkin_date"] == "2025-01-03"
+    listed = client.get("/api/habits/", headers=user_headers).json()
+    assert [(habit["streak"], habit["longest_streak"]) for habit in listed] == [(0, 3)]
+
+
+def test_streak_counts_a_run_reaching_yesterday(client, user_headers):
+    habit_id = _habit(client, user_headers)
+    today = datetime.utcnow().date()  # test users are registered in UTC
+
+    _check_in(client, user_headers, habit_id, today - timedelta(days=2))
+    response = _check_in(client, user_headers, habit_id, today - timedelta(days=1))
+
+    assert response.json()["streak"] == 2
+
+
+def test_future_check_in_is_rejected(client, user_headers):
+    habit_id = _habit(client, user_headers)
+
+    response = _check_in(client, user_headers, habit_id, datetime.utcnow().date() + timedelta(days=2))
+
+    assert response.status_code == 400
+    assert client.get(f"/api/habits/{habit_id}/checkins", headers=user_headers).json()["dates"] == []
+
+
+def _dates(client, headers, habit_id):
+    params = {"start": "2025-01-01", "end": "2025-01-31"}
+    return client.get(f"/api/habits/{habit_id}/checkins", params=params, headers=headers).json()["dates"]
+
+
+def test_check_in_merges_runs_and_uncheck_splits_them(client, user_headers):
+    habit_id = _habit(client, user_headers)
+    for day in (1, 2, 3, 5, 6):
+        _check_in(client, user_headers, habit_id, date(2025, 1, day))
+
+    # Filling the gap joins 1-3 and 5-6 into one run
+    merged = _check_in(client, user_headers, habit_id, date(2025, 1, 4)).json()
+    assert merged["longest_streak"] == 6
+    assert _dates(client, user_headers, habit_id) == [f"2025-01-0{day}" for day in range(1, 7)]
+
+    # Removing a middle day splits it into 1-2 and 4-6
+    split = client.delete(f"/api/habits/{habit_id}/checkins/2025-01-03", headers=user_headers).json()
+    assert split["longest_streak"] == 3
+    assert split["last_checkin_date"] == "2025-01-06"
+    assert _dates(client, user_headers, habit_id) == ["2025-01-01", "2025-01-02", "2025-01-04", "2025-01-05", "2025-01-06"]
+
+    # Trimming the end of the latest run moves the last check-in back
+    trimmed = client.delete(f"/api/habits/{habit_id}/checkins/2025-01-06", headers=user_headers).json()
+    assert (trimmed["longest_streak"], trimmed["last_checkin_date"]) == (2, "2025-01-05")
@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import insight_engine
+
+
+def _row(start, end=None, duration=None, category="Work"):
+    return (start, end, duration, category, "task", None)
+
+
+def test_duration_only_tasks_end_at_start_plus_duration():
+    day = datetime(2026, 3, 2)
+    cols = insight_engine.load_columns([
+        _row(day.replace(hour=9), duration=120),
+        _row(day.replace(hour=9, minute=30), duration=60),
+    ], timezone.utc)
+
+    assert str(cols.end[0]) == "2026-03-02T11:00"
+    assert insight_engine.overlaps(cols) == {"tasks": 1, "minutes": 60.0}
+
+    gaps = insight_engine.dark_time(cols)
+    # 06:00-09:00 before the tasks, then 11:00-23:00 after them; 09:00-11:00 is busy
+    assert [str(start) for start in gaps["start"]] == ["2026-03-02T06:00", "2026-03-02T11:00"]
+    assert gaps["minutes"].tolist() == [180.0, 720.0]
+
+
+def test_end_time_takes_precedence_over_duration():
+    day = datetime(2026, 3, 2)
+    cols = insight_engine.load_columns([
+        _row(day.replace(hour=9), end=day.replace(hour=10), duration=300),
+        _row(day.replace(hour=10), duration=30),
+    ], timezone.utc)
+
+    assert insight_engine.overlaps(cols) == {"tasks": 0, "minutes": 0.0}
+
+
+def test_local_hours_follow_dst_transitions():
+    # Europe/Berlin switches from UTC+1 to UTC+2 on 2025-03-30; both tasks start at 09:00 local time
+    cols = insight_engine.load_columns([
+        _row(datetime(2025, 3, 29, 8), duration=60),
+        _row(datetime(2025, 3, 31, 7), duration=60),
+    ], ZoneInfo("Europe/Berlin"))
+
+    assert [str(start) for start in cols.start] == ["2025-03-29T09:00", "2025-03-31T09:00"]
+    assert [str(end) for end in cols.end] == ["2025-03-29T10:00", "2025-03-31T10:00"]
@@ -0,0 +1,37 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import update
+
+import jobs
+from database import db_session
+from models import JobRun
+
+
+def test_heartbeat_refreshes_the_lease_until_it_is_lost(client, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_HEARTBEAT_SECONDS", 0.05)
+    scheduler = jobs.JobScheduler()
+    started = datetime.utcnow() - timedelta(hours=1)
+
+    async def heartbeat_at(run_id):
+        async with db_session() as db:
+            return (await db.get(JobRun, run_id)).heartbeat_at
+
+    async def run_test():
+        async with db_session() as db:
+            claimed = await jobs.claim_run(db, "heartbeat-test", date(2025, 1, 6), scheduler.owner, started)
+        heartbeat = asyncio.create_task(scheduler._heartbeat(claimed.id))
+        await asyncio.sleep(0.2)
+        refreshed = await heartbeat_at(claimed.id)
+
+        # Another process takes the run over: the heartbeat stops instead of stealing it back
+        async with db_session() as db:
+            await db.execute(update(JobRun).where(JobRun.id == claimed.id).values(owner="other", heartbeat_at=started))
+            await db.commit()
+        await asyncio.wait_for(heartbeat, timeout=1)
+        return refreshed, await heartbeat_at(claimed.id)
+
+    refreshed, after_takeover = asyncio.run(run_test())
+
+    assert refreshed > started + timedelta(minutes=59)
+    assert after_takeover == started
@@ -0,0 +1,19 @@
+from provider_registry import ProviderConfig
+from response_cache import cache_key
+
+MESSAGES = [{"role": "user", "content": "plan my  day"}]
+
+
+def _config(**overrides):
+    fields = dict(id="a", provider="openai", model_name="gpt-test", api_endpoint=None,
+                  temperature=0.0, max_tokens=2000, priority=0, api_key="sk-a")
+    return ProviderConfig(**{**fields, **overrides})
+
+
+def test_cache_key_is_scoped_to_the_provider_config():
+    key = cache_key(_config(), MESSAGES)
+
+    assert cache_key(_config(), [{"role": "user", "content": "plan my day"}]) == key
+    assert cache_key(_config(id="b"), MESSAGES) != key
+    assert cache_key(_config(api_endpoint="https://proxy.example.com/v1"), MESSAGES) != key
+    assert cache_key(_config(provider="deepseek"), MESSAGES) != key
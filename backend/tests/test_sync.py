@@ -0,0 +1,21 @@
+def test_sync_answers_with_and_without_trailing_slash(client, user_headers):
+    for path in ("/api/sync", "/api/sync/"):
+        # No redirect: clients that do not follow 307s must get the payload directly
+        response = client.get(path, headers=user_headers, follow_redirects=False)
+        assert response.status_code == 200
+        assert "tasks" in response.json()
+
+
+def test_delta_sync_lists_deleted_tasks(client, user_headers):
+    kept = client.post("/api/tasks/", json={"title": "kept"}, headers=user_headers).json()["id"]
+    removed = client.post("/api/tasks/", json={"title": "removed"}, headers=user_headers).json()["id"]
+    token = client.get("/api/sync", headers=user_headers).json()["token"]
+
+    assert client.delete(f"/api/tasks/{removed}", headers=user_headers).status_code == 204
+    delta = client.get("/api/sync", params={"since": token}, headers=user_headers).json()
+
+    assert delta["full"] is False
+    assert delta["tasks"]["deleted"] == [removed]
+    assert removed not in [task["id"] for task in delta["tasks"]["upserts"]]
+    full = client.get("/api/sync", headers=user_headers).json()
+    assert [task["id"] for task in full["tasks"]["upserts"]] == [kept]
@@ -0,0 +1,55 @@
+def _create(client, headers, title, category, start="2025-07-01T09:00:00", duration=60):
+    payload = {"title": title, "category": category, "start_time": start, "duration": duration}
+    return client.post("/api/tasks/", json=payload, headers=headers).json()["id"]
+
+
+def _range(client, headers, day="2025-07-01"):
+    return client.get("/api/analytics/range", params={"start": day, "end": day}, headers=headers).json()
+
+
+def test_bulk_update_moves_rollups_and_counts_rows(client, user_headers):
+    work = [_create(client, user_headers, f"work {index}", "Work") for index in range(2)]
+    home = _create(client, user_headers, "home", "Home", duration=30)
+
+    response = client.post("/api/tasks/bulk/update", json={"ids": work, "changes": {"status": "completed"}}, headers=user_headers)
+    assert response.json()["updated"] == 2
+    # Already completed rows still match and count as updated
+    response = client.post("/api/tasks/bulk/update", json={"filter": {"category": "Work"}, "changes": {"status": "completed"}}, headers=user_headers)
+    assert response.json()["updated"] == 2
+
+    usage = _range(client, user_headers)
+    assert usage["totals"] == {"planned_minutes": 150, "completed_minutes": 120, "task_count": 3,
+                               "completed_count": 2, "completion_rate": 0.6667}
+    assert [(item["category"], item["completed_count"]) for item in usage["categories"]] == [("Work", 2), ("Home", 0)]
+
+    client.post("/api/tasks/bulk/update", json={"ids": [home], "changes": {"category": "Work"}}, headers=user_headers)
+    assert [(item["category"], item["planned_minutes"]) for item in _range(client, user_headers)["categories"]] == [("Work", 150)]
+
+
+def test_bulk_delete_removes_only_matching_tasks(client, user_headers):
+    done = _create(client, user_headers, "done", "Work")
+    kept = _create(client, user_headers, "kept", "Work")
+    client.post("/api/tasks/bulk/update", json={"ids": [done], "changes": {"status": "completed"}}, headers=user_headers)
+
+    response = client.post("/api/tasks/bulk/delete", json={"filter": {"status": "completed"}}, headers=user_headers)
+
+    assert response.json()["deleted"] == 1
+    assert [task["id"] for task in client.get("/api/tasks/", headers=user_headers).json()] == [kept]
+    assert _range(client, user_headers)["totals"]["task_count"] == 1
+
+
+def test_bulk_requires_a_selection(client, user_headers):
+    response = client.post("/api/tasks/bulk/delete", json={}, headers=user_headers)
+
+    assert response.status_code == 422
+
+
+def test_analytics_range_fills_empty_periods(client, user_headers):
+    _create(client, user_headers, "monday", "Work", start="2025-07-07T09:00:00", duration=45)
+
+    params = {"start": "2025-07-06", "end": "2025-07-08"}
+    usage = client.get("/api/analytics/range", params=params, headers=user_headers).json()
+
+    assert [(item["period"], item["planned_minutes"]) for item in usage["series"]] == [
+        ("2025-07-06", 0), ("2025-07-07", 45), ("2025-07-08", 0)
+    ]
@@ -0,0 +1,33 @@
+def _create(client, headers, title, start, end):
+    response = client.post("/api/tasks/", json={"title": title, "start_time": start, "end_time": end}, headers=headers)
+    return response.json()["id"]
+
+
+def test_conflicts_report_each_overlapping_pair(client, user_headers):
+    day = "2025-06-02T"
+    long = _create(client, user_headers, "long", day + "09:00:00", day + "12:00:00")
+    inner = _create(client, user_headers, "inner", day + "10:00:00", day + "10:30:00")
+    late = _create(client, user_headers, "late", day + "11:30:00", day + "13:00:00")
+    # Touching end-to-start is not an overlap
+    _create(client, user_headers, "after", day + "13:00:00", day + "14:00:00")
+
+    response = client.get("/api/tasks/conflicts", headers=user_headers)
+
+    assert response.status_code == 200
+    body = response.json()
+    pairs = [(conflict["task_ids"], conflict["overlap_minutes"]) for conflict in body["conflicts"]]
+    assert pairs == [([long, inner], 30), ([long, late], 30)]
+    assert body["conflicts"][1]["overlap_start"] == day + "11:30:00"
+    assert body["conflicts"][1]["overlap_end"] == day + "12:00:00"
+    assert {task["id"] for task in body["tasks"]} == {long, inner, late}
+    assert body["truncated"] is False
+
+
+def test_conflicts_are_truncated_at_limit(client, user_headers):
+    for index in range(3):
+        _create(client, user_headers, f"meeting {index}", "2025-06-03T09:00:00", "2025-06-03T10:00:00")
+
+    body = client.get("/api/tasks/conflicts", params={"limit": 2}, headers=user_headers).json()
+
+    assert len(body["conflicts"]) == 2
+    assert body["truncated"] is True
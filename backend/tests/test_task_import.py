@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import pytest
+
+from routers import tasks
+
+
+def _task_count(client, headers):
+    return len(client.get("/api/tasks/", headers=headers).json())
+
+
+def test_import_skips_failing_rows(client, user_headers):
+    rows = [{"title": "a"}, {"priority": "high"}, {"title": "b", "duration": 30}, "not an object"]
+
+    response = client.post("/api/tasks/import", content=json.dumps(rows), headers=user_headers)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 2)
+    assert [task_id is not None for task_id in body["ids"]] == [True, False, True, False]
+    assert [error["index"] for error in body["errors"]] == [1, 3]
+    assert _task_count(client, user_headers) == 2
+
+
+def test_import_ndjson_reports_unparsable_lines(client, user_headers):
+    body = '{"title": "a"}\n{"title": \n{"title": "c"}\n'
+
+    response = client.post("/api/tasks/import", content=body,
+                           headers={**user_headers, "Content-Type": "application/x-ndjson"})
+
+    assert response.json()["created"] == 2
+    assert response.json()["errors"][0]["index"] == 1
+
+
+def test_import_all_or_nothing_creates_nothing_when_a_row_fails(client, user_headers):
+    rows = [{"title": "a"}, {"title": "b"}, {}]
+
+    response = client.post("/api/tasks/import?all_or_nothing=true", content=json.dumps(rows), headers=user_headers)
+
+    assert response.status_code == 422
+    assert response.json()["detail"]["failed"] == 1
+    assert _task_count(client, user_headers) == 0
+
+
+def _parse(*chunks):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    async def collect():
+        return [item async for item, _ in tasks._json_array_items(stream())]
+
+    return asyncio.run(collect())
+
+
+def test_json_array_waits_for_a_delimiter_before_decoding_a_split_scalar():
+    assert _parse(b"[1", b"23, 4", b"5]") == [123, 45]
+    assert _parse(b'[{"title": "a"}', b", tr", b"ue]") == [{"title": "a"}, True]
+    # A multi-byte character split across chunks
+    body = '[{"title": "写"}]'.encode()
+    split = body.index("写".encode()) + 1
+    assert _parse(body[:split], body[split:]) == [{"title": "写"}]
+
+
+@pytest.mark.parametrize("body", [
+    b'[{"title": "a"},, {"title": "b"}]',
+    b'[, {"title": "a"}]',
+    b'[{"title": "a"},]',
+    b'[{"title": "a"} {"title": "b"}]',
+    b'[{"title": "a"}] {"title": "b"}',
+    b'[{"title": "a"}',
+])
+def test_json_array_rejects_malformed_separators(body):
+    with pytest.raises(tasks._ImportFormatError):
+        _parse(body[:7], body[7:])
+
+
+def test_import_rejects_duplicate_commas(client, user_headers):
+    response = client.post("/api/tasks/import", content=b'[{"title": "a"},, {"title": "b"}]', headers=user_headers)
+
+    assert response.status_code == 400
+    assert _task_count(client, user_headers) == 0
@@ -0,0 +1,46 @@
+from pagination import NEXT_CURSOR_HEADER
+
+
+def _create(client, headers, title, start):
+    response = client.post("/api/tasks/", json={"title": title, "start_time": start, "duration": 30}, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def test_cursor_pages_cover_every_task_once(client, user_headers):
+    # Two tasks share a start time so the id tie-breaker decides their order across the page boundary
+    starts = ["2025-05-01T09:00:00", "2025-05-02T09:00:00", "2025-05-02T09:00:00",
+              "2025-05-03T09:00:00", "2025-05-04T09:00:00"]
+    ids = {_create(client, user_headers, f"task {index}", start) for index, start in enumerate(starts)}
+
+    seen, pages, cursor = [], 0, None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/tasks/", params=params, headers=user_headers)
+        assert response.status_code == 200
+        seen.extend(task["id"] for task in response.json())
+        pages += 1
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+
+    assert pages == 3
+    assert len(seen) == len(set(seen)) and set(seen) == ids
+    listed = client.get("/api/tasks/", headers=user_headers).json()
+    assert [task["id"] for task in listed] == seen
+
+
+def test_matching_etag_returns_304_until_a_write(client, user_headers):
+    _create(client, user_headers, "first", "2025-05-01T09:00:00")
+    first = client.get("/api/tasks/", headers=user_headers)
+    etag = first.headers["ETag"]
+
+    cached = client.get("/api/tasks/", headers={**user_headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    _create(client, user_headers, "second", "2025-05-02T09:00:00")
+    refreshed = client.get("/api/tasks/", headers={**user_headers, "If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] != etag
+    assert len(refreshed.json()) == 2
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+
+def test_schedule_accepts_utc_suffixed_start(client, user_headers):
+    task = client.post("/api/tasks/", json={"title": "write report", "duration": 60}, headers=user_headers).json()
+
+    response = client.post("/api/tasks/schedule", json={"start": "2025-01-06T00:00:00Z", "days": 1}, headers=user_headers)
+
+    assert response.status_code == 200
+    changes = response.json()["changes"]
+    assert [change["id"] for change in changes] == [task["id"]]
+    # Monday 2025-01-06, default working hours 09:00-18:00 in UTC
+    assert datetime.fromisoformat(changes[0]["start_time"]) == datetime(2025, 1, 6, 9, 0)
+
+
+def test_schedule_converts_offset_start_to_utc(client, user_headers):
+    client.post("/api/tasks/", json={"title": "review", "duration": 30}, headers=user_headers)
+
+    # 12:00 at +08:00 is 04:00 UTC, so the task still lands at the start of the 09:00 UTC window
+    response = client.post("/api/tasks/schedule", json={"start": "2025-01-06T12:00:00+08:00", "days": 1}, headers=user_headers)
+
+    assert response.status_code == 200
+    assert datetime.fromisoformat(response.json()["changes"][0]["start_time"]) == datetime(2025, 1, 6, 9, 0)
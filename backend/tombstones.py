@@ -0,0 +1,90 @@
+"""
+删除墓碑 - 删除任务、洞察等记录时在同一事务内写入 sync_tombstones，
+/api/sync 据此向客户端下发删除；墓碑保留 SYNC_TOMBSTONE_RETENTION_DAYS 天，
+同步令牌早于保留期的客户端会收到全量数据
+
+用法（在 backend 目录下运行）:
+    python tombstones.py prune    清理超过保留期的墓碑
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine, Base, print_db_info
+from models import SyncTombstone
+
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+
+
+def retention_horizon(now: Optional[datetime] = None) -> datetime:
+    """
+    早于该时间的删除可能已被清理，增量同步不再可靠
+    """
+    return (now or datetime.utcnow()) - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+
+
+async def record(db, user_id: str, collection: str, ids: Iterable[str]) -> None:
+    """
+    记录已知 ID 的删除，由调用方负责 commit
+    """
+    now = datetime.utcnow()
+    rows = [{"user_id": user_id, "collection": collection, "entity_id": entity_id, "deleted_at": now} for entity_id in ids]
+    if rows:
+        await db.execute(insert(SyncTombstone), rows)
+
+
+async def record_matching(db, collection: str, model, condition) -> None:
+    """
+    批量删除前调用：一条 INSERT ... SELECT 为所有匹配 condition 的行写入墓碑，不把行读到应用端
+    """
+    now = datetime.utcnow()
+    await db.execute(insert(SyncTombstone).from_select(
+        ["user_id", "collection", "entity_id", "deleted_at"],
+        select(model.user_id, literal(collection), model.id, literal(now)).where(condition)
+    ))
+
+
+def prune(db: Session, now: Optional[datetime] = None) -> int:
+    """
+    删除超过保留期的墓碑，返回删除行数，由调用方负责 commit
+    """
+    return db.execute(delete(SyncTombstone).where(SyncTombstone.deleted_at < retention_horizon(now))).rowcount
+
+
+def main():
+    """主函数"""
+    # 设置控制台编码为 UTF-8
+    if sys.platform == "win32":
+        os.system("chcp 65001 >nul 2>&1")
+
+    if sys.argv[1:] != ["prune"]:
+        print("用法: python tombstones.py prune")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("  AI时间管理系统 - 清理同步墓碑")
+    print("=" * 60)
+    print_db_info()
+    print("")
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        pruned = prune(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[错误] 清理失败: {str(e)}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"[完成] 已清理 {pruned} 条超过 {SYNC_TOMBSTONE_RETENTION_DAYS} 天的墓碑")
+
+
+if __name__ == "__main__":
+    main()